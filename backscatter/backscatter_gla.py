@@ -29,6 +29,12 @@ SAVE_TO_FILE = True
 NODE_NAME = ''
 INDEPENDENT_TS = True
 TERM = 'short'    # mix=dH/dG, short=DdH/DdG
+TVAR = False      # for time variable correlation: R(t), S(t)
+NPTS = 9          # sliding-window, number of pts for correlation at each time
+MAX_CELLS = 100000  # max number of TS (grid cells) processed at once,
+                    # w/TVAR max number of stacked window values
+                    # (NPTS * nt per grid cell)
+MAX_MB = 512        # max memory for the buffered output (MB)
 
 if INDEPENDENT_TS:
     # correct independent TS
@@ -75,79 +81,89 @@ def main(args):
     #---------------------------------------------------------------------
 
     N, ny, nx =  d[H_NAME].shape    # i,j,k = t,y,x
-    RR = np.empty((ny,nx), 'f8') * np.nan
-    SS = np.empty((ny,nx), 'f8') * np.nan
+    rshape = (N,ny,nx) if TVAR else (ny,nx)
+    RR = np.empty(rshape, 'f8') * np.nan
+    SS = np.empty(rshape, 'f8') * np.nan
 
     print 'processing time series ...'
     isfirst = True
 
-    # iterate over every grid cell (all times): i,j = y,x
+    # process slabs of grid rows (all times) aligned w/the HDF5 chunks: 
+    # i1:i2,: = y,x
     #-----------------------------------------------------------------
 
-    for i in xrange(ny):
-        for j in xrange(nx):
-
-            #i, j = 1, 42 
-            nrows = d[TABLE].nrows
-            time2 = d[TIME2]
-            lon = d['lon']
-            lat = d['lat']
-            dh_mean = d[H_NAME][:nrows,i,j]
-            dg_mean = d[G_NAME][:nrows,i,j]
-
+    nrows = d[TABLE].nrows
+    time2 = d[TIME2]
+    lon = d['lon']
+    lat = d['lat']
+    chunky = d[H_NAME].chunkshape[1] if d[H_NAME].chunkshape else 1
+    # w/TVAR the IRLS stacks the windows: NPTS*nt values per cell
+    ncells = MAX_CELLS // (NPTS * max(1, nrows)) if TVAR else MAX_CELLS
+    nslab = chunky * max(1, ncells // (chunky * nx))
+
+    for i1 in xrange(0, ny, nslab):
+        i2 = min(i1 + nslab, ny)
+
+        dh_mean = d[H_NAME][:nrows,i1:i2,:]
+        dg_mean = d[G_NAME][:nrows,i1:i2,:]
+
+        if TVAR:
+            dh_mean_corr, R, S = backscatter_corr2_cube(dh_mean, dg_mean, 
+                term=TERM, robust=True, npts=NPTS)
+        else:
             dh_mean_corr, R, S = \
-                backscatter_corr(dh_mean, dg_mean, term=TERM, robust=True)
-
-            if R is None:
-                R = np.nan
-                S = np.nan
-
-            if np.ndim(R) == 1:
-                RR[i,j] = R
-                SS[i,j] = S
-            else:
-                RR[i,j] = np.mean(R)
-                SS[i,j] = np.mean(S)
-
-            # plot figures
-            if PLOT and not np.alltrue(np.isnan(dh_mean[1:])) \
-                    and not np.alltrue(dh_mean == 0):
-                print 'grid-cell:', i, j
-                time2 = i2dt(time2[1:])
-                dh_mean_corr, dh_mean, dg_mean = dh_mean_corr[1:], dh_mean[1:], dg_mean[1:]
-                dh_mean_corr = reference_to_first(dh_mean_corr)
-                dh_mean = reference_to_first(dh_mean)
-                dg_mean = reference_to_first(dg_mean)
-                plot_tseries(time2, lon[j], lat[i], dh_mean_corr, dh_mean, dg_mean, R, S, term=TERM)
-                plt.show()
-
-            # save one TS per grid cell at a time
-            #---------------------------------------------------------
-
-            if not SAVE_TO_FILE: continue
-
-            if isfirst:
-                # open or create output file
-                isfirst = False
-                atom = tb.Atom.from_dtype(dh_mean_corr.dtype)
-                filters = tb.Filters(complib='zlib', complevel=9)
-                try:
-                    g = fin.getNode('/', NODE_NAME)
-                    c = fin.createCArray(g, SAVE_AS_NAME, atom, 
-                        (N,ny,nx), '', filters)
-                    c2 = fin.createCArray(g, R_NAME, atom, 
-                        (ny,nx), '', filters)
-                    c3 = fin.createCArray(g, S_NAME, atom, 
-                        (ny,nx), '', filters)
-                except:
-                    c = fin.getNode('/%s' % NODE_NAME, SAVE_AS_NAME)
-
-            c[:,i,j] = dh_mean_corr
+                backscatter_corr_cube(dh_mean, dg_mean, term=TERM, robust=True)
+
+        RR[...,i1:i2,:] = R
+        SS[...,i1:i2,:] = S
+
+        # plot figures
+        for i, j in np.ndindex(i2-i1, nx):
+            if not PLOT or np.alltrue(np.isnan(dh_mean[1:,i,j])) \
+                    or np.alltrue(dh_mean[:,i,j] == 0): 
+                continue
+            print 'grid-cell:', i1+i, j
+            t2 = i2dt(time2[1:])
+            h_corr, h, g = dh_mean_corr[1:,i,j], dh_mean[1:,i,j], dg_mean[1:,i,j]
+            h_corr = reference_to_first(h_corr.copy())
+            h = reference_to_first(h.copy())
+            g = reference_to_first(g.copy())
+            plot_tseries(t2, lon[j], lat[i1+i], h_corr, h, g, R[...,i,j], S[...,i,j], term=TERM)
+            plt.show()
+
+        # save one slab of TS at a time
+        #---------------------------------------------------------
+
+        if not SAVE_TO_FILE: continue
+
+        if isfirst:
+            # open or create output file
+            isfirst = False
+            atom = tb.Atom.from_dtype(dh_mean_corr.dtype)
+            filters = tb.Filters(complib='zlib', complevel=9)
+            try:
+                g = fin.getNode('/', NODE_NAME)
+                c = fin.createCArray(g, SAVE_AS_NAME, atom, 
+                    (N,ny,nx), '', filters)
+                c2 = fin.createCArray(g, R_NAME, atom, 
+                    rshape, '', filters)
+                c3 = fin.createCArray(g, S_NAME, atom, 
+                    rshape, '', filters)
+            except:
+                c = fin.getNode('/%s' % NODE_NAME, SAVE_AS_NAME)
+            # slabs are not aligned w/the output chunks, buffer them
+            c = ChunkWriter(c, MAX_MB)
+
+        c[:nrows,i1:i2,:] = dh_mean_corr
 
     if SAVE_TO_FILE:
+        c.close()
         c2[:] = RR[:]
         c3[:] = SS[:]
 
+    if TVAR:
+        RR, SS = np.mean(RR, axis=0), np.mean(SS, axis=0)
+
     plt.figure()
     plt.imshow(RR, origin='lower', interpolation='nearest')
     plt.colorbar(orientation='horizontal', shrink=0.6)
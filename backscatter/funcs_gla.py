@@ -15,6 +15,10 @@ import tables as tb
 import pandas as pn
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..', 'misc'))
+from chunkwriter import ChunkWriter
+
 try:
     sys.path.append('/Users/fpaolo/code/misc')
     from util import * 
@@ -133,6 +137,146 @@ def backscatter_corr(H, G, term='mix', robust=False):
     return [H_corr, R, S]
 
 
+HUBER_T = 1.345               # tuning constant of Huber's T (as statsmodels)
+MAD_C = 0.6744897501960817    # normal quantile at 3/4 (for MAD scale)
+
+
+def _corr_pairs(H, G, term='mix'):
+    """
+    The (G2, H2) pairs used for the correlation of every time series
+    (columns of the 2D arrays H, G), same as in `backscatter_corr`.
+
+    Returns G2, H2 (zero outside the pairs), the mask of the pairs and
+    the number of valid entries of each series.
+    """
+    valid = (~np.isnan(H)) & (~np.isnan(G)) & (H!=0) & (G!=0)
+    nvalid = valid.sum(axis=0)
+    if term == 'mix':
+        use = valid
+        H2, G2 = H, G
+    elif term == 'short':
+        # difference w/the previous valid entry of the same series
+        k = np.arange(H.shape[0])[:,None]
+        last = np.maximum.accumulate(np.where(valid, k, -1), axis=0)
+        prev = np.empty_like(last)
+        prev[0] = -1
+        prev[1:] = last[:-1]
+        use = valid & (prev >= 0)
+        prev = np.maximum(prev, 0)
+        cols = np.arange(H.shape[1])
+        H2, G2 = H - H[prev,cols], G - G[prev,cols]
+    else:
+        raise IOError('`term` must be "mix" or "short"')
+    return np.where(use, G2, 0.), np.where(use, H2, 0.), use, nvalid
+
+
+def _wls_line(x, y, w):
+    """Weighted LS fit of a line to every column, returns (m, c, sxx)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sw = w.sum(axis=0)
+        xm = (w * x).sum(axis=0) / sw
+        ym = (w * y).sum(axis=0) / sw
+        dx, dy = x - xm, y - ym
+        sxx = (w * dx * dx).sum(axis=0)
+        m = (w * dx * dy).sum(axis=0) / sxx
+        c = ym - m * xm
+    return m, c, sxx
+
+
+def _huber_irls(x, y, mask, m, c, maxiter=50, tol=1e-8):
+    """
+    Robust fit of a line to every column by IRLS w/Huber's T, starting
+    from the OLS fit (m, c). Same iterations as `linear_fit_robust`
+    (statsmodels RLM: MAD scale, convergence by deviance).
+    """
+    t = HUBER_T
+    n = mask.sum(axis=0)
+    rho = lambda z: np.where(np.abs(z) <= t, 0.5*z*z, np.abs(z)*t - 0.5*t*t)
+
+    def update(m, c, w):
+        resid = np.where(mask, y - (m * x + c), 0.)
+        absr = np.ma.masked_array(np.abs(resid), mask=~mask)
+        scale = np.ma.median(absr, axis=0).filled(np.nan) / MAD_C
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wscale = (w * resid * resid).sum(axis=0) / (n - 2)
+            dev = np.where(mask, rho(resid / wscale), 0.).sum(axis=0)
+        return resid, scale, dev
+
+    resid, scale, dev = update(m, c, mask.astype('f8'))
+    active = np.ones(len(m), bool)
+    for iteration in xrange(2, maxiter+1):
+        active &= (scale != 0)                 # perfect fit
+        if not active.any():
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.abs(resid / scale)
+        w = np.where(mask, np.where(z <= t, 1., t / z), 0.)
+        m2, c2, _ = _wls_line(x, y, w)
+        resid2, scale2, dev2 = update(m2, c2, w)
+        a = active
+        m[a], c[a], resid[:,a], scale[a] = m2[a], c2[a], resid2[:,a], scale2[a]
+        with np.errstate(invalid='ignore'):
+            active &= (np.abs(dev2 - dev) > tol)
+        dev[a] = dev2[a]
+        if iteration >= maxiter:
+            break
+    return m, c
+
+
+def backscatter_corr_cube(H, G, term='mix', robust=False): 
+    """
+    Apply the backscatter correction to all the dh time series of a cube.
+
+    Same as `backscatter_corr` (same rules for R and S), but for all the
+    time series at once: H and G are arrays (nt, ...) with the time
+    series along the first axis.
+
+    Returns
+    -------
+    H_corr : corrected dh series (nt, ...)
+    R : correlation coeficients (...), NaN if no correlation
+    S : sensitivity factors (...), NaN if no correlation
+    """
+    shape = H.shape
+    H = H.reshape(shape[0], -1)
+    G = G.reshape(shape[0], -1)
+    x, y, mask, nvalid = _corr_pairs(H, G, term)
+    n = mask.sum(axis=0)
+
+    # correlation coef
+    ones = mask.astype('f8')
+    S, H0, sxx = _wls_line(x, y, ones)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dy = np.where(mask, y - (ones * y).sum(axis=0) / n, 0.)
+        syy = (dy * dy).sum(axis=0)
+        R = np.clip(S * sxx / np.sqrt(sxx * syy), -1, 1)
+
+    # correlation grad and intercept
+    S[n < 2] = np.nan
+    H0[n < 2] = np.nan
+    fit = (n >= 2) & (sxx > 0)
+    if robust and fit.any():
+        S[fit], H0[fit] = _huber_irls(x[:,fit], y[:,fit], mask[:,fit], 
+                                      S[fit], H0[fit])
+    # constant G: fall back to the fit of a single series
+    for k in np.where((n >= 2) & ~(sxx > 0))[0]:
+        G2, H2 = x[mask[:,k],k], y[mask[:,k],k]
+        if robust:
+            S[k], H0[k] = linear_fit_robust(G2, H2, return_coef=True)
+        else:
+            S[k], H0[k] = linear_fit(G2, H2, return_coef=True)
+
+    # no correction applied if |R| < 0.2 (or less than 2 valid entries)
+    R[nvalid < 2] = np.nan
+    S[nvalid < 2] = np.nan
+    with np.errstate(invalid='ignore'):
+        nocorr = (nvalid < 2) | (np.abs(R) < 0.2)
+    S = np.where(nocorr, S, np.clip(S, -0.2, 0.7))
+    H_corr = np.where(nocorr, H, H - S*G + H0).astype(H.dtype)
+
+    return [H_corr.reshape(shape), R.reshape(shape[1:]), S.reshape(shape[1:])]
+
+
 def backscatter_corr2(H, G, term='mix', robust=False, npts=9):
     """
     Apply the backscatter correction to a dh time series.
@@ -229,6 +373,125 @@ def backscatter_corr2(H, G, term='mix', robust=False, npts=9):
     return [H_corr, RR, SS]
 
 
+def _window_sums(a, w):
+    """Sums of `a` (nt, ncols) over all the windows a[k:k+w] (running sums)."""
+    c = np.zeros((a.shape[0]+1,) + a.shape[1:], 'f8')
+    np.cumsum(a, axis=0, out=c[1:])
+    return c[w:] - c[:-w]
+
+
+def _reference_to_first(ts):
+    """Same as `reference_to_first` for every column of a 2D array."""
+    valid = ~np.isnan(ts)
+    first = valid.argmax(axis=0)
+    ref = ts[first, np.arange(ts.shape[1])]
+    return np.where(valid.sum(axis=0) > 1, ts - ref, ts)
+
+
+def backscatter_corr2_cube(H, G, term='mix', robust=False, npts=9):
+    """
+    Apply the time variable backscatter correction to all the dh time
+    series of a cube.
+
+    Same as `backscatter_corr2` (same windows, edge fill and rules for 
+    R(t) and S(t)), but for all the time series at once: H and G are 
+    arrays (nt, ...) with the time series along the first axis.
+
+    R(t), S(t) and H0(t) are obtained from running sums of G, H, G^2, 
+    H^2 and GH over the `npts` windows (NaNs excluded from the fits, and
+    R is NaN if the window has any NaN, as `np.corrcoef`). If `robust`,
+    the OLS estimates are refined by IRLS (Huber) on every window.
+
+    Returns
+    -------
+    H_corr : corrected dh series (nt, ...)
+    R : correlation coeficients (nt, ...)
+    S : correlation gradients (nt, ...)
+    """
+    shape = H.shape
+    N = shape[0]
+    H = _reference_to_first(H.reshape(N, -1))
+    G = _reference_to_first(G.reshape(N, -1))
+    l = int(npts/2.)
+
+    if term == 'mix':
+        x, y, w = G, H, 2*l+1
+    elif term == 'short':
+        x, y, w = np.diff(G, axis=0), np.diff(H, axis=0), 2*l  # differences
+    else:
+        raise IOError('`term` must be "mix" or "short"')
+
+    # running sums over the windows centered at l..N-l-1
+    valid = (~np.isnan(x)) & (~np.isnan(y))
+    x = np.where(valid, x, 0.).astype('f8')
+    y = np.where(valid, y, 0.).astype('f8')
+    n = _window_sums(valid, w)
+    sx, sy = _window_sums(x, w), _window_sums(y, w)
+    sxx, syy = _window_sums(x*x, w), _window_sums(y*y, w)
+    sxy = _window_sums(x*y, w)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xm, ym = sx / n, sy / n
+        vxx, vyy, vxy = sxx - sx*xm, syy - sy*ym, sxy - sx*ym
+        const_x = (vxx <= 1e-10 * sxx)
+        const_y = (vyy <= 1e-10 * syy)
+
+        # correlation coef
+        R = np.clip(vxy / np.sqrt(vxx * vyy), -1, 1)
+        R[(n < w) | const_x | const_y] = np.nan
+
+        # correlation grad and intercept (min-norm solution if G is const)
+        S = np.where(const_x, xm*ym / (xm*xm + 1), vxy / vxx)
+        H0 = np.where(const_x, ym / (xm*xm + 1), ym - S*xm)
+    S[n < 2] = np.nan
+    H0[n < 2] = np.nan
+
+    if robust:
+        # windows stacked as columns (w, nwin*ncols) for the IRLS
+        ind = np.arange(n.shape[0])[None,:] + np.arange(w)[:,None]
+        X = x[ind].reshape(w, -1)
+        Y = y[ind].reshape(w, -1)
+        M = valid[ind].reshape(w, -1)
+        S, H0 = S.ravel(), H0.ravel()
+        fit = (n.ravel() >= 2) & ~const_x.ravel()
+        if fit.any():
+            S[fit], H0[fit] = _huber_irls(X[:,fit], Y[:,fit], M[:,fit], 
+                                          S[fit], H0[fit])
+        # constant G: fall back to the fit of a single window
+        for k in np.where((n.ravel() >= 2) & const_x.ravel())[0]:
+            S[k], H0[k] = linear_fit_robust(X[M[:,k],k], Y[M[:,k],k], 
+                                            return_coef=True)
+        S, H0 = S.reshape(n.shape), H0.reshape(n.shape)
+
+    RR = np.empty(H.shape, 'f8') * np.nan
+    SS = np.empty(H.shape, 'f8') * np.nan
+    HH = np.empty(H.shape, 'f8') * np.nan
+    RR[l:N-l], SS[l:N-l], HH[l:N-l] = R, S, H0
+
+    # fill both ends
+    RR[:l] = RR[l]
+    SS[:l] = SS[l]
+    HH[:l] = HH[l]
+    RR[N-l:] = RR[N-l-1]
+    SS[N-l:] = SS[N-l-1]
+    HH[N-l:] = HH[N-l-1]
+
+    # no correction applied if |R| < 0.2
+    with np.errstate(invalid='ignore'):
+        small = np.abs(RR) < 0.2
+    SS[small] = 0.0
+    HH[small] = 0.0
+    SS = np.clip(SS, -0.2, 0.7)
+    jj = np.isnan(H)
+    RR[jj] = np.nan
+    SS[jj] = np.nan
+    HH[jj] = np.nan
+
+    H_corr = _reference_to_first(H - SS*G + HH)
+
+    return [H_corr.reshape(shape), RR.reshape(shape), SS.reshape(shape)]
+
+
 def reference_to_first(ts):
     ind, = np.where(~np.isnan(ts))
     if len(ind) > 1:
@@ -11,6 +11,11 @@ import numpy as np
 import scipy as sp
 import tables as tb
 import datetime as dt
+import sys
+
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..', 'misc'))
+from timeconv import *
 
 # definition of Table structures for HDF5 files
 
@@ -50,28 +55,24 @@ class SecsToDateTime(object):
         else:
             self.secs = secs  
 
-        # 1985-Jan-1 00:00:00 in days (since year 0001-Jan-1 00:00:00)
-        REF_EPOCH_IN_DAYS = mpl.date2num(dt.date(since_year, 1, 1))  
-
-        # secs/86400 -> frac days -> date
-        FRAC_DAYS = self.secs / 86400.
-        self._dates = mpl.num2date(REF_EPOCH_IN_DAYS + FRAC_DAYS)
+        # all fields at once (see `timeconv`)
+        self._dt64 = sec2dt64(self.secs, since_year)
+        self._ymdhms = dt642ymdhms(self._dt64)
 
     def dates(self):
-        return self._dates
+        return self._dt64.astype(object)
 
     def years(self):
-        return np.array([d.year for d in self._dates])
+        return self._ymdhms[:,0]
 
     def months(self):
-        return np.array([d.month for d in self._dates])
+        return self._ymdhms[:,1]
         
     def days(self):
-        return np.array([d.day for d in self._dates])
+        return self._ymdhms[:,2]
 
     def ymdhms(self):
-        return np.array([(d.year, d.month, d.day, d.hour,
-            d.minute, d.second) for d in self._dates])
+        return self._ymdhms
 
 
 def linear_fit(x, y, return_coef=False):
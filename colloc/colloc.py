@@ -13,11 +13,14 @@
 #  Date: Jan/2009.
 
 
+import os
 import numpy as N
 import optparse
+import multiprocessing as mp
+from itertools import imap
 from sys import argv, exit
-from scipy import weave
-from scipy.weave.converters import blitz
+from funcs import PointIndex, LSCSolver, distance_pq, azimuth_pq, interp_cov
+from funcs import get_tiles, open_grid
 
 # Editable part -----------------------------------------------------------
 
@@ -36,6 +39,9 @@ ANOMALOUS_VAL = 0.0
 COL_STD_SSG = 4
 COL_STD_GRAV = 3
 
+# SSG errors are given in urad, covariances in arcsec**2
+URAD_TO_ARCSEC = 0.20626480599999999
+
 # Scan comand line arguments ----------------------------------------------
 
 usage = "python %prog [options]"
@@ -138,6 +144,18 @@ parser.add_option('-s',
                   default=False, 
                   help='use local (cell) scale factor for cov functions: -s',
                   )
+parser.add_option('-T', 
+    	          dest='tile',
+                  default=2.0, 
+                  type='float',
+                  help='side of the tiles the grid is split into [deg]: -T2',
+                  )
+parser.add_option('-j', 
+    	          dest='njobs',
+                  default=1, 
+                  type='int',
+                  help='number of processes to solve tiles in parallel: -j1',
+                  )
 options, remainder = parser.parse_args()
 
 filessg = options.filessg
@@ -164,6 +182,11 @@ region = eval(options.region)
 dx = options.resolut
 dy = options.resolut
 scale = options.scale
+tile = options.tile
+njobs = options.njobs
+
+# data, covariances and grid nodes shared with the tile processes
+SHARED = {}
 
 #--------------------------------------------------------------------------
 
@@ -181,90 +204,6 @@ def load_data(filessg, colse, filegrav=None, colsg=None):
 
 #--------------------------------------------------------------------------
 
-def select_points(IN, OUT, lon, lat, d):
-
-    """Selects the pts inside the circle pi*(d/2)**2 
-	centering at (lon,lat) -> Circular inversion cell."""
-
-    nrow = IN.shape[0]
-    ncol = IN.shape[1]
-    r = d/2.0
-
-    functions = \
-    """
-	// Distance between two points (P and Q)
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-    """
-	
-    main_code = \
-    """
-	int k = 0;
-	double dist, x, y;
-
-    for (int i = 0; i < nrow; i++) {
-	    x = IN(i,0);  // lon
-	    y = IN(i,1);  // lat
-
-        dist = distance_pq(lon, lat, x, y);  // deg
-
-	    if (dist <= r) {
-	        for (int j = 0; j < ncol; j++){
-		        OUT(k,j) = IN(i,j);
-		    }
-	        k++;
-	   }
-	}
-
-	return_val = k;  // number of selected pts
-	"""
-    vars = ['IN', 'OUT', 'lon', 'lat', 'r', 'nrow', 'ncol']
-    return weave.inline(main_code, vars, support_code=functions, 
-	                    type_converters=blitz)
-
-#--------------------------------------------------------------------------
-def select_points2(IN, OUT, lon, lat, l):
-
-    """Selects the pts inside the square l**2 centering 
-	at (lon,lat) -> Square inversion cell"""
-
-    nrow = IN.shape[0]
-    ncol = IN.shape[1]
-    r = l/2.0
-
-    main_code = \
-    """
-	int k = 0;
-	double x, y, xmin = lon, xmax = lon, ymin = lat, ymax = lat;
-
-    xmin -= r;
-	xmax += r;
-	ymin -= r;
-	ymax += r;
-
-    for (int i = 0; i < nrow; i++) {
-	    x = IN(i,0);  // lon
-	    y = IN(i,1);  // lat
-
-	    if ( xmin <= x && x <= xmax && ymin <= y && y <= ymax) {
-	        for (int j = 0; j < ncol; j++){
-		        OUT(k,j) = IN(i,j);
-		    }
-	        k++;
-	   }
-	}
-
-	return_val = k;  // number of selected pts
-	"""
-    vars = ['IN', 'OUT', 'lon', 'lat', 'r', 'nrow', 'ncol']
-    return weave.inline(main_code, vars, type_converters=blitz)
-
-#--------------------------------------------------------------------------
-
 def fills_cov_signal1(OBS, COVSL, C_sig, lon_grid, lat_grid, scale):
 
     """Fill vector of signal covariances: 
@@ -282,105 +221,22 @@ def fills_cov_signal1(OBS, COVSL, C_sig, lon_grid, lat_grid, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ne = OBS.shape[0] 
-    ncov = COVSL.shape[0]
-
-    functions = \
-    """
-    // Azimuth of direction defined by 2 pts (P and Q) --------------------
-    // Note: the argument must be in DEGREES
-
-    double azimuth_pq(double lon_1, double lat_1, 
-                      double lon_2, double lat_2) {
+    lon_e = OBS[:,0]      # SSG lon (deg)
+    lat_e = OBS[:,1]      # SSG lat (deg)
+    azmth_e = OBS[:,3]    # SSG azimuth (rad)
 
-	    const double PI = 3.1415926535897931;
-	    const double R  = 6371007.1809;   // Earth's radius in m (WGS 84)
-        double latm, dx, dy, azmth;
+    # azimuth between pts P (grid-signal) and Q (observations)
+    azmth_pq = azimuth_pq(lon_grid, lat_grid, lon_e, lat_e)  # rad
 
-        double lon1 = lon_1 * (PI/180.);  // deg -> rad
-        double lat1 = lat_1 * (PI/180.);  // rad
-        double lon2 = lon_2 * (PI/180.);  // rad
-        double lat2 = lat_2 * (PI/180.);  // rad
+    # angle of ssg related to PQ direction
+    theta_e = azmth_e - azmth_pq                             # rad
 
-        latm = (lat1 + lat2) / 2.0;          // rad
-        dx = R * cos(latm) * (lon2 - lon1);  // rad
-        dy = R * (lat2 - lat1);              // rad
-		azmth = atan2(dx, dy); 
+    # distance btw pts P (grid-signal) and Q (observation)
+    dist_pq = distance_pq(lon_grid, lat_grid, lon_e, lat_e)  # deg
+    C_sl = interp_cov(dist_pq, COVSL, 'C_sl')
 
-		// For getting azmth > 0 always.
-		if (azmth < 0)
-            azmth += 2*PI;  // rad
-
-        return azmth;       // azimuth (> 0) in rad
-    }
-
-	// Distance between two point (P and Q) -------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-	using namespace std;
-    double lon_e, lat_e, azmth_e, theta_e, azmth_pq, dist_pq;
-	double dist1, dist2, cov1, cov2, w1, w2, C_sl;
-	double s = scale;
-
-    for (int i = 0; i < ne; i++) {
-
-        lon_e = OBS(i,0);    // SSG lon (deg)
-        lat_e = OBS(i,1);    // SSG lat (deg)
-		azmth_e = OBS(i,3);  // SSG azimuth (rad)
-     
-	    // azimuth between pts P (grid-signal) and Q (observations)
-	    azmth_pq = azimuth_pq(lon_grid, lat_grid, lon_e, lat_e);  // rad
-
-        // angle of ssg related to PQ direction
-        theta_e = azmth_e - azmth_pq;       // rad
-
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq = distance_pq(lon_grid, lat_grid, lon_e, lat_e);  // deg
-     
-        // finds a cov value according to distance btw pts
-        for (int j = 0; j < ncov-1; j++) {
-
-            dist1 = COVSL(j,0);    // tabulated distance
-            cov1 = COVSL(j,1);     // tabulated covariance 
-            dist2 = COVSL(j+1,0);
-            cov2 = COVSL(j+1,1);     
-
-			// a) if there is an exact tabulated distance no average is needed
-			if (dist_pq == dist1) {
-				C_sl = cov1;
-        	    break;
-            }
-			// b) if it is btw two values a weighted average is performed
-            else if (dist1 < dist_pq && dist_pq <= dist2) {
-                w1 = (dist2 - dist_pq)/(dist2 - dist1);   // weight cov1 
-                w2 = 1.0 - w1;                            // weight cov2
-                C_sl = w1 * cov1 + w2 * cov2;             // weighted average
-        	    break;
-            }
-			// c) if there isn't tabulated values for this distance in the file
-            else if (j == ncov-2) {
-                cout << "Radius to large, no C_sl for: " << dist_pq << " deg, "
-                     << "filling with 0.0" << endl;
-        	    C_sl = 0.0;
-            }
-        }
-
-		// calculates C_ge or C_ne ----------------------------------------
-
-        C_sig(i) = (-cos(theta_e) * C_sl) * s;
-    }
-    """
-    vars = ['OBS', 'COVSL', 'C_sig', 'lon_grid', 'lat_grid', 'ne', \
-	        'ncov', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+    # calculates C_ge or C_ne 
+    C_sig[:] = (-N.cos(theta_e) * C_sl) * scale
 
 #--------------------------------------------------------------------------
 
@@ -405,153 +261,48 @@ def fills_cov_signal2(OBS, COVSL, COVSG, C_sig, lon_grid, lat_grid,
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ncsl = COVSL.shape[0]
-    ncsg = COVSG.shape[0]
+    # (1) fills first part of C_sig with COVSL: [0] to [ne-1] with C_se
+    fills_cov_signal1(OBS[:ne], COVSL, C_sig[:ne], lon_grid, lat_grid, scale)
 
-    functions = \
-    """
-    // Azimuth of direction defined by 2 pts (P and Q) --------------------
-    // Note: the argument must be in DEGREES
+    # (2) fills second part of C_sig with COVSG: [ne] to [ne+ng-1] with C_sg
+    lon_grav = OBS[ne:ne+ng,0]  # lon GRAV at Q
+    lat_grav = OBS[ne:ne+ng,1]  # lat GRAV at Q
+    dist_pq = distance_pq(lon_grid, lat_grid, lon_grav, lat_grav)  # deg
+    C_sg = interp_cov(dist_pq, COVSG, 'C_sg')
 
-    double azimuth_pq(double lon_1, double lat_1, 
-                      double lon_2, double lat_2) {
+    # C_gg or C_ng
+    C_sig[ne:ne+ng] = C_sg * scale
 
-	    const double PI = 3.1415926535897931;
-	    const double R  = 6371007.1809;   // Earth's radius in m (WGS 84)
-        double latm, dx, dy, azmth;
+#--------------------------------------------------------------------------
 
-        double lon1 = lon_1 * (PI/180.);  // deg -> rad
-        double lat1 = lat_1 * (PI/180.);  // rad
-        double lon2 = lon_2 * (PI/180.);  // rad
-        double lat2 = lat_2 * (PI/180.);  // rad
+def _cov_ee(OBS, COVLL, COVMM, scale):
 
-        latm = (lat1 + lat2) / 2.0;          // rad
-        dx = R * cos(latm) * (lon2 - lon1);  // rad
-        dy = R * (lat2 - lat1);              // rad
-		azmth = atan2(dx, dy); 
+    # C_ee between all pairs of SSGs at P=(lon_p,lat_p) and Q=(lon_q,lat_q)
+    lon_p, lat_p, azmth_p = OBS[:,0,None], OBS[:,1,None], OBS[:,3,None]
+    lon_q, lat_q, azmth_q = OBS[None,:,0], OBS[None,:,1], OBS[None,:,3]
 
-		// For getting azmth > 0 always.
-		if (azmth < 0)
-            azmth += 2*PI;  // rad
+    # azimuth between points P and Q (SSGs)
+    azmth_pq = azimuth_pq(lon_p, lat_p, lon_q, lat_q)  # rad
 
-        return azmth;       // azimuth (> 0) in rad
-    }
+    # angles of SSGs at P and Q related to PQ direction
+    theta_p = azmth_p - azmth_pq                       # rad
+    theta_q = azmth_q - azmth_pq                       # rad
 
-	// Distance between two point (P and Q) -------------------------------
+    # distance btw SSGs at P and Q
+    dist_pq = distance_pq(lon_p, lat_p, lon_q, lat_q)  # deg
+    C_ll = interp_cov(dist_pq, COVLL, 'C_ll')
+    C_mm = interp_cov(dist_pq, COVMM, 'C_mm')
 
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
+    return (C_ll * N.cos(theta_p) * N.cos(theta_q) \
+            + C_mm * N.sin(theta_p) * N.sin(theta_q)) * scale
 
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
 
-    main_code = \
-    """
-    using namespace std;
-    double lon_e, lat_e, azmth_e, theta_e, azmth_pq, dist_pq;
-	double lon_grav, lat_grav;
-	double dist1, dist2, cov1, cov2, w1, w2, C_sl, C_sg;
-	double s = scale;
-
-    // (1) fills first part of C_sig with COVSL ---------------------------
-    // from [0] to [ne-1] with C_se
-
-    for (int i = 0; i < ne; i++) {  
-
-        lon_e = OBS(i,0);         // SSG lon (deg)
-        lat_e = OBS(i,1);         // SSG lat (deg)
-		azmth_e = OBS(i,3);       // SSG azimuth (rad)
-     
-	    // azimuth between pts P (grid-signal) and Q (observations)
-	    azmth_pq = azimuth_pq(lon_grid, lat_grid, lon_e, lat_e);  // rad
-
-        // angle of SSG at Q related to PQ direction
-        theta_e = azmth_e - azmth_pq;       // rad
-
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq = distance_pq(lon_grid, lat_grid, lon_e, lat_e);  // deg
-     
-        // finds a cov value according to distance btw pts
-        for (int j = 0; j < ncsl-1; j++) {
-
-            dist1 = COVSL(j,0);    // tabulated distance
-            cov1 = COVSL(j,1);     // tabulated covariance 
-            dist2 = COVSL(j+1,0);
-            cov2 = COVSL(j+1,1);     
-
-			// a) if there is an exact tabulated distance no average is needed
-			if (dist_pq == dist1) {
-				C_sl = cov1;
-        	    break;
-            }
-			// b) if it is btw two values a weighted average is performed
-            else if (dist1 < dist_pq && dist_pq <= dist2) {
-                w1 = (dist2 - dist_pq)/(dist2 - dist1);   // weight cov1 
-                w2 = 1.0 - w1;                            // weight cov2
-                C_sl = w1 * cov1 + w2 * cov2;             // weighted average
-        	    break;
-            }
-			// c) if there isn't tabulated values for this distance in the file
-            else if (j == ncsl-2) {
-                cout << "Radius to large, no C_sl for: " << dist_pq << " deg, "
-                     << "filling with 0.0" << endl;
-        	    C_sl = 0.0;
-            }
-        }
-
-		// calculates C_ge or C_ne ----------------------------------------
-
-        C_sig(i) = (-cos(theta_e) * C_sl) * s;
-    }
-
-    // (2) fills second part of C_sig with COVSG --------------------------
-    // from [ne] to [ne+ng-1] with C_sg
-
-    for (int i = ne; i < ne+ng; i++) {  
-
-        lon_grav = OBS(i,0);  // lon GRAV at Q
-        lat_grav = OBS(i,1);  // lat GRAV at Q
-
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq = distance_pq(lon_grid, lat_grid, lon_grav, lat_grav);  // deg
-     
-        // finds a cov value according to distance btw pts
-        for (int j = 0; j < ncsg-1; j++) {
-
-            dist1 = COVSG(j,0);    // tabulated distance
-            cov1 = COVSG(j,1);     // tabulated covariance 
-            dist2 = COVSG(j+1,0);
-            cov2 = COVSG(j+1,1);     
-
-			// a) if there is an exact tabulated distance no average is needed
-			if (dist_pq == dist1) {
-				C_sg = cov1;
-        	    break;
-            }
-			// b) if it is btw two values a weighted average is performed
-            else if (dist1 < dist_pq && dist_pq <= dist2) {
-                w1 = (dist2 - dist_pq)/(dist2 - dist1);   // weight cov1 
-                w2 = 1.0 - w1;                            // weight cov2
-                C_sg = w1 * cov1 + w2 * cov2;             // weighted average
-        	    break;
-            }
-			// c) if there isn't tabulated values for this distance in the file
-            else if (j == ncsg-2) {
-                cout << "Radius to large, no C_sg for: " << dist_pq << " deg, "
-                     << "filling with 0.0" << endl;
-        	    C_sg = 0.0;
-            }
-        }
-
-		// C_gg or C_ng ---------------------------------------------------
-
-		C_sig(i) = C_sg * s;
-    }
-    """
-    vars = ['OBS', 'COVSL', 'COVSG', 'C_sig', 'lon_grid', 'lat_grid', \
-	        'ne', 'ng', 'ncsl', 'ncsg', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+def _add_error_var(C, std):
+
+    # adds the error variance to the (non-zero) diagonal elements
+    i = N.arange(C.shape[0])
+    diag = C[i,i]
+    C[i,i] = N.where(diag != 0, diag + std * std, diag)  # TER CERTEZA !!!
 
 #--------------------------------------------------------------------------
 
@@ -575,159 +326,10 @@ def fills_cov_observ1(OBS, COVLL, COVMM, C_OBS, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ne = OBS.shape[0] 
-    ncll = COVLL.shape[0]
-    ncmm = COVMM.shape[0]
-
-    functions = \
-    """
-    // Azimuth of direction defined by 2 pts (P and Q) --------------------
-    // Note: the argument must be in DEGREES
-
-    double azimuth_pq(double lon_1, double lat_1, 
-                      double lon_2, double lat_2) {
-
-	    const double PI = 3.1415926535897931;
-	    const double R  = 6371007.1809;   // Earth's radius in m (WGS 84)
-        double latm, dx, dy, azmth;
-
-        double lon1 = lon_1 * (PI/180.);  // deg -> rad
-        double lat1 = lat_1 * (PI/180.);  // rad
-        double lon2 = lon_2 * (PI/180.);  // rad
-        double lat2 = lat_2 * (PI/180.);  // rad
-
-        latm = (lat1 + lat2) / 2.0;          // rad
-        dx = R * cos(latm) * (lon2 - lon1);  // rad
-        dy = R * (lat2 - lat1);              // rad
-		azmth = atan2(dx, dy); 
-
-		// For getting azmth > 0 always.
-		if (azmth < 0)
-            azmth += 2*PI;  // rad
-
-        return azmth;       // azimuth (> 0) in rad
-    }
+    C_OBS[:] = _cov_ee(OBS, COVLL, COVMM, scale)
 
-	// Distance between two point (P and Q) -------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-    using namespace std;
-    double lon_p, lat_p, azmth_p, theta_p, lon_q, lat_q, azmth_q, theta_q; 
-	double azmth_pq, dist_pq, C_ll, C_mm; 
-	double dist1, dist2, cov1, cov2, w1, w2;
-
-	double s = scale, std;
-	double URAD_TO_ARCSEC = 0.20626480599999999;
-
-
-    for (int i = 0; i < ne; i++) {
-
-        lon_p = OBS(i,0);    // lon SSG at P (deg)
-        lat_p = OBS(i,1);    // lat SSG at P (deg)
-		azmth_p = OBS(i,3);  // azimuth SSG at P (rad)
-
-        for (int j = 0; j < ne; j++) {
-
-            lon_q = OBS(j,0);    // lon SSG at Q
-            lat_q = OBS(j,1);    // lat SSG at Q
-		    azmth_q = OBS(j,3);  // azimuth SSG at Q
-
-	        // azimuth between points P and Q (SSGs)
-	        azmth_pq = azimuth_pq(lon_p, lat_p, lon_q, lat_q);  // rad
-
-            // Angles of SSGs at P and Q related to PQ direction
-            theta_p = azmth_p - azmth_pq;  // rad
-            theta_q = azmth_q - azmth_pq;  // rad
-            
-            // distance btw SSGs at P=(lon_p,lat_p) and Q=(lon_q,lat_q)
-            dist_pq = distance_pq(lon_p, lat_p, lon_q, lat_q);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_ll ---------------------------------------------------
-
-            for (int k = 0; k < ncll-1; k++) {
-
-                dist1 = COVLL(k,0);    // tabulated distance
-                cov1 = COVLL(k,1);     // tabulated covariance 
-                dist2 = COVLL(k+1,0);
-                cov2 = COVLL(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_ll = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_ll = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncll-2) {
-                    cout << "Radius to large, no C_ll for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_ll = 0.0;
-                }
-            }
-
-            // for C_mm ---------------------------------------------------
-
-            for (int k = 0; k < ncmm-1; k++) {
-
-                dist1 = COVMM(k,0);    // tabulated distance
-                cov1 = COVMM(k,1);     // tabulated covariance 
-                dist2 = COVMM(k+1,0);
-                cov2 = COVMM(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_mm = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_mm = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncmm-2) {
-                    cout << "Radius to large, no C_mm for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_mm = 0.0;
-                }
-            }
-
-			// calculates C_ee --------------------------------------------
-
-            C_OBS(i,j) = (C_ll * cos(theta_p) * cos(theta_q)
-                         + C_mm * sin(theta_p) * sin(theta_q)) * s;
-
-            // Adds the error variance to the diagonal element ------------
-
-            if (i == j && C_OBS(i,j) != 0) {                // TER CERTEZA !!!
-                
-				std = OBS(i,COL_STD_SSG) * URAD_TO_ARCSEC;  // urad > arcsec
-                C_OBS(i,j) += std * std;                    // D_e (arcsec**2)
-            }
-        }
-    }
-    """
-    vars = ['OBS', 'COVLL', 'COVMM', 'C_OBS', 'ne', 'ncll', 'ncmm', 'scale',
-	        'COL_STD_SSG']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+    std = OBS[:,COL_STD_SSG] * URAD_TO_ARCSEC    # urad > arcsec
+    _add_error_var(C_OBS, std)                   # D_e (arcsec**2)
 
 #--------------------------------------------------------------------------
 
@@ -756,396 +358,46 @@ def fills_cov_observ2(OBS, COVLL, COVMM, COVGG, COVGL, C_OBS, ne, ng, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ncll = COVLL.shape[0]
-    ncmm = COVMM.shape[0]
-    ncgg = COVGG.shape[0]
-    ncgl = COVGL.shape[0]
-
-    functions = \
-    """
-    // Azimuth of direction defined by 2 pts (P and Q) --------------------
-    // Note: the argument must be in DEGREES
-
-    double azimuth_pq(double lon_1, double lat_1, 
-                      double lon_2, double lat_2) {
-
-	    const double PI = 3.1415926535897931;
-	    const double R  = 6371007.1809;   // Earth's radius in m (WGS 84)
-        double latm, dx, dy, azmth;
-
-        double lon1 = lon_1 * (PI/180.);  // deg -> rad
-        double lat1 = lat_1 * (PI/180.);  // rad
-        double lon2 = lon_2 * (PI/180.);  // rad
-        double lat2 = lat_2 * (PI/180.);  // rad
-
-        latm = (lat1 + lat2) / 2.0;          // rad
-        dx = R * cos(latm) * (lon2 - lon1);  // rad
-        dy = R * (lat2 - lat1);              // rad
-		azmth = atan2(dx, dy); 
-
-		// For getting azmth > 0 always.
-		if (azmth < 0)
-            azmth += 2*PI;  // rad
-
-        return azmth;       // azimuth (> 0) in rad
-    }
-
-	// Distance between two point (P and Q) -------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-    using namespace std;
-    double lon_p, lat_p, azmth_p, theta_p, lon_q, lat_q, azmth_q, theta_q; 
-	double lon_e, lat_e, azmth_e, theta_e, lon_g, lat_g;
-	double azmth_pq, dist_pq, C_ll, C_mm, C_gg, C_gl, C_ee, C_ge, C_eg; 
-	double dist1, dist2, cov1, cov2, w1, w2;
-
-	double s = scale, std;
-	double URAD_TO_ARCSEC = 0.20626480599999999;
-
-
-    // (1) fills 1st part of C_OBS with COVLL and COVMM -------------------
-	// from (0,0) to (ne-1,ne-1) with C_ee + D_e
-
-    for (int i = 0; i < ne; i++) {
-
-        lon_p = OBS(i,0);    // lon SSG at P (deg)
-        lat_p = OBS(i,1);    // lat SSG at P (deg)
-		azmth_p = OBS(i,3);  // azimuth SSG at P (rad)
-
-        for (int j = 0; j < ne; j++) {
-
-            lon_q = OBS(j,0);    // lon SSG at Q
-            lat_q = OBS(j,1);    // lat SSG at Q
-		    azmth_q = OBS(j,3);  // azimuth SSG at Q
-
-	        // azimuth between points P and Q (SSGs)
-	        azmth_pq = azimuth_pq(lon_p, lat_p, lon_q, lat_q);  // rad
-
-            // Angles of SSGs at P and Q related to PQ direction
-            theta_p = azmth_p - azmth_pq;  // rad
-            theta_q = azmth_q - azmth_pq;  // rad
-            
-            // distance btw SSGs at P=(lon_p,lat_p) and Q=(lon_q,lat_q)
-            dist_pq = distance_pq(lon_p, lat_p, lon_q, lat_q);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_ll ---------------------------------------------------
-
-            for (int k = 0; k < ncll-1; k++) {
-
-                dist1 = COVLL(k,0);    // tabulated distance
-                cov1 = COVLL(k,1);     // tabulated covariance 
-                dist2 = COVLL(k+1,0);
-                cov2 = COVLL(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_ll = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_ll = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncll-2) {
-                    cout << "Radius to large, no C_ll for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_ll = 0.0;
-                }
-            }
-
-            // for C_mm ---------------------------------------------------
-
-            for (int k = 0; k < ncmm-1; k++) {
-
-                dist1 = COVMM(k,0);    // tabulated distance
-                cov1 = COVMM(k,1);     // tabulated covariance 
-                dist2 = COVMM(k+1,0);
-                cov2 = COVMM(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_mm = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_mm = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncmm-2) {
-                    cout << "Radius to large, no C_mm for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_mm = 0.0;
-                }
-            }
-
-			// calculates C_ee --------------------------------------------
-
-            C_OBS(i,j) = (C_ll * cos(theta_p) * cos(theta_q)     
-                         + C_mm * sin(theta_p) * sin(theta_q)) * s;
-
-            // Adds the error variance to the diagonal element ------------
-
-            if (i == j && C_OBS(i,j) != 0) {                // TER CERTEZA !!!
-                
-				std = OBS(i,COL_STD_SSG) * URAD_TO_ARCSEC;  // urad > arcsec
-                C_OBS(i,j) += std * std;                    // D_e (arcsec**2)
-            }
-        }
-    }
-
-    // (2) fills 2nd part of C_OBS with COVGL -----------------------------
-	// from (0,ne) to (ne-1,ne+ng-1) with C_eg
-
-    for (int i = 0; i < ne; i++) {
-
-        lon_e = OBS(i,0);    // lon SSG at P (deg)
-        lat_e = OBS(i,1);    // lat SSG at P (deg)
-		azmth_e = OBS(i,3);  // azimuth SSG at P (rad)
-
-        for (int j = ne; j < ne+ng; j++) {
-
-            lon_g = OBS(j,0);    // lon GRAV at Q
-            lat_g = OBS(j,1);    // lat GRAV at Q
-
-	        // azimuth of PQ direction defined by pts P (SSG) and Q (GRAV)
-	        azmth_pq = azimuth_pq(lon_e, lat_e, lon_g, lat_g);  // rad
-
-            // Angle of SSG at P related to PQ direction
-            theta_e = azmth_e - azmth_pq;  // rad
-            
-            // distance btw SSG at P=(lon_e,lat_e) and GRAV at Q=(lon_g,lat_g)
-            dist_pq = distance_pq(lon_e, lat_e, lon_g, lat_g);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_gl ---------------------------------------------------
-
-            for (int k = 0; k < ncgl-1; k++) {
-
-                dist1 = COVGL(k,0);    // tabulated distance
-                cov1 = COVGL(k,1);     // tabulated covariance 
-                dist2 = COVGL(k+1,0);
-                cov2 = COVGL(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_gl = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_gl = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncgl-2) {
-                    cout << "Radius to large, no C_gl for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_gl = 0.0;
-                }
-            }
-
-			// calculates C_eg --------------------------------------------
-
-            C_OBS(i,j) = (cos(theta_e) * C_gl) * s;
-        }
-    }
-
-    // (3) fills 3th part of C_OBS with COVGL -----------------------------
-	// from (ne,0) to (ne+ng-1,ne-1) with C_ge
-
-    for (int i = ne; i < ne+ng; i++) {
-
-        lon_g = OBS(i,0);    // lon GRAV at P
-        lat_g = OBS(i,1);    // lat GRAV at P
-
-        for (int j = 0; j < ne; j++) {
-
-            lon_e = OBS(j,0);    // lon SSG at Q (deg)
-            lat_e = OBS(j,1);    // lat SSG at Q (deg)
-	        azmth_e = OBS(j,3);  // azimuth SSG at Q (rad)
-
-	        // azimuth of PQ direction defined by pts P (GRAV) and Q (SSG)
-	        azmth_pq = azimuth_pq(lon_g, lat_g, lon_e, lat_e);  // rad
-
-            // Angle of SSG at Q related to PQ direction
-            theta_e = azmth_e - azmth_pq;  // rad
-            
-            // distance btw GRAV at P=(lon_g,lat_g) and SSG at Q=(lon_e,lat_e)
-            dist_pq = distance_pq(lon_g, lat_g, lon_e, lat_e);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_gl ---------------------------------------------------
-
-            for (int k = 0; k < ncgl-1; k++) {
-
-                dist1 = COVGL(k,0);    // tabulated distance
-                cov1 = COVGL(k,1);     // tabulated covariance 
-                dist2 = COVGL(k+1,0);
-                cov2 = COVGL(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_gl = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_gl = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncgl-2) {
-                    cout << "Radius to large, no C_gl for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_gl = 0.0;
-                }
-            }
-
-			// calculates C_ge --------------------------------------------
-
-            C_OBS(i,j) = (-cos(theta_e) * C_gl) * s;
-        }
-    }
-
-    // (4) fills 4th part of C_OBS with COVGG -----------------------------
-	// from (ne,ne) to (ne+ng-1,ne+ng-1) with C_gg + D_g
-
-    for (int i = ne; i < ne+ng; i++) {
-
-        lon_p = OBS(i,0);    // lon GRAV at P (deg)
-        lat_p = OBS(i,1);    // lat GRAV at P (deg)
-
-        for (int j = ne; j < ne+ng; j++) {
-
-            lon_q = OBS(j,0);    // lon GRAV at Q
-            lat_q = OBS(j,1);    // lat GRAV at Q
-
-            // distance btw GRAVs at P=(lon_p,lat_p) and Q=(lon_q,lat_q)
-            dist_pq = distance_pq(lon_p, lat_p, lon_q, lat_q);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_gg ---------------------------------------------------
-
-            for (int k = 0; k < ncgg-1; k++) {
-
-                dist1 = COVGG(k,0);    // tabulated distance
-                cov1 = COVGG(k,1);     // tabulated covariance 
-                dist2 = COVGG(k+1,0);
-                cov2 = COVGG(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_gg = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_gg = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == ncll-2) {
-                    cout << "Radius to large, no C_gg for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_gg = 0.0;
-                }
-            }
-
-			// C_gg -------------------------------------------------------
-
-            C_OBS(i,j) = C_gg * s;
-
-            // Adds the error variance to the diagonal element ------------
-            if (i == j && C_OBS(i,j) != 0) {                // TER CERTEZA !!!
-                
-				std = OBS(i,COL_STD_GRAV);                  // mGal
-                C_OBS(i,j) += std * std;                    // D_g (mGal**2)
-            }
-        }
-    }
-    """
-    vars = ['OBS', 'COVLL', 'COVMM', 'COVGG', 'COVGL', 'C_OBS', 'ne', 'ng', \
-	        'ncll', 'ncmm', 'ncgg', 'ncgl', 'scale', 'COL_STD_SSG', 'COL_STD_GRAV']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
-
-#--------------------------------------------------------------------------
-
-def LSC_solver1(C_sig, C_OBS, obs, var_sig):
-
-    """solves the Least Squares Collocation system: 
-
-        signal = C_sig * C_OBS_inv * obs
-        error = variance - C_sig * C_OBS_inv * C_sig_trasnp
+    SSG, GRAV = OBS[:ne], OBS[ne:ne+ng]
+    lon_e, lat_e, azmth_e = SSG[:,0], SSG[:,1], SSG[:,3]
+    lon_g, lat_g = GRAV[:,0], GRAV[:,1]
 
-    using the Hwang and Parsons (1995) algorithm:
-    
-        signal = b.T * y
-        error = variance - b.T * b
-		
-    for one single point.
-    """
+    # (1) fills 1st part of C_OBS with COVLL and COVMM 
+    # from (0,0) to (ne-1,ne-1) with C_ee + D_e
 
-    # signal calculation 
-    L = N.linalg.cholesky(C_OBS)     # cholesky decomposition = L_MAT
-    L_i = N.linalg.inv(L)            # L_MATRIX invertion
-    b = N.dot(L_i, C_sig.T)          # L_MAT_inv * sig_VEC_transp = b_VEC
-    b_t = b.T                        # b_VEC transpost
-    y = N.dot(L_i, obs)              # L_MAT_inv * obs_VEC = y_VEC
-    signal = N.dot(b_t, y)           # b_VEC_transp * y_VEC
-    
-    # error calculation
-    error = var_sig - N.dot(b_t, b)  # var_ESC - b_VEC_transp * b_VEC
+    C_ee = _cov_ee(SSG, COVLL, COVMM, scale)
+    std = SSG[:,COL_STD_SSG] * URAD_TO_ARCSEC    # urad > arcsec
+    _add_error_var(C_ee, std)                    # D_e (arcsec**2)
+    C_OBS[:ne,:ne] = C_ee
 
-    return signal, error
+    # (2) fills 2nd part of C_OBS with COVGL 
+    # from (0,ne) to (ne-1,ne+ng-1) with C_eg
 
-#--------------------------------------------------------------------------
+    # azimuth of PQ direction defined by pts P (SSG) and Q (GRAV)
+    azmth_pq = azimuth_pq(lon_e[:,None], lat_e[:,None], lon_g, lat_g)
+    theta_e = azmth_e[:,None] - azmth_pq         # rad
+    dist_pq = distance_pq(lon_e[:,None], lat_e[:,None], lon_g, lat_g)
+    C_gl = interp_cov(dist_pq, COVGL, 'C_gl')
+    C_OBS[:ne,ne:ne+ng] = (N.cos(theta_e) * C_gl) * scale
 
-def LSC_solver2(C_sig, C_OBS, obs, var_sig):
+    # (3) fills 3th part of C_OBS with COVGL 
+    # from (ne,0) to (ne+ng-1,ne-1) with C_ge
 
-    """solves the Least Squares Collocation system: 
+    # azimuth of PQ direction defined by pts P (GRAV) and Q (SSG)
+    azmth_pq = azimuth_pq(lon_g[:,None], lat_g[:,None], lon_e, lat_e)
+    theta_e = azmth_e - azmth_pq                 # rad
+    dist_pq = distance_pq(lon_g[:,None], lat_g[:,None], lon_e, lat_e)
+    C_gl = interp_cov(dist_pq, COVGL, 'C_gl')
+    C_OBS[ne:ne+ng,:ne] = (-N.cos(theta_e) * C_gl) * scale
 
-        signal = C_sig * C_OBS_inv * obs
-        error = variance - C_sig * C_OBS_inv * C_sig_transp
+    # (4) fills 4th part of C_OBS with COVGG 
+    # from (ne,ne) to (ne+ng-1,ne+ng-1) with C_gg + D_g
 
-    using conventional matrix invertion, for one single point.
-    """
-
-    # signal calculation 
-    C_OBS_i = N.linalg.inv(C_OBS)               # matrix invertion
-    signal = N.dot(N.dot(C_sig, C_OBS_i), obs)  # dot product
-
-    # error calculation
-    C_sig_t = C_sig.T                           # vector transpost
-    error = var_sig - N.dot(N.dot(C_sig, C_OBS_i), C_sig_t)
-
-    return signal, error
+    dist_pq = distance_pq(lon_g[:,None], lat_g[:,None], lon_g, lat_g)
+    C_gg = interp_cov(dist_pq, COVGG, 'C_gg') * scale
+    std = GRAV[:,COL_STD_GRAV]                   # mGal
+    _add_error_var(C_gg, std)                    # D_g (mGal**2)
+    C_OBS[ne:ne+ng,ne:ne+ng] = C_gg
 
 #--------------------------------------------------------------------------
 
@@ -1191,15 +443,153 @@ def scale_factor(obs, COVLL, ne, COVGG=False, ng=0):
     return s
 
 
+#--------------------------------------------------------------------------
+
+def solve_tile(task):
+
+    """Solves the LSC system for all the points of one tile of the grid.
+
+    Only the observations inside the tile plus a margin of half the 
+    inversion cell are used (the cells of the border points are complete).
+    `task` is a tuple (n, i1, i2, j1, j2) with the tile number and the
+    grid nodes: lats[i1:i2], lons[j1:j2]. Returns (n, k, RES) with the 
+    indices `k` of the points in the full grid and RES = [signal,error].
+    """
+
+    n, i1, i2, j1, j2 = task
+    lats = SHARED['lats'][i1:i2]
+    lons = SHARED['lons'][j1:j2]
+    COVLL, COVMM, COVGG = SHARED['COVLL'], SHARED['COVMM'], SHARED['COVGG']
+    COVGL, COVNL, COVNG = SHARED['COVGL'], SHARED['COVNL'], SHARED['COVNG']
+
+    # observations inside the tile + margin (same order as in the file)
+    r = (d if not d == None else l) / 2.0 + 1e-9
+    x1, x2, y1, y2 = lons[0] - r, lons[-1] + r, lats[0] - r, lats[-1] + r
+
+    def in_tile(DATA):
+        x, y = DATA[:,0], DATA[:,1]
+        return DATA[(x1 <= x) & (x <= x2) & (y1 <= y) & (y <= y2)]
+
+    DATAE = in_tile(SHARED['DATAE'])
+    AUXE = N.empty((DATAE.shape[0], 5), 'float64')
+    IDXE = PointIndex(DATAE)
+    if not filegrav == None:
+        DATAG = in_tile(SHARED['DATAG'])
+        AUXG = N.empty((DATAG.shape[0], 5), 'float64')
+        IDXG = PointIndex(DATAG)
+
+    nx = len(SHARED['lons'])
+    K = (N.arange(i1, i2)[:,None] * nx + N.arange(j1, j2)).ravel()
+    RES = N.zeros((len(K), 2), 'float64')         # signal = 0 if no obs
+    solver = LSCSolver(var_sig)
+    s = 1.0
+
+    def store(results):
+        for k, sig, err in results:
+            # mark to indicate an anomalous value
+            if N.abs(sig) > MAX_SIGNAL_VAL:
+                sig = ANOMALOUS_VAL
+                err = ANOMALOUS_VAL
+            RES[k,0] = sig                 # signal on grid point
+            RES[k,1] = err                 # error on grid point
+
+    k = -1
+    for lat in lats:
+        for lon in lons:
+
+            k += 1
+
+            # select points inside the inversion cell
+
+            if filegrav == None:
+                nobs = IDXE.select(AUXE, lon, lat, d, l)  # circular | square
+                key = (IDXE.ind,)
+            else:
+                ne = IDXE.select(AUXE, lon, lat, d, l)
+                ng = IDXG.select(AUXG, lon, lat, d, l)
+                nobs = ne + ng
+                key = (IDXE.ind, IDXG.ind)
+
+            # if no obs or not sufficient -> signal = 0
+            if nobs < MIN_OBS_PER_CELL:
+                continue
+
+            # if there are sufficient observations inside the cell 
+            # (i.e. it is a valid point of the grid outside the continent):
+            # fills obs, C_sig (cov_sig_obs), C_OBS (cov_obs_obs).
+            # If the obs are the same as for the previous grid point, the
+            # scale factor and factorization of C_OBS are reused.
+
+            reuse = solver.reuses(key)
+            C_OBS = None
+
+            ### (1) obsservations: SSG
+            if filegrav == None or ng == 0:        # no GRAV observations
+                OBS = AUXE[:nobs,:]                # SSGs
+                obs = OBS[:,2]                     # VECTOR of observations
+                C_sig = N.empty(nobs, 'float64')   # VECTOR of signal covs
+
+                # cell scale factor
+                if scale == True and not reuse:
+                    s = scale_factor(obs, COVLL, nobs)
+
+                # a) signal: GRAV
+                if signal == 'g':
+                    fills_cov_signal1(OBS, COVGL, C_sig, lon, lat, s)
+
+                # b) signal: GEOID
+                elif signal == 'n':
+                    fills_cov_signal1(OBS, COVNL, C_sig, lon, lat, s)
+
+                if not reuse:
+                    C_OBS = N.empty((nobs,nobs), 'float64') # MATRIX of obs covs + err
+                    fills_cov_observ1(OBS, COVLL, COVMM, C_OBS, s)
+
+            ### (2) observations: SSG + GRAV
+            else:					
+                OBS = AUXE[:ne,:]
+                OBS = N.vstack((OBS, AUXG[:ng,:]))
+                obs = OBS[:,2]                          
+                C_sig = N.empty(nobs, 'float64')        
+
+                # cell scale factor
+                if scale == True and not reuse:
+                    s = scale_factor(obs, COVLL, ne, COVGG, ng)
+
+                # a) signal: GRAV
+                if signal == 'g':
+                    fills_cov_signal2(OBS, COVGL, COVGG, C_sig, lon, lat, \
+                                      ne, ng, s)
+
+                # b) signal: GEOID
+                elif signal == 'n':
+                    fills_cov_signal2(OBS, COVNL, COVNG, C_sig, lon, lat, \
+                                      ne, ng, s)
+
+                if not reuse:
+                    C_OBS = N.empty((nobs,nobs), 'float64') 
+                    fills_cov_observ2(OBS, COVLL, COVMM, COVGG, COVGL, C_OBS, \
+                                      ne, ng, s)
+    			 
+            ### solves the LSC system: sig = C_sig * C_OBS_inv * obs
+            ### for each point (cell) in the grid: Cholesky factorization
+            ### (Hwang and Parsons, 1995), or LU if it fails, in batches
+
+            store(solver.add(k, key, C_sig, obs, C_OBS))
+
+    store(solver.flush())
+    return n, K, RES
+
+
 #--------------------------------------------------------------------------
 
 def main():
 
+    COVLL = COVMM = COVGG = COVGL = COVNL = COVNG = None
+
     ### (1) observations: SSG
     if filegrav == None:             
         DATAE = load_data(filessg, colse) 
-        ne = DATAE.shape[0]
-        AUXE = N.empty((ne, 5), 'float64')
         print 'observations: SSG'
 
         # a) signal: GRAV | covs: C_ll, C_mm, C_gl
@@ -1223,10 +613,7 @@ def main():
     ### (2) observations: SSG + GRAV
     else: 
         DATAE, DATAG = load_data(filessg, colse, filegrav, colsg) 
-        ne = DATAE.shape[0]
-        ng = DATAG.shape[0]
-        AUXE = N.empty((ne, 5), 'float64')
-        AUXG = N.empty((ng, 5), 'float64')
+        SHARED['DATAG'] = DATAG
         print 'observations: SSG + GRAV'
 
         # a) signal: GRAV | covs: C_ll, C_mm, C_gg, C_gl
@@ -1261,8 +648,6 @@ def main():
 
     if scale == True:
         print 'using cell scale factor (local covariances)'
-    else:
-        s = 1.0
 
     if not d == None:
         print 'circular inversion cell: d =', d, '(deg)'
@@ -1276,117 +661,53 @@ def main():
 
     # grid calculation ----------------------------------------------------
 
-    TEMP = N.empty(4, 'float64')
-    GRID = N.empty((0, 4), 'float64')
+    lats = N.arange(ymin, ymax, dy)
+    lons = N.arange(xmin, xmax, dx)
+    SHARED.update(DATAE=DATAE, lats=lats, lons=lons, COVLL=COVLL, 
+                  COVMM=COVMM, COVGG=COVGG, COVGL=COVGL, COVNL=COVNL, 
+                  COVNG=COVNG)
+
+    # the grid is solved by tiles, finished tiles are written to a grid 
+    # preallocated on disk: if the run is interrupted, running it again 
+    # with the same arguments skips the finished tiles
+    nt = max(1, int(round(tile/dx)))
+    tiles = get_tiles(len(lats), len(lons), nt)
+    GRID, DONE = open_grid(fileout, lons, lats, len(tiles))
+    tasks = [(n,) + t for n, t in enumerate(tiles) if not DONE[n]]
 
     print "grid spacing: %.2f' x %.2f'" % (dx*60.0, dy*60.0)
+    print 'tiles: %d x %d nodes, %d of %d already done' \
+          % (nt, nt, len(tiles) - len(tasks), len(tiles))
     print 'calculating grid: %.2f/%.2f/%.2f/%.2f ...' % region
 
-    for lat in N.arange(ymin, ymax, dy):
-        for lon in N.arange(xmin, xmax, dx):
-
-            # select points inside the inversion cell
-
-            if filegrav == None:
-                if not d == None:
-                    nobs = select_points(DATAE, AUXE, lon, lat, d)  # circular
-                else:
-                    nobs = select_points2(DATAE, AUXE, lon, lat, l) # square
-            else:
-                if not d == None:
-                    ne = select_points(DATAE, AUXE, lon, lat, d)  
-                    ng = select_points(DATAG, AUXG, lon, lat, d)
-                else:
-                    ne = select_points2(DATAE, AUXE, lon, lat, l)  
-                    ng = select_points2(DATAG, AUXG, lon, lat, l)
-                nobs = ne + ng
-
-            # if there are sufficient observations inside the cell 
-            # (i.e. it is a valid point of the grid outside the continent):
-            # fills obs, C_sig (cov_sig_obs), C_OBS (cov_obs_obs)
-
-            if nobs >= MIN_OBS_PER_CELL:  # num of sufficient obs for signal prediction
-                #print nobs
-                
-                ### (1) obsservations: SSG
-                if filegrav == None or ng == 0:        # no GRAV observations
-                    OBS = AUXE[:nobs,:]                # SSGs
-                    obs = OBS[:,2]                     # VECTOR of observations
-                    C_sig = N.empty(nobs, 'float64')   # VECTOR of signal covs
-                    C_OBS = N.empty((nobs,nobs), 'float64') # MATRIX of obs covs + err
-
-                    # cell scale factor
-                    if scale == True:
-                        s = scale_factor(obs, COVLL, nobs)
-
-                    # a) signal: GRAV
-                    if signal == 'g':
-                        fills_cov_signal1(OBS, COVGL, C_sig, lon, lat, s)
-                        fills_cov_observ1(OBS, COVLL, COVMM, C_OBS, s)
-
-                    # b) signal: GEOID
-                    elif signal == 'n':
-                        fills_cov_signal1(OBS, COVNL, C_sig, lon, lat, s)
-                        fills_cov_observ1(OBS, COVLL, COVMM, C_OBS, s)
-
-                ### (2) observations: SSG + GRAV
-                else:					
-                    OBS = AUXE[:ne,:]
-                    OBS = N.vstack((OBS, AUXG[:ng,:]))
-                    obs = OBS[:,2]                          
-                    C_sig = N.empty(nobs, 'float64')        
-                    C_OBS = N.empty((nobs,nobs), 'float64') 
-
-                    # cell scale factor
-                    if scale == True:
-                        s = scale_factor(obs, COVLL, ne, COVGG, ng)
-
-                    # a) signal: GRAV
-                    if signal == 'g':
-                        fills_cov_signal2(OBS, COVGL, COVGG, C_sig, lon, lat, \
-                                          ne, ng, s)
-                        fills_cov_observ2(OBS, COVLL, COVMM, COVGG, COVGL, C_OBS, \
-                                          ne, ng, s)
-
-                    # b) signal: GEOID
-                    elif signal == 'n':
-                        fills_cov_signal2(OBS, COVNL, COVNG, C_sig, lon, lat, \
-                                          ne, ng, s)
-                        fills_cov_observ2(OBS, COVLL, COVMM, COVGG, COVGL, C_OBS, \
-                                          ne, ng, s)
-    			 
-                ### solves the LSC system: sig = C_sig * C_OBS_inv * obs
-                ### for each point (cell) in the grid
-
-                # (1) using the Hwang and Parsons (1995) algorithm
-                try:
-                    sig, err = LSC_solver1(C_sig, C_OBS, obs, var_sig)
-
-                # (2) using conventional matrix inversion
-                except:
-                    sig, err = LSC_solver2(C_sig, C_OBS, obs, var_sig)
-
-                # mark to indicate an anomalous value
-                if N.abs(sig) > MAX_SIGNAL_VAL:
-                    sig = ANOMALOUS_VAL
-                    err = ANOMALOUS_VAL
+    # tiles are solved in parallel (the processes inherit SHARED), and 
+    # this process is the single writer of the grid on disk
+    if njobs > 1:
+        pool = mp.Pool(njobs)
+        results = pool.imap_unordered(solve_tile, tasks)
+    else:
+        results = imap(solve_tile, tasks)
 
-            # if no obs or not sufficient -> signal = 0 -------------------
-            else:
-                sig = 0.0         
-                err = 0.0
+    for n, K, RES in results:
+        GRID[K,2:] = RES
+        GRID.flush()
+        DONE[n] = 1                        # only after the tile is on disk
+        DONE.flush()
+        print 'tile %d of %d' % (DONE.sum(), len(tiles))
 
-            TEMP[0] = lon                  # lon grid point
-            TEMP[1] = lat                  # lat grid point
-            TEMP[2] = sig                  # signal on grid point
-            TEMP[3] = err                  # error on grid point
-    
-            GRID = N.vstack((GRID, TEMP))
+    if njobs > 1:
+        pool.close()
+        pool.join()
 
     print 'saving data ...'
     N.savetxt(fileout, GRID, fmt='%f', delimiter=' ')
     print 'output [lon,lat,signal,error] -> ' + fileout
 
+    # the run is complete, the work files are not needed anymore
+    del GRID, DONE
+    os.remove(fileout + '.grid.npy')
+    os.remove(fileout + '.tiles.npy')
+
 
 if __name__ == '__main__':
     main()
@@ -15,8 +15,8 @@
 import numpy as N
 import optparse
 from sys import argv, exit
-from scipy import weave
-from scipy.weave.converters import blitz
+from funcs import PointIndex, LSC_solver1, LSC_solver2, \
+                  distance_pq, interp_cov
 
 # Scan comand line arguments ----------------------------------------------
 
@@ -160,87 +160,43 @@ def load_data(filesdh, colsd, filegrav=None, colsg=None):
 
 #--------------------------------------------------------------------------
 
-def select_points(IN, OUT, lon, lat, d):
+def _cov_along(D, C, scale):
 
-    """Selects the pts inside the circle pi*(d/2)**2 
-	centering at (lon,lat) -> Circular inversion cell."""
+    # differences along the track of consecutive SDHs: C(Q+1) - C(Q), 
+    # the last SDH of the cell and the pairs btw two different tracks 
+    # (se h_q eh extremo de trilha) are filled with 0.001
+    C_d = N.empty_like(C)
+    C_d[...,-1] = 0.001                     # ultimo elemento eh descartado
+    same = N.abs(D[...,1:] - D[...,:-1]) < 0.1
+    C_d[...,:-1] = N.where(same, (C[...,1:] - C[...,:-1]) * scale, 0.001)
+    return C_d
 
-    nrow = IN.shape[0]
-    ncol = IN.shape[1]
-    r = d/2.0
+#--------------------------------------------------------------------------
 
-    functions = \
-    """
-	// Distance between two points (P and Q)
+def _cov_hh(OBS, COVHH, scale):
 
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
+    # C_dd + D_d btw all pairs of SDHs at P and Q (and P+1, Q+1)
+    lon, lat = OBS[:,0], OBS[:,1]
+    D = distance_pq(lon[:,None], lat[:,None], lon, lat)  # deg
+    C = interp_cov(D, COVHH, 'C_hh')
 
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-    """
-	
-    main_code = \
-    """
-	int k = 0;
-	double dist, x, y;
-
-    for (int i = 0; i < nrow; i++) {
-	    x = IN(i,0);  // lon
-	    y = IN(i,1);  // lat
-
-        dist = distance_pq(lon, lat, x, y);  // deg
-
-	    if (dist <= r) {
-	        for (int j = 0; j < ncol; j++){
-		        OUT(k,j) = IN(i,j);
-		    }
-	        k++;
-	   }
-	}
-
-	return_val = k;  // number of selected pts
-	"""
-    vars = ['IN', 'OUT', 'lon', 'lat', 'r', 'nrow', 'ncol']
-    return weave.inline(main_code, vars, support_code=functions, 
-	                    type_converters=blitz)
+    C_dd = N.empty_like(C)
+    C_dd.fill(0.001)                        # ultima linha/coluna descartada
 
-#--------------------------------------------------------------------------
-def select_points2(IN, OUT, lon, lat, l):
-
-    """Selects the pts inside the square l**2 centering 
-	at (lon,lat) -> Square inversion cell"""
-
-    nrow = IN.shape[0]
-    ncol = IN.shape[1]
-    r = l/2.0
-
-    main_code = \
-    """
-	int k = 0;
-	double x, y, xmin = lon, xmax = lon, ymin = lat, ymax = lat;
-
-    xmin -= r;
-	xmax += r;
-	ymin -= r;
-	ymax += r;
-
-    for (int i = 0; i < nrow; i++) {
-	    x = IN(i,0);  // lon
-	    y = IN(i,1);  // lat
-
-	    if ( xmin <= x && x <= xmax && ymin <= y && y <= ymax) {
-	        for (int j = 0; j < ncol; j++){
-		        OUT(k,j) = IN(i,j);
-		    }
-	        k++;
-	   }
-	}
-
-	return_val = k;  // number of selected pts
-	"""
-    vars = ['IN', 'OUT', 'lon', 'lat', 'r', 'nrow', 'ncol']
-    return weave.inline(main_code, vars, type_converters=blitz)
+    # se os dois pts (h_p e h_q) nao sao extremos de trilha
+    same = (N.abs(D[:-1,1:] - D[:-1,:-1]) < 0.1) & \
+           (N.abs(D[1:,:-1] - D[:-1,:-1]) < 0.1)
+    C_h2h2, C_h2h1 = C[1:,1:], C[1:,:-1]
+    C_h1h2, C_h1h1 = C[:-1,1:], C[:-1,:-1]
+    C_dd[:-1,:-1] = N.where(same, 
+                            (C_h2h2 - C_h2h1 - C_h1h2 + C_h1h1) * scale, 0.001)
+
+    # adds the error variance to the diagonal elements
+    i = N.arange(len(OBS) - 1)
+    diag = C_dd[i,i]
+    C_dd[i,i] = N.where(same[i,i] & (diag != 0),          # TER CERTEZA !!!
+                        diag + OBS[i,3], diag)            # + D_d
+    return C_dd
 
 #--------------------------------------------------------------------------
 
@@ -261,113 +217,12 @@ def fill_cov_signal1(OBS, COVSH, C_sig, lon_grid, lat_grid, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ne = OBS.shape[0] 
-    ncov = COVSH.shape[0]
-
-    functions = \
-    """
-	// Distance between two points (P and Q) ------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
+    # distance btw pts P (grid-signal) and Q (observation)
+    dist_pq = distance_pq(lon_grid, lat_grid, OBS[:,0], OBS[:,1])  # deg
+    C_sh = interp_cov(dist_pq, COVSH, 'C_sh')
 
-    main_code = \
-    """
-	using namespace std;
-    double lon_h1, lat_h1, lon_h2, lat_h2;
-	double dist1, dist2, cov1, cov2, w1, w2, C_sh1, C_sh2;
-	double dist_pq1, dist_pq2, s = scale;
-
-    for (int i = 0; i < ne-1; i++) {                                      //!!!!!! ne-1 ???
-
-        lon_h1 = OBS(i,0);    // SDH lon (deg)
-        lat_h1 = OBS(i,1);    // SDH lat (deg)
-
-        lon_h2 = OBS(i+1,0);    // SDH lon (deg)
-        lat_h2 = OBS(i+1,1);    // SDH lat (deg)
-     
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq1 = distance_pq(lon_grid, lat_grid, lon_h1, lat_h1);  // deg
-        dist_pq2 = distance_pq(lon_grid, lat_grid, lon_h2, lat_h2);  // deg
-
-		// se h_q nao eh extremo de trilha
-
-		if ( abs(dist_pq2 - dist_pq1) < 0.1 ) {
-
-            // finds a cov value according to distance btw: P--Q
-            for (int j = 0; j < ncov-1; j++) {
-            
-                dist1 = COVSH(j,0);    // tabulated distance
-                cov1 = COVSH(j,1);     // tabulated covariance 
-                dist2 = COVSH(j+1,0);
-                cov2 = COVSH(j+1,1);     
-            
-            	// a) if there is an exact tabulated distance no average is needed
-            	if (dist_pq1 == dist1) {
-            		C_sh1 = cov1;
-            	    break;
-                }
-            	// b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq1 && dist_pq1 <= dist2) {
-                    w1 = (dist2 - dist_pq1)/(dist2 - dist1);   // weight cov1 
-                    w2 = 1.0 - w1;                            // weight cov2
-                    C_sh1 = w1 * cov1 + w2 * cov2;             // weighted average
-            	    break;
-                }
-            	// c) if there isn't tabulated values for this distance in the file
-                else if (j == ncov-2) {
-                    cout << "Radius to large, no C_sh1 for: " << dist_pq1 << " deg, "
-                         << "filling with 0.0" << endl;
-            	    C_sh1 = 0.0;
-                }
-            }
-
-            //////////
-            
-            // finds a cov value according to distance btw: P--Q+1
-            for (int j = 0; j < ncov-1; j++) {
-            
-                dist1 = COVSH(j,0);    // tabulated distance
-                cov1 = COVSH(j,1);     // tabulated covariance 
-                dist2 = COVSH(j+1,0);
-                cov2 = COVSH(j+1,1);     
-            
-            	// a) if there is an exact tabulated distance no average is needed
-            	if (dist_pq2 == dist1) {
-            		C_sh2 = cov1;
-            	    break;
-                }
-            	// b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq2 && dist_pq2 <= dist2) {
-                    w1 = (dist2 - dist_pq2)/(dist2 - dist1);   // weight cov1 
-                    w2 = 1.0 - w1;                            // weight cov2
-                    C_sh2 = w1 * cov1 + w2 * cov2;             // weighted average
-            	    break;
-                }
-            	// c) if there isn't tabulated values for this distance in the file
-                else if (j == ncov-2) {
-                    cout << "Radius to large, no C_sh2 for: " << dist_pq2 << " deg, "
-                         << "filling with 0.0" << endl;
-            	    C_sh2 = 0.0;
-                }
-            }
-	        // calculates C_gd or C_nd ----------------------------------------
-
-            C_sig(i) = (C_sh2 - C_sh1) * s;
-		}
-		else
-            C_sig(i) = 0.001;
-    }
-
-    C_sig(ne-1) = 0.001;   // ultimo elemento eh descartado
-    """
-    vars = ['OBS', 'COVSH', 'C_sig', 'lon_grid', 'lat_grid', 'ne', \
-	        'ncov', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+    # calculates C_gd or C_nd
+    C_sig[:] = _cov_along(dist_pq, C_sh, scale)
 
 #--------------------------------------------------------------------------
 
@@ -392,164 +247,17 @@ def fill_cov_signal2(OBS, COVSH, COVSG, C_sig, lon_grid, lat_grid,
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ncsh = COVSH.shape[0]
-    ncsg = COVSG.shape[0]
+    # (1) fill first part of C_sig with COVSH: [0] to [ne-1] with C_sd
+    fill_cov_signal1(OBS[:ne], COVSH, C_sig[:ne], lon_grid, lat_grid, scale)
 
-    functions = \
-    """
-	// Distance between two point (P and Q) -------------------------------
+    # (2) fill second part of C_sig with COVSG: [ne] to [ne+ng-1] with C_sg
+    lon_grav = OBS[ne:ne+ng,0]  # lon GRAV at Q
+    lat_grav = OBS[ne:ne+ng,1]  # lat GRAV at Q
+    dist_pq = distance_pq(lon_grid, lat_grid, lon_grav, lat_grav)  # deg
+    C_sg = interp_cov(dist_pq, COVSG, 'C_sg')
 
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-    using namespace std;
-    double lon_h1, lat_h1, lon_h2, lat_h2;
-	double dist1, dist2, cov1, cov2, w1, w2, C_sh1, C_sh2;
-	double dist_pq1, dist_pq2;
-	double lon_grav, lat_grav, C_sg;
-	double s = scale;
-
-    // (1) fill first part of C_sig with COVSH ---------------------------
-    // from [0] to [ne-1] with C_sd
-
-    for (int i = 0; i < ne-1; i++) {                                      //!!!!!! ne-1 ???
-
-        lon_h1 = OBS(i,0);    // SDH lon (deg)
-        lat_h1 = OBS(i,1);    // SDH lat (deg)
-
-        lon_h2 = OBS(i+1,0);    // SDH lon (deg)
-        lat_h2 = OBS(i+1,1);    // SDH lat (deg)
-     
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq1 = distance_pq(lon_grid, lat_grid, lon_h1, lat_h1);  // deg
-        dist_pq2 = distance_pq(lon_grid, lat_grid, lon_h2, lat_h2);  // deg
-
-		if ( abs(dist_pq2 - dist_pq1) < 0.1 ) {   // se os pts pertencem a mesma trilha
-
-            // finds a cov value according to distance btw: P--Q
-            for (int j = 0; j < ncsh-1; j++) {
-            
-                dist1 = COVSH(j,0);    // tabulated distance
-                cov1 = COVSH(j,1);     // tabulated covariance 
-                dist2 = COVSH(j+1,0);
-                cov2 = COVSH(j+1,1);     
-            
-            	// a) if there is an exact tabulated distance no average is needed
-            	if (dist_pq1 == dist1) {
-            		C_sh1 = cov1;
-            	    break;
-                }
-            	// b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq1 && dist_pq1 <= dist2) {
-                    w1 = (dist2 - dist_pq1)/(dist2 - dist1);   // weight cov1 
-                    w2 = 1.0 - w1;                            // weight cov2
-                    C_sh1 = w1 * cov1 + w2 * cov2;             // weighted average
-            	    break;
-                }
-            	// c) if there isn't tabulated values for this distance in the file
-                else if (j == ncsh-2) {
-                    cout << "Radius to large, no C_sh1 for: " << dist_pq1 << " deg, "
-                         << "filling with 0.0" << endl;
-            	    C_sh1 = 0.0;
-                }
-            }
-
-            //////////
-            
-            // finds a cov value according to distance btw: P--Q+1
-            for (int j = 0; j < ncsh-1; j++) {
-            
-                dist1 = COVSH(j,0);    // tabulated distance
-                cov1 = COVSH(j,1);     // tabulated covariance 
-                dist2 = COVSH(j+1,0);
-                cov2 = COVSH(j+1,1);     
-            
-            	// a) if there is an exact tabulated distance no average is needed
-            	if (dist_pq2 == dist1) {
-            		C_sh2 = cov1;
-            	    break;
-                }
-            	// b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq2 && dist_pq2 <= dist2) {
-                    w1 = (dist2 - dist_pq2)/(dist2 - dist1);   // weight cov1 
-                    w2 = 1.0 - w1;                            // weight cov2
-                    C_sh2 = w1 * cov1 + w2 * cov2;             // weighted average
-            	    break;
-                }
-            	// c) if there isn't tabulated values for this distance in the file
-                else if (j == ncsh-2) {
-                    cout << "Radius to large, no C_sh2 for: " << dist_pq2 << " deg, "
-                         << "filling with 0.0" << endl;
-            	    C_sh2 = 0.0;
-                }
-            }
-	        // calculates C_gd or C_nd ----------------------------------------
-
-            C_sig(i) = (C_sh2 - C_sh1) * s;
-		}
-		else
-            C_sig(i) = 0.001;
-    }
-
-    C_sig(ne-1) = 0.001;   // ultimo elemento eh descartado
-
-
-    // (2) fill second part of C_sig with COVSG --------------------------
-    // from [ne] to [ne+ng-1] with C_sg
-
-    for (int i = ne; i < ne+ng; i++) {  
-
-        lon_grav = OBS(i,0);  // lon GRAV at Q
-        lat_grav = OBS(i,1);  // lat GRAV at Q
-
-        // distance btw pts P (grid-signal) and Q (observation)
-        dist_pq1 = distance_pq(lon_grid, lat_grid, lon_grav, lat_grav);  // deg
-     
-        // finds a cov value according to distance btw pts
-        for (int j = 0; j < ncsg-1; j++) {
-
-            dist1 = COVSG(j,0);    // tabulated distance
-            cov1 = COVSG(j,1);     // tabulated covariance 
-            dist2 = COVSG(j+1,0);
-            cov2 = COVSG(j+1,1);     
-
-			// a) if there is an exact tabulated distance no average is needed
-			if (dist_pq1 == dist1) {
-
-				C_sg = cov1;
-        	    break;
-            }
-			// b) if it is btw two values a weighted average is performed
-            else if (dist1 < dist_pq1 && dist_pq1 <= dist2) {
-
-                w1 = (dist2 - dist_pq1)/(dist2 - dist1);   // weight cov1 
-                w2 = 1.0 - w1;                            // weight cov2
-                C_sg = w1 * cov1 + w2 * cov2;             // weighted average
-        	    break;
-            }
-			// c) if there isn't tabulated values for this distance in the file
-            else if (j == ncsg-2) {
-
-                cout << "Radius to large, no C_sg for: " << dist_pq1 << " deg, "
-                     << "filling with 0.0" << endl;
-        	    C_sg = 0.0;
-            }
-        }
-
-		// C_gg or C_ng ---------------------------------------------------
-
-		C_sig(i) = C_sg * s;
-    }
-    """
-    vars = ['OBS', 'COVSH', 'COVSG', 'C_sig', 'lon_grid', 'lat_grid', \
-	        'ne', 'ng', 'ncsh', 'ncsg', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+    # C_gg or C_ng
+    C_sig[ne:ne+ng] = C_sg * scale
 
 #--------------------------------------------------------------------------
 
@@ -572,204 +280,7 @@ def fill_cov_observ1(OBS, COVHH, C_OBS, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    ne = OBS.shape[0] 
-    nchh = COVHH.shape[0]
-
-    functions = \
-    """
-	// Distance between two point (P and Q) -------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-    using namespace std;
-    double lon_p1, lon_p2, lat_p1, lat_p2, lon_q1, lon_q2, lat_q1, lat_q2; 
-	double dist_p1q1, dist_p1q2, dist_p2q1, dist_p2q2; 
-	double C_h1h1, C_h1h2, C_h2h1, C_h2h2;
-	double dist1, dist2, cov1, cov2, w1, w2;
-	double s = scale;
-
-    for (int i = 0; i < ne-1; i++) {
-
-        lon_p1 = OBS(i,0);    // lon h at P (deg)
-        lat_p1 = OBS(i,1);    // lat h at P (deg)
-        lon_p2 = OBS(i+1,0);  // lon h at P+1 (deg)
-        lat_p2 = OBS(i+1,1);  // lat h at P+1 (deg)
-
-        for (int j = 0; j < ne-1; j++) {
-
-            lon_q1 = OBS(j,0);    // lon h at Q
-            lat_q1 = OBS(j,1);    // lat h at Q
-            lon_q2 = OBS(j+1,0);  // lon h at Q+1
-            lat_q2 = OBS(j+1,1);  // lat h at Q+1
-
-            // distance btw h's
-            dist_p1q1 = distance_pq(lon_p1, lat_p1, lon_q1, lat_q1);  // deg
-            dist_p1q2 = distance_pq(lon_p1, lat_p1, lon_q2, lat_q2);  // deg
-            dist_p2q1 = distance_pq(lon_p2, lat_p2, lon_q1, lat_q1);  // deg
-            dist_p2q2 = distance_pq(lon_p2, lat_p2, lon_q2, lat_q2);  // deg
-
-			// se os dois pts (h_p e h_q) nao sao extremos de trilha
-
-  		    if ( (abs(dist_p1q2 - dist_p1q1) < 0.1) && (abs(dist_p2q1 - dist_p1q1) < 0.1) ) {
-
-                // finds a cov value according to distance btw pts:
-                
-                // for C_h1h1 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a) if there is an exact tabulated distance no average is needed
-                    if (dist_p1q1 == dist1) {
-                
-                    	C_h1h1 = cov1;
-                        break;
-                    }
-                    // b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_p1q1 && dist_p1q1 <= dist2) {
-                
-                        w1 = (dist2 - dist_p1q1)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        C_h1h1 = w1 * cov1 + w2 * cov2;            // weighted average
-                        break;
-                    }
-                    // c) if there isn't tabulated values for this distance in the file
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h1h1 for: " << dist_p1q1 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h1h1 = 0.0;
-                    }
-                }
-                
-                    // for C_h1h2 -------------------------------------------------
-                    
-                    for (int k = 0; k < nchh-1; k++) {
-                    
-                        dist1 = COVHH(k,0);    // tabulated distance
-                        cov1 = COVHH(k,1);     // tabulated covariance 
-                        dist2 = COVHH(k+1,0);
-                        cov2 = COVHH(k+1,1);     
-                    
-                        // a)
-                        if (dist_p1q2 == dist1) {
-                    
-                        	C_h1h2 = cov1;
-                            break;
-                        }
-                        // b)
-                        else if (dist1 < dist_p1q2 && dist_p1q2 <= dist2) {
-                    
-                            w1 = (dist2 - dist_p1q2)/(dist2 - dist1);  // weight cov1 
-                            w2 = 1.0 - w1;                           // weight cov2
-                            C_h1h2 = w1 * cov1 + w2 * cov2;            // weighted average
-                            break;
-                        }
-                        // c) 
-                        else if (k == nchh-2) {
-                    
-                            cout << "Radius to large, no C_h1h2 for: " << dist_p1q2 << " deg, "
-                                 << "filling with 0.0" << endl;
-                            C_h1h2 = 0.0;
-                        }
-                    }
-                
-                // for C_h2h1 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a)
-                    if (dist_p2q1 == dist1) {
-                
-                    	C_h2h1 = cov1;
-                        break;
-                    }
-                    // b)
-                    else if (dist1 < dist_p2q1 && dist_p2q1 <= dist2) {
-                
-                        w1 = (dist2 - dist_p2q1)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        
-                        break;
-                    }
-                    // c) 
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h2h1 for: " << dist_p2q1 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h2h1 = 0.0;
-                    }
-                }
-                
-                // for C_h2h2 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a)
-                    if (dist_p2q2 == dist1) {
-                
-                    	C_h2h2 = cov1;
-                        break;
-                    }
-                    // b)
-                    else if (dist1 < dist_p2q2 && dist_p2q2 <= dist2) {
-                
-                        w1 = (dist2 - dist_p2q2)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        C_h2h2 = w1 * cov1 + w2 * cov2;            // weighted average
-                        break;
-                    }
-                    // c) 
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h2h2 for: " << dist_p2q2 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h2h2 = 0.0;
-                    }
-                }
-                // C_dd -------------------------------------------------------
-                
-                C_OBS(i,j) = (C_h2h2 - C_h2h1 - C_h1h2 + C_h1h1) * s;
-                
-                // Adds the error variance to the diagonal element ------------
-                
-                if (i == j && C_OBS(i,j) != 0)                       // TER CERTEZA !!!
-                    C_OBS(i,j) += OBS(i,3);                          // + D_d
-
-			}
-			else
-				C_OBS(i,j) = 0.001;
-
-		}
-        C_OBS(i,ne-1) = 0.001;   // ultima coluna eh descartada
-	}
-	for (int j = 0; j < ne; j++) 
-        C_OBS(ne-1,j) = 0.001;   // ultima linha eh descartada
-
-    """
-    vars = ['OBS', 'COVHH','C_OBS', 'ne', 'nchh', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
+    C_OBS[:] = _cov_hh(OBS, COVHH, scale)
 
 #--------------------------------------------------------------------------
 
@@ -789,7 +300,6 @@ def fill_cov_observ2(OBS, COVHH, COVGG, COVGH, C_OBS, ne, ng, scale):
 
 	OBS = SDH (sea surface gradients inside a radius)
 	COVHH = covariances btw longitudinal components of SDH
-	COVMM = covariances btw transversal components of SDH
 	COVGG = covariances btw gravity anomalies GRAV
 	COVGH = covariances btw gravity anomaly and longitudinal comp of SDH
 	C_OBS = matrix of observations covariances
@@ -798,526 +308,30 @@ def fill_cov_observ2(OBS, COVHH, COVGG, COVGH, C_OBS, ne, ng, scale):
 	scale = scale factor related to the cell (cov: global -> local)
 	"""
 
-    nchh = COVHH.shape[0]
-    ncgg = COVGG.shape[0]
-    ncgh = COVGH.shape[0]
-
-    functions = \
-    """
-	// Distance between two point (P and Q) -------------------------------
-
-	double distance_pq(double lon_1, double lat_1, 
-	                   double lon_2, double lat_2) {
-
-			return hypot(lon_1 - lon_2, lat_1 - lat_2);
-	}
-	"""
-
-    main_code = \
-    """
-    using namespace std;
-    double lon_p1, lon_p2, lat_p1, lat_p2, lon_q1, lon_q2, lat_q1, lat_q2; 
-	double dist_p1q1, dist_p1q2, dist_p2q1, dist_p2q2; 
-	double C_h1h1, C_h1h2, C_h2h1, C_h2h2;
-	double dist1, dist2, cov1, cov2, w1, w2;
-
-    double lon_h1, lat_h1, lon_h2, lat_h2;
-	double C_sh1, C_sh2;
-	double dist_pq1, dist_pq2;
-	double lon_g, lat_g, C_sg;
-
-    double lon_p, lat_p, lon_q, lat_q; 
-	double dist_pq, C_gg; 
-
-	double s = scale;
-
-    // (1) fill 1st part of C_OBS with COVHH -------------------------
-
-	// from (0,0) to (ne-1,ne-1) with C_dd + D_d
-
-    for (int i = 0; i < ne-1; i++) {
-
-        lon_p1 = OBS(i,0);    // lon h at P (deg)
-        lat_p1 = OBS(i,1);    // lat h at P (deg)
-        lon_p2 = OBS(i+1,0);  // lon h at P+1 (deg)
-        lat_p2 = OBS(i+1,1);  // lat h at P+1 (deg)
-
-        for (int j = 0; j < ne-1; j++) {
-
-            lon_q1 = OBS(j,0);    // lon h at Q
-            lat_q1 = OBS(j,1);    // lat h at Q
-            lon_q2 = OBS(j+1,0);  // lon h at Q+1
-            lat_q2 = OBS(j+1,1);  // lat h at Q+1
-
-            // distance btw h's
-            dist_p1q1 = distance_pq(lon_p1, lat_p1, lon_q1, lat_q1);  // deg
-            dist_p1q2 = distance_pq(lon_p1, lat_p1, lon_q2, lat_q2);  // deg
-            dist_p2q1 = distance_pq(lon_p2, lat_p2, lon_q1, lat_q1);  // deg
-            dist_p2q2 = distance_pq(lon_p2, lat_p2, lon_q2, lat_q2);  // deg
-
-			// se os dois pts (h_p e h_q) nao sao extremos de trilha
-
-  		    if ( (abs(dist_p1q2 - dist_p1q1) < 0.1) && (abs(dist_p2q1 - dist_p1q1) < 0.1) ) {
-
-                // finds a cov value according to distance btw pts:
-                
-                // for C_h1h1 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a) if there is an exact tabulated distance no average is needed
-                    if (dist_p1q1 == dist1) {
-                
-                    	C_h1h1 = cov1;
-                        break;
-                    }
-                    // b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_p1q1 && dist_p1q1 <= dist2) {
-                
-                        w1 = (dist2 - dist_p1q1)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        C_h1h1 = w1 * cov1 + w2 * cov2;            // weighted average
-                        break;
-                    }
-                    // c) if there isn't tabulated values for this distance in the file
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h1h1 for: " << dist_p1q1 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h1h1 = 0.0;
-                    }
-                }
-                
-                    // for C_h1h2 -------------------------------------------------
-                    
-                    for (int k = 0; k < nchh-1; k++) {
-                    
-                        dist1 = COVHH(k,0);    // tabulated distance
-                        cov1 = COVHH(k,1);     // tabulated covariance 
-                        dist2 = COVHH(k+1,0);
-                        cov2 = COVHH(k+1,1);     
-                    
-                        // a)
-                        if (dist_p1q2 == dist1) {
-                    
-                        	C_h1h2 = cov1;
-                            break;
-                        }
-                        // b)
-                        else if (dist1 < dist_p1q2 && dist_p1q2 <= dist2) {
-                    
-                            w1 = (dist2 - dist_p1q2)/(dist2 - dist1);  // weight cov1 
-                            w2 = 1.0 - w1;                           // weight cov2
-                            C_h1h2 = w1 * cov1 + w2 * cov2;            // weighted average
-                            break;
-                        }
-                        // c) 
-                        else if (k == nchh-2) {
-                    
-                            cout << "Radius to large, no C_h1h2 for: " << dist_p1q2 << " deg, "
-                                 << "filling with 0.0" << endl;
-                            C_h1h2 = 0.0;
-                        }
-                    }
-                
-                // for C_h2h1 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a)
-                    if (dist_p2q1 == dist1) {
-                
-                    	C_h2h1 = cov1;
-                        break;
-                    }
-                    // b)
-                    else if (dist1 < dist_p2q1 && dist_p2q1 <= dist2) {
-                
-                        w1 = (dist2 - dist_p2q1)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        C_h2h1 = w1 * cov1 + w2 * cov2;            // weighted average
-                        break;
-                    }
-                    // c) 
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h2h1 for: " << dist_p2q1 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h2h1 = 0.0;
-                    }
-                }
-                
-                // for C_h2h2 -------------------------------------------------
-                
-                for (int k = 0; k < nchh-1; k++) {
-                
-                    dist1 = COVHH(k,0);    // tabulated distance
-                    cov1 = COVHH(k,1);     // tabulated covariance 
-                    dist2 = COVHH(k+1,0);
-                    cov2 = COVHH(k+1,1);     
-                
-                    // a)
-                    if (dist_p2q2 == dist1) {
-                
-                    	C_h2h2 = cov1;
-                        break;
-                    }
-                    // b)
-                    else if (dist1 < dist_p2q2 && dist_p2q2 <= dist2) {
-                
-                        w1 = (dist2 - dist_p2q2)/(dist2 - dist1);  // weight cov1 
-                        w2 = 1.0 - w1;                           // weight cov2
-                        C_h2h2 = w1 * cov1 + w2 * cov2;            // weighted average
-                        break;
-                    }
-                    // c) 
-                    else if (k == nchh-2) {
-                
-                        cout << "Radius to large, no C_h2h2 for: " << dist_p2q2 << " deg, "
-                             << "filling with 0.0" << endl;
-                        C_h2h2 = 0.0;
-                    }
-                }
-                // C_dd -------------------------------------------------------
-                
-                C_OBS(i,j) = (C_h2h2 - C_h2h1 - C_h1h2 + C_h1h1) * s;
-                
-                // Adds the error variance to the diagonal element ------------
-                
-                if (i == j && C_OBS(i,j) != 0)                       // TER CERTEZA !!!
-                    C_OBS(i,j) += OBS(i,3);                          // + D_d
-
-			}
-			else
-				C_OBS(i,j) = 0.001;
-
-		}
-        C_OBS(i,ne-1) = 0.001;   // ultima coluna eh descartada
-	}
-	for (int j = 0; j < ne; j++) 
-        C_OBS(ne-1,j) = 0.001;   // ultima linha eh descartada
-
-    //////////////
-
-    // (2) fill 2nd part of C_OBS with COVGH -----------------------------
-
-	// from (0,ne) to (ne-1,ne+ng-1) with C_dg
-
-    for (int i = 0; i < ne-1; i++) {                                      //!!!!!! ne-1 ???
-
-        lon_h1 = OBS(i,0);    // SDH lon (deg)
-        lat_h1 = OBS(i,1);    // SDH lat (deg)
-
-        lon_h2 = OBS(i+1,0);    // SDH lon (deg)
-        lat_h2 = OBS(i+1,1);    // SDH lat (deg)
-
-        for (int j = ne; j < ne+ng; j++) {
-
-            lon_g = OBS(j,0);    // lon GRAV at Q
-            lat_g = OBS(j,1);    // lat GRAV at Q
-     
-            // distance btw pts P (grid-signal) and Q (observation)
-            dist_pq1 = distance_pq(lon_g, lat_g, lon_h1, lat_h1);  // deg
-            dist_pq2 = distance_pq(lon_g, lat_g, lon_h2, lat_h2);  // deg
-            
-            if ( abs(dist_pq2 - dist_pq1) < 0.1 ) {   // se o h1 e h2 pertencem a mesma trilha
-            
-                // finds a cov value according to distance btw: P--Q
-                for (int k = 0; k < ncgh-1; k++) {
-                
-                    dist1 = COVGH(k,0);    // tabulated distance
-                    cov1 = COVGH(k,1);     // tabulated covariance 
-                    dist2 = COVGH(k+1,0);
-                    cov2 = COVGH(k+1,1);     
-                
-                	// a) if there is an exact tabulated distance no average is needed
-                	if (dist_pq1 == dist1) {
-
-                		C_sh1 = cov1;
-                	    break;
-                    }
-                	// b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_pq1 && dist_pq1 <= dist2) {
-
-                        w1 = (dist2 - dist_pq1)/(dist2 - dist1);   // weight cov1 
-                        w2 = 1.0 - w1;                            // weight cov2
-                        C_sh1 = w1 * cov1 + w2 * cov2;             // weighted average
-                	    break;
-                    }
-                	// c) if there isn't tabulated values for this distance in the file
-                    else if (k == ncgh-2) {
-
-                        cout << "Radius to large, no C_sh1 for: " << dist_pq1 << " deg, "
-                             << "filling with 0.0" << endl;
-                	    C_sh1 = 0.0;
-                    }
-                }
-            
-                //////////
-                
-                // finds a cov value according to distance btw: P--Q+1
-                for (int k = 0; k < ncgh-1; k++) {
-                
-                    dist1 = COVGH(k,0);    // tabulated distance
-                    cov1 = COVGH(k,1);     // tabulated covariance 
-                    dist2 = COVGH(k+1,0);
-                    cov2 = COVGH(k+1,1);     
-                
-                	// a) if there is an exact tabulated distance no average is needed
-                	if (dist_pq2 == dist1) {
-
-                		C_sh2 = cov1;
-                	    break;
-                    }
-                	// b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_pq2 && dist_pq2 <= dist2) {
-
-                        w1 = (dist2 - dist_pq2)/(dist2 - dist1);   // weight cov1 
-                        w2 = 1.0 - w1;                            // weight cov2
-                        C_sh2 = w1 * cov1 + w2 * cov2;             // weighted average
-                	    break;
-                    }
-                	// c) if there isn't tabulated values for this distance in the file
-                    else if (k == ncgh-2) {
-
-                        cout << "Radius to large, no C_sh2 for: " << dist_pq2 << " deg, "
-                             << "filling with 0.0" << endl;
-                	    C_sh2 = 0.0;
-                    }
-                }
-                // calculates C_gd or C_nd ----------------------------------------
-            
-                C_OBS(i,j) = (C_sh2 - C_sh1) * s;
-            }
-            else
-                C_OBS(i,j) = 0.001;
-		}
-	}
-    for (int j = ne; j < ne+ng; j++) 
-        C_OBS(ne-1,j) = 0.001;   // ultima linha eh descartada
-
-    /////////////////////
-
-    // (3) fill 3th part of C_OBS with COVGH -----------------------------
-
-	// from (ne,0) to (ne+ng-1,ne-1) with C_gd = C_dg
-
-    for (int i = ne; i < ne+ng; i++) {
-
-        lon_g = OBS(i,0);    // lon GRAV at P
-        lat_g = OBS(i,1);    // lat GRAV at P
-
-        for (int j = 0; j < ne-1; j++) {
-
-            lon_h1 = OBS(j,0);    // SDH lon (deg)
-            lat_h1 = OBS(j,1);    // SDH lat (deg)
-
-            lon_h2 = OBS(j+1,0);    // SDH lon (deg)
-            lat_h2 = OBS(j+1,1);    // SDH lat (deg)
-
-            // distance btw pts P (grid-signal) and Q (observation)
-            dist_pq1 = distance_pq(lon_g, lat_g, lon_h1, lat_h1);  // deg
-            dist_pq2 = distance_pq(lon_g, lat_g, lon_h2, lat_h2);  // deg
-            
-            if ( abs(dist_pq2 - dist_pq1) < 0.1 ) {   // se o h1 e h2 pertencem a mesma trilha
-            
-                // finds a cov value according to distance btw: P--Q
-                for (int k = 0; k < ncgh-1; k++) {
-                
-                    dist1 = COVGH(k,0);    // tabulated distance
-                    cov1 = COVGH(k,1);     // tabulated covariance 
-                    dist2 = COVGH(k+1,0);
-                    cov2 = COVGH(k+1,1);     
-                
-                	// a) if there is an exact tabulated distance no average is needed
-                	if (dist_pq1 == dist1) {
-
-                		C_sh1 = cov1;
-                	    break;
-                    }
-                	// b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_pq1 && dist_pq1 <= dist2) {
-
-                        w1 = (dist2 - dist_pq1)/(dist2 - dist1);   // weight cov1 
-                        w2 = 1.0 - w1;                            // weight cov2
-                        C_sh1 = w1 * cov1 + w2 * cov2;             // weighted average
-                	    break;
-                    }
-                	// c) if there isn't tabulated values for this distance in the file
-                    else if (k == ncgh-2) {
-
-                        cout << "Radius to large, no C_sh1 for: " << dist_pq1 << " deg, "
-                             << "filling with 0.0" << endl;
-                	    C_sh1 = 0.0;
-                    }
-                }
-            
-                //////////
-                
-                // finds a cov value according to distance btw: P--Q+1
-                for (int k = 0; k < ncgh-1; k++) {
-                
-                    dist1 = COVGH(k,0);    // tabulated distance
-                    cov1 = COVGH(k,1);     // tabulated covariance 
-                    dist2 = COVGH(k+1,0);
-                    cov2 = COVGH(k+1,1);     
-                
-                	// a) if there is an exact tabulated distance no average is needed
-                	if (dist_pq2 == dist1) {
-
-                		C_sh2 = cov1;
-                	    break;
-                    }
-                	// b) if it is btw two values a weighted average is performed
-                    else if (dist1 < dist_pq2 && dist_pq2 <= dist2) {
-
-                        w1 = (dist2 - dist_pq2)/(dist2 - dist1);   // weight cov1 
-                        w2 = 1.0 - w1;                            // weight cov2
-                        C_sh2 = w1 * cov1 + w2 * cov2;             // weighted average
-                	    break;
-                    }
-                	// c) if there isn't tabulated values for this distance in the file
-                    else if (k == ncgh-2) {
-
-                        cout << "Radius to large, no C_sh2 for: " << dist_pq2 << " deg, "
-                             << "filling with 0.0" << endl;
-                	    C_sh2 = 0.0;
-                    }
-                }
-                // calculates C_dg or C_dn ----------------------------------------
-            
-                C_OBS(i,j) = (C_sh2 - C_sh1) * s;
-            }
-            else
-                C_OBS(i,j) = 0.001;
-        }
-        C_OBS(i,ne-1) = 0.001;   // ultima coluna eh descartada
-    }
-
-    // (4) fill 4th part of C_OBS with COVGG -----------------------------
-
-	// from (ne,ne) to (ne+ng-1,ne+ng-1) with C_gg + D_g
-
-    for (int i = ne; i < ne+ng; i++) {
-
-        lon_p = OBS(i,0);    // lon GRAV at P (deg)
-        lat_p = OBS(i,1);    // lat GRAV at P (deg)
-
-        for (int j = ne; j < ne+ng; j++) {
-
-            lon_q = OBS(j,0);    // lon GRAV at Q
-            lat_q = OBS(j,1);    // lat GRAV at Q
-
-            // distance btw GRAVs at P=(lon_p,lat_p) and Q=(lon_q,lat_q)
-            dist_pq = distance_pq(lon_p, lat_p, lon_q, lat_q);  // deg
-            
-            // finds a cov value according to distance btw pts:
-
-            // for C_gg ---------------------------------------------------
-
-            for (int k = 0; k < ncgg-1; k++) {
-
-                dist1 = COVGG(k,0);    // tabulated distance
-                cov1 = COVGG(k,1);     // tabulated covariance 
-                dist2 = COVGG(k+1,0);
-                cov2 = COVGG(k+1,1);     
-
-		        // a) if there is an exact tabulated distance no average is needed
-		        if (dist_pq == dist1) {
-		        	C_gg = cov1;
-                    break;
-                }
-		        // b) if it is btw two values a weighted average is performed
-                else if (dist1 < dist_pq && dist_pq <= dist2) {
-                    w1 = (dist2 - dist_pq)/(dist2 - dist1);  // weight cov1 
-                    w2 = 1.0 - w1;                           // weight cov2
-                    C_gg = w1 * cov1 + w2 * cov2;            // weighted average
-                    break;
-                }
-		        // c) if there isn't tabulated values for this distance in the file
-                else if (k == nchh-2) {
-                    cout << "Radius to large, no C_gg for: " << dist_pq << " deg, "
-                         << "filling with 0.0" << endl;
-                    C_gg = 0.0;
-                }
-            }
-
-			// C_gg -------------------------------------------------------
-
-            C_OBS(i,j) = C_gg * s;
-
-            // Adds the error variance to the diagonal element ------------
-
-            if (i == j && C_OBS(i,j) != 0)                       // TER CERTEZA !!!
-                C_OBS(i,j) += OBS(i,3);                          // + D_g
-        }
-    }
-    """
-    vars = ['OBS', 'COVHH', 'COVGG', 'COVGH', 'C_OBS', 'ne', 'ng', \
-	        'nchh', 'ncgg', 'ncgh', 'scale']
-    weave.inline(main_code, vars, support_code=functions, type_converters=blitz)
-
-#--------------------------------------------------------------------------
-
-def LSC_solver1(C_sig, C_OBS, obs, var_sig):
-
-    """solves the Least Squares Collocation system: 
-
-        signal = C_sig * C_OBS_inv * obs
-        error = variance - C_sig * C_OBS_inv * C_sig_tansp
-
-    using the Hwang and Parsons (1995) algorithm:
-    
-        signal = b.T * y
-        error = variance - b.T * b
-		
-    for one single point.
-    """
-
-    # signal calculation 
-    L = N.linalg.cholesky(C_OBS)     # cholesky decomposition = L_MAT
-    L_i = N.linalg.inv(L)            # L_MATRIX invertion
-    b = N.dot(L_i, C_sig.T)          # L_MAT_inv * sig_VEC_transp = b_VEC
-    b_t = b.T                        # b_VEC transpost
-    y = N.dot(L_i, obs)              # L_MAT_inv * obs_VEC = y_VEC
-    signal = N.dot(b_t, y)           # b_VEC_transp * y_VEC
-    
-    # error calculation
-    error = var_sig - N.dot(b_t, b)  # var_ESC - b_VEC_transp * b_VEC
-
-    return signal, error
-
-#--------------------------------------------------------------------------
-
-def LSC_solver2(C_sig, C_OBS, obs, var_sig):
-
-    """solves the Least Squares Collocation system: 
-
-        signal = C_sig * C_OBS_inv * obs
-        error = variance - C_sig * C_OBS_inv * C_sig_tansp
-
-    using conventional matrix invertion, for one single point.
-    """
-
-    # signal calculation 
-    C_OBS_i = N.linalg.inv(C_OBS)               # matrix invertion
-    signal = N.dot(N.dot(C_sig, C_OBS_i), obs)  # dot product
-
-    # error calculation
-    C_sig_t = C_sig.T                           # vector transpost
-    error = var_sig - N.dot(N.dot(C_sig, C_OBS_i), C_sig_t)
-
-    return signal, error
+    SDH, GRAV = OBS[:ne], OBS[ne:ne+ng]
+    lon_h, lat_h = SDH[:,0], SDH[:,1]
+    lon_g, lat_g = GRAV[:,0], GRAV[:,1]
+
+    # (1) fill 1st part of C_OBS with COVHH 
+    # from (0,0) to (ne-1,ne-1) with C_dd + D_d
+    C_OBS[:ne,:ne] = _cov_hh(SDH, COVHH, scale)
+
+    # (2) and (3) fill 2nd and 3th parts of C_OBS with COVGH 
+    # from (ne,0) to (ne+ng-1,ne-1) with C_gd, and C_dg = C_gd.T
+    dist_pq = distance_pq(lon_g[:,None], lat_g[:,None], lon_h, lat_h)  # deg
+    C_gh = interp_cov(dist_pq, COVGH, 'C_gh')
+    C_gd = _cov_along(dist_pq, C_gh, scale)
+    C_OBS[ne:ne+ng,:ne] = C_gd
+    C_OBS[:ne,ne:ne+ng] = C_gd.T
+
+    # (4) fill 4th part of C_OBS with COVGG 
+    # from (ne,ne) to (ne+ng-1,ne+ng-1) with C_gg + D_g
+    dist_pq = distance_pq(lon_g[:,None], lat_g[:,None], lon_g, lat_g)  # deg
+    C_gg = interp_cov(dist_pq, COVGG, 'C_gg') * scale
+    i = N.arange(ng)
+    diag = C_gg[i,i]
+    C_gg[i,i] = N.where(diag != 0, diag + GRAV[:,3], diag)  # + D_g
+    C_OBS[ne:ne+ng,ne:ne+ng] = C_gg
 
 #--------------------------------------------------------------------------
 
@@ -1372,6 +386,7 @@ def main():
         DATAE = load_data(filesdh, colsd) 
         ne = DATAE.shape[0]
         AUXE = N.empty((ne, 4), 'float64')
+        IDXE = PointIndex(DATAE)           # spatial index (built once)
         print 'observations: SDH'
 
         # a) signal: GRAV | covs: C_ll, C_mm, C_gl
@@ -1396,6 +411,8 @@ def main():
         ng = DATAG.shape[0]
         AUXE = N.empty((ne, 4), 'float64')
         AUXG = N.empty((ng, 4), 'float64')
+        IDXE = PointIndex(DATAE)           # spatial indices (built once)
+        IDXG = PointIndex(DATAG)
         print 'observations: SDH + GRAV'
 
         # a) signal: GRAV | covs: C_ll, C_mm, C_gg, C_gl
@@ -1454,19 +471,11 @@ def main():
             # select points inside the inversion cell
 
             if filegrav == None:
-                if not d == None:
-                    nobs = select_points(DATAE, AUXE, lon, lat, d)  # circular
-                    ne = nobs
-                else:
-                    nobs = select_points2(DATAE, AUXE, lon, lat, l) # square
-                    ne = nobs
+                nobs = IDXE.select(AUXE, lon, lat, d, l)  # circular | square
+                ne = nobs
             else:
-                if not d == None:
-                    ne = select_points(DATAE, AUXE, lon, lat, d)  
-                    ng = select_points(DATAG, AUXG, lon, lat, d)
-                else:
-                    ne = select_points2(DATAE, AUXE, lon, lat, l)  
-                    ng = select_points2(DATAG, AUXG, lon, lat, l)
+                ne = IDXE.select(AUXE, lon, lat, d, l)
+                ng = IDXG.select(AUXG, lon, lat, d, l)
                 nobs = ne + ng
 
             # if there are sufficient observations inside the cell 
@@ -0,0 +1,339 @@
+"""
+Module containing functions and classes used by:
+
+colloc.py
+colloc2.py
+
+"""
+# October 17, 2026
+
+import os
+import numpy as N
+from numpy.lib.format import open_memmap
+from scipy.spatial import cKDTree
+from scipy.linalg import solve_triangular, lu_factor, lu_solve
+
+PI = 3.1415926535897931
+R = 6371007.1809               # Earth's radius in m (WGS 84)
+
+#--------------------------------------------------------------------------
+
+def distance_pq(lon_1, lat_1, lon_2, lat_2):
+
+    """Distance between points P and Q (deg), arrays are broadcast."""
+
+    return N.hypot(lon_1 - lon_2, lat_1 - lat_2)
+
+#--------------------------------------------------------------------------
+
+def azimuth_pq(lon_1, lat_1, lon_2, lat_2):
+
+    """Azimuth (> 0) in rad of direction defined by pts P and Q.
+
+    The arguments must be in DEGREES, arrays are broadcast.
+    """
+
+    lon1 = lon_1 * (PI/180.)               # deg -> rad
+    lat1 = lat_1 * (PI/180.)
+    lon2 = lon_2 * (PI/180.)
+    lat2 = lat_2 * (PI/180.)
+
+    latm = (lat1 + lat2) / 2.0
+    dx = R * N.cos(latm) * (lon2 - lon1)
+    dy = R * (lat2 - lat1)
+    azmth = N.arctan2(dx, dy)
+
+    # for getting azmth > 0 always
+    return N.where(azmth < 0, azmth + 2*PI, azmth)
+
+#--------------------------------------------------------------------------
+
+def interp_cov(dist, COV, name=None):
+
+    """Finds covariances for the distances `dist` (any shape) by linear 
+    interpolation from tabulated covs COV [deg,cov]: a weighted average 
+    btw the two closest values is performed (same rule as the old weave 
+    kernels). Distances out of the table are filled with 0.0, and if 
+    `name` is given a message is printed.
+    """
+
+    dist = N.asarray(dist, 'float64')
+    dist1, cov1 = COV[:,0], COV[:,1]
+    ncov = len(dist1)
+
+    # dist1[k-1] < dist <= dist1[k]
+    k = N.searchsorted(dist1, dist, side='left')
+    inside = (0 < k) & (k < ncov)
+    k = N.clip(k, 1, ncov-1)
+    d1, d2 = dist1[k-1], dist1[k]
+    c1, c2 = cov1[k-1], cov1[k]
+
+    with N.errstate(divide='ignore', invalid='ignore'):
+        w1 = (d2 - dist)/(d2 - d1)             # weight cov1 
+        w2 = 1.0 - w1                          # weight cov2
+        C = w1 * c1 + w2 * c2                  # weighted average
+
+    # if there is an exact tabulated distance no average is needed
+    first = (dist == dist1[0])
+    C = N.where(first, cov1[0], C)
+
+    # if there isn't tabulated values for this distance in the file
+    out = ~(inside | first)
+    if out.any():
+        C = N.where(out, 0.0, C)
+        if name is not None:
+            print 'Radius to large, no %s for %d distances (max %g deg), ' \
+                  'filling with 0.0' % (name, out.sum(), dist[out].max())
+    return C
+
+#--------------------------------------------------------------------------
+
+class PointIndex(object):
+
+    """Spatial index (k-d tree) of the observation locations.
+
+    Built once over a data array [lon,lat,...] and queried for every
+    grid point: O(log N + k) per inversion cell instead of a full scan.
+
+    The selection is the same as the old `select_points` (circular cell)
+    and `select_points2` (square cell) kernels, including the order of
+    the selected observations (same as in the input array).
+    """
+
+    def __init__(self, DATA):
+        self.DATA = DATA
+        self.x = DATA[:,0]  # lon
+        self.y = DATA[:,1]  # lat
+        self.tree = cKDTree(DATA[:,:2])
+
+    def _candidates(self, lon, lat, r, p):
+        # slightly larger radius, exact test is done afterwards
+        r_ = r * (1 + 1e-9) + 1e-12
+        ind = self.tree.query_ball_point((lon, lat), r_, p=p)
+        ind = N.asarray(ind, 'int64')
+        ind.sort()                                # input order
+        return ind
+
+    def circle(self, lon, lat, d):
+        """Indices of the pts inside the circle pi*(d/2)**2
+        centering at (lon,lat) -> Circular inversion cell."""
+        r = d/2.0
+        ind = self._candidates(lon, lat, r, 2)
+        dist = N.hypot(lon - self.x[ind], lat - self.y[ind])  # deg
+        return ind[dist <= r]
+
+    def square(self, lon, lat, l):
+        """Indices of the pts inside the square l**2 centering
+        at (lon,lat) -> Square inversion cell."""
+        r = l/2.0
+        ind = self._candidates(lon, lat, r, N.inf)
+        x, y = self.x[ind], self.y[ind]
+        xmin, xmax, ymin, ymax = lon - r, lon + r, lat - r, lat + r
+        return ind[(xmin <= x) & (x <= xmax) & (ymin <= y) & (y <= ymax)]
+
+    def select(self, OUT, lon, lat, d=None, l=None):
+        """Copy the pts inside the circular (`d`) or square (`l`)
+        cell to OUT and return the number of selected pts (their
+        indices are kept in `self.ind`)."""
+        if not d == None:
+            ind = self.circle(lon, lat, d)
+        else:
+            ind = self.square(lon, lat, l)
+        self.ind = ind
+        k = len(ind)
+        OUT[:k,:self.DATA.shape[1]] = self.DATA[ind,:]
+        return k
+
+#--------------------------------------------------------------------------
+
+def LSC_solver1(C_sig, C_OBS, obs, var_sig):
+
+    """solves the Least Squares Collocation system: 
+
+        signal = C_sig * C_OBS_inv * obs
+        error = variance - C_sig * C_OBS_inv * C_sig_transp
+
+    using the Hwang and Parsons (1995) algorithm:
+    
+        signal = b.T * y
+        error = variance - b.T * b
+
+    with b and y from triangular solves with the Cholesky factor L
+    (L * b = C_sig_transp, L * y = obs), for one single point.
+    """
+
+    L = N.linalg.cholesky(C_OBS)               # cholesky decomposition
+    return _solve_cholesky(L, C_sig, obs, var_sig)
+
+#--------------------------------------------------------------------------
+
+def LSC_solver2(C_sig, C_OBS, obs, var_sig):
+
+    """solves the Least Squares Collocation system: 
+
+        signal = C_sig * C_OBS_inv * obs
+        error = variance - C_sig * C_OBS_inv * C_sig_transp
+
+    using the LU decomposition of C_OBS (fallback if C_OBS is not 
+    positive definite), for one single point.
+    """
+
+    LU = lu_factor(C_OBS)
+    return _solve_lu(LU, C_sig, obs, var_sig)
+
+#--------------------------------------------------------------------------
+
+def _solve_cholesky(L, C_sig, obs, var_sig):
+    # C_sig can be one vector (one point) or one row per point
+    y = solve_triangular(L, obs, lower=True)            # L * y = obs
+    b = solve_triangular(L, C_sig.T, lower=True)        # L * b = C_sig.T
+    signal = N.dot(b.T, y)
+    error = var_sig - (b * b).sum(axis=0)
+    return signal, error
+
+
+def _solve_lu(LU, C_sig, obs, var_sig):
+    x = lu_solve(LU, obs)                               # C_OBS * x = obs
+    w = lu_solve(LU, C_sig.T)                           # C_OBS * w = C_sig.T
+    signal = N.dot(C_sig, x)
+    error = var_sig - (C_sig.T * w).sum(axis=0)
+    return signal, error
+
+#--------------------------------------------------------------------------
+
+class LSCSolver(object):
+
+    """Solves the LSC system for all the points of a grid.
+
+    - no explicit inverses: triangular solves with the Cholesky factor
+      (or LU if C_OBS is not positive definite, as LSC_solver2)
+    - the factorization is reused while the set of selected observations
+      (`key`) is the same as for the previous point
+    - points with the same number of observations are factorized in 
+      stacked batches of `batch_size`
+    - the pending C_OBS are at most `max_mb` MB, if exceeded the largest
+      batch (in bytes) is solved before it is complete
+
+    Points are queued with `add()`; it returns the (point, signal, error)
+    of the batch solved (if any). `flush()` solves all the pending points.
+    """
+
+    def __init__(self, var_sig, batch_size=64, max_mb=256):
+        self.var_sig = var_sig
+        self.batch_size = batch_size
+        self.max_bytes = max_mb * 2**20
+        self.nbytes = 0       # pending C_OBS
+        self.pending = {}     # nobs -> list of groups
+        self.last = None      # last group (key, C_OBS, obs, points, C_sigs)
+
+    def reuses(self, key):
+        """True if `key` is the same set of obs as the previous point
+        (then C_OBS does not need to be computed)."""
+        if self.last is None:
+            return False
+        return all(N.array_equal(k1, k2) for k1, k2 in zip(key, self.last['key']))
+
+    def add(self, point, key, C_sig, obs, C_OBS=None):
+        if self.reuses(key):
+            grp = self.last
+            grp['points'].append(point)
+            grp['C_sigs'].append(C_sig.copy())
+            if 'factor' in grp:                     # already factorized
+                return self._solve_group(grp, start=len(grp['points'])-1)
+            return []
+        grp = {'key': [N.array(k) for k in key], 'C_OBS': C_OBS.copy(),
+               'obs': obs.copy(), 'points': [point], 'C_sigs': [C_sig.copy()]}
+        self.last = grp
+        n = len(obs)
+        self.pending.setdefault(n, []).append(grp)
+        self.nbytes += grp['C_OBS'].nbytes
+        if len(self.pending[n]) >= self.batch_size:
+            return self._pop_batch(n)
+        if self.nbytes > self.max_bytes:
+            # largest batch: len(groups) * n**2
+            n = max(self.pending, key=lambda k: len(self.pending[k]) * k**2)
+            return self._pop_batch(n)
+        return []
+
+    def flush(self):
+        results = []
+        for n in list(self.pending.keys()):
+            results.extend(self._pop_batch(n))
+        return results
+
+    def _pop_batch(self, n):
+        groups = self.pending.pop(n)
+        self.nbytes -= sum(g['C_OBS'].nbytes for g in groups)
+        return self._solve_batch(groups)
+
+    def _solve_batch(self, groups):
+        try:
+            Ls = N.linalg.cholesky(N.array([g['C_OBS'] for g in groups]))
+            for grp, L in zip(groups, Ls):
+                grp['factor'] = ('chol', L)
+        except N.linalg.LinAlgError:
+            for grp in groups:                      # one at a time
+                try:
+                    grp['factor'] = ('chol', N.linalg.cholesky(grp['C_OBS']))
+                except N.linalg.LinAlgError:
+                    grp['factor'] = ('lu', lu_factor(grp['C_OBS']))
+        results = []
+        for grp in groups:
+            del grp['C_OBS']                        # not needed anymore
+            results.extend(self._solve_group(grp))
+        return results
+
+    def _solve_group(self, grp, start=0):
+        kind, F = grp['factor']
+        C_sig = N.array(grp['C_sigs'][start:])
+        if kind == 'chol':
+            signal, error = _solve_cholesky(F, C_sig, grp['obs'], self.var_sig)
+        else:
+            signal, error = _solve_lu(F, C_sig, grp['obs'], self.var_sig)
+        return list(zip(grp['points'][start:], signal, error))
+
+#--------------------------------------------------------------------------
+
+def get_tiles(ny, nx, nt):
+
+    """Split a grid of (ny,nx) nodes in tiles of (at most) nt x nt nodes.
+    Returns a list of tiles (i1, i2, j1, j2): grid[i1:i2,j1:j2].
+    """
+
+    return [(i, min(i+nt, ny), j, min(j+nt, nx)) 
+            for i in range(0, ny, nt) for j in range(0, nx, nt)]
+
+#--------------------------------------------------------------------------
+
+def open_grid(fname, lons, lats, ntiles):
+
+    """Preallocated output grid [lon,lat,signal,error] on disk.
+
+    The grid goes to `fname`.grid.npy and the flags of the finished tiles 
+    to `fname`.tiles.npy (both memory mapped). If these files exist from 
+    an interrupted run with the same grid they are reopened, so the 
+    finished tiles can be skipped; otherwise they are (re)created.
+    """
+
+    fgrid, ftiles = fname + '.grid.npy', fname + '.tiles.npy'
+    lon, lat = N.meshgrid(lons, lats)
+    lon, lat = lon.ravel(), lat.ravel()      # lon varies faster
+
+    if os.path.exists(fgrid) and os.path.exists(ftiles):
+        GRID = open_memmap(fgrid, mode='r+')
+        DONE = open_memmap(ftiles, mode='r+')
+        if GRID.shape == (len(lon), 4) and DONE.shape == (ntiles,) and \
+           N.allclose(GRID[:,0], lon) and N.allclose(GRID[:,1], lat):
+            return GRID, DONE
+        print 'grid in %s does not match, starting a new one' % fgrid
+        del GRID, DONE
+
+    GRID = open_memmap(fgrid, mode='w+', dtype='float64', shape=(len(lon), 4))
+    DONE = open_memmap(ftiles, mode='w+', dtype='int8', shape=(ntiles,))
+    GRID[:,0] = lon
+    GRID[:,1] = lat
+    GRID[:,2:] = 0.0                         # signal = 0 if no obs
+    DONE[:] = 0
+    GRID.flush()
+    DONE.flush()
+    return GRID, DONE
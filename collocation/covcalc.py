@@ -16,8 +16,8 @@ import pylab as P
 import optparse
 from os import path
 from sys import argv, exit
-from scipy import weave
-from scipy.weave.converters import blitz
+from itertools import chain
+from scipy.spatial import cKDTree
 
 # Scan comand line arguments ----------------------------------------------
 
@@ -91,6 +91,9 @@ s0 = options.begin
 sn = options.end
 plot = options.plot
 
+# number of pts searched at a time for pairs (memory usage)
+CHUNK = 2000
+
 #--------------------------------------------------------------------------
 
 def load_data(file1, cols1, file2=None, cols2=None):
@@ -112,126 +115,55 @@ def save_data(fileout, COVS):
 
 
 # Searchs and calculates the covariances btw elements -----------------------
-# Note: piece of intensive work written in C++/Blitz.
- 
-def autocov_xx(ELEM, s_k, ds):
-    """AUTOCOVARIANCE between two arbitrary elements NOT azimuth 
-	dependents"""
-
-    nx = ELEM.shape[0]
-    main_code = \
-    """
-    double xi, yi, li, xj, yj, lj, a, b, s_ij; 
-    double sum_C_xx = 0, C_xx;
-    int n = 0;
-    py::tuple cov_xx(2);  // python tuple to return multiple values
-    
-    // Defines an interval [a,b) centered on s_k.
-    a = s_k - ds/2.0;
-    b = s_k + ds/2.0;
-    
-    for (int i = 0; i < nx; i++) {
-        xi = ELEM(i,0);    // lon   (deg)
-        yi = ELEM(i,1);    // lat   (deg)
-        li = ELEM(i,2);    
-    
-        for (int j = i; j < nx; j++) {  // ATENTION: Autocov -> j = i !!!
-            xj = ELEM(j,0);
-            yj = ELEM(j,1);
-            lj = ELEM(j,2);
-    
-            // Distance between pts P=(xi,yi) and Q=(xj,yj).
-            s_ij = hypot(xj-xi, yj-yi);     // deg
-    
-	        // if the distance between pts belongs to s_k. 
-            if (a <= s_ij && s_ij < b) {
-
-	            // COVARIANCE between pts.
-	            C_xx  = li * lj;
-
-                // if the calculus returned valid numbers.
-	            if (finite(C_xx)) {      
-                    sum_C_xx += C_xx;
-        	        n++;                    // number of products            
-	            }
-            }
-        }
-    }
-    // Covariance value for all pts in a distance s_k.
-    if (n > 0) {
-        cov_xx[0] = sum_C_xx / n;
-		cov_xx[1] = n;
-	}
-    else {
-        cov_xx[0] = 0;
-		cov_xx[1] = 0;
-    }
-
-    return_val = cov_xx; 
-    """
-    vars = ['ELEM', 's_k', 'ds', 'nx']
-    return weave.inline(main_code, vars, type_converters=blitz)
-
-#------------------------------------------------------------------------
-
-def crosscov_xy(ELEMX, ELEMY, s_k, ds):
-    """CROSSCOVARIANCE between two arbitrary elements NOT azimuth 
-	dependents"""
-
-    nx = ELEMX.shape[0]
-    ny = ELEMY.shape[0]
-    main_code = \
-    """
-    double xi, yi, li, xj, yj, lj, a, b, s_ij; 
-    double sum_C_xy = 0, C_xy;
-    int n = 0;
-    py::tuple cov_xy(2);  // python tuple to return multiple values
-    
-    // Defines an interval [a,b) centered on s_k.
-    a = s_k - ds/2.0;
-    b = s_k + ds/2.0;
-    
-    for (int i = 0; i < nx; i++) {
-        xi = ELEMX(i,0);    // lon   (deg)
-        yi = ELEMX(i,1);    // lat   (deg)
-        li = ELEMX(i,2);    
-    
-        for (int j = 0; j < ny; j++) {  // ATENTION: Crosscov -> j = 0 !!!
-            xj = ELEMY(j,0);
-            yj = ELEMY(j,1);
-            lj = ELEMY(j,2);
-    
-            // Distance between pts P=(xi,yi) and Q=(xj,yj).
-            s_ij = hypot(xj-xi, yj-yi);  // deg
-    
-            // if the distance between pts belongs to s_k. 
-            if (a <= s_ij && s_ij < b) {
-
-                // COVARIANCE between pts.
-                C_xy  = li * lj;
-
-                // if the calculus returned valid numbers.
-                if (finite(C_xy)) {
-                    sum_C_xy += C_xy;
-                    n++;                  // number of products            
-                }
-            }
-        }
-    }
-    // Covariance value for all pts in a distance s_k.
-    if (n > 0) {
-        cov_xy[0] = sum_C_xy / n;
-        cov_xy[1] = n;
-    }
-    else {
-        cov_xy[0] = 0;
-        cov_xy[1] = 0;
-    }
-
-    return_val = cov_xy; 
-    """
-    vars = ['ELEMX', 'ELEMY', 's_k', 'ds', 'nx', 'ny']
-    return weave.inline(main_code, vars, type_converters=blitz)
+# Note: all the distance classes are filled in a single pass over the pairs
+# of points, and only the pairs within the max distance are visited (k-d tree).
+
+def binned_cov(ELEMX, edges, ELEMY=None):
+    """Sums of the products x*y of all the pairs of points in each distance
+	class [edges[i],edges[i+1]) -> (sums, nprod) for all the classes.
+
+	One set of elements (ELEMY = None): AUTOCOVARIANCE, pairs with j >= i.
+	Two sets: CROSSCOVARIANCE, all pairs (i,j). NOT azimuth dependents."""
+
+    auto = ELEMY is None
+    if auto:
+        ELEMY = ELEMX
+
+    # pts without position never belong to a distance class
+    ELEMX = ELEMX[N.isfinite(ELEMX[:,0]) & N.isfinite(ELEMX[:,1])]
+    ELEMY = ELEMY[N.isfinite(ELEMY[:,0]) & N.isfinite(ELEMY[:,1])]
+
+    k = len(edges) - 1
+    sums = N.zeros(k, 'float64')
+    nprod = N.zeros(k, 'int64')
+    if len(ELEMX) == 0 or len(ELEMY) == 0:
+        return sums, nprod
+
+    tree = cKDTree(ELEMY[:,:2])
+    r = edges[-1] * (1 + 1e-9)           # exact test is done afterwards
+
+    for i1 in xrange(0, ELEMX.shape[0], CHUNK):
+        X = ELEMX[i1:i1+CHUNK]
+
+        # all pairs (i,j) within the max distance
+        neighbors = tree.query_ball_point(X[:,:2], r)
+        count = N.array([len(nb) for nb in neighbors], 'int64')
+        i = N.repeat(N.arange(i1, i1+len(X)), count)
+        j = N.fromiter(chain.from_iterable(neighbors), 'int64', count.sum())
+        if auto:
+            i, j = i[j >= i], j[j >= i]  # ATENTION: Autocov -> j = i !!!
+
+        # distance between pts P=(xi,yi) and Q=(xj,yj) and its class
+        s_ij = N.hypot(ELEMY[j,0] - ELEMX[i,0], ELEMY[j,1] - ELEMX[i,1])
+        c = N.searchsorted(edges, s_ij, side='right') - 1
+
+        # COVARIANCE between pts, if valid number
+        C = ELEMX[i,2] * ELEMY[j,2]
+        valid = (0 <= c) & (c < k) & N.isfinite(C)
+        sums += N.bincount(c[valid], C[valid], minlength=k)[:k]
+        nprod += N.bincount(c[valid], minlength=k)[:k]
+
+    return sums, nprod
 
 #----------------------------------------------------------------------------
 
@@ -240,23 +172,25 @@ def cov_distances(s0, sn, k, DIN1, DIN2=None):
 	in the interval [s0,sn) -> s_k = 0,1,2,..,k-1"""
 
     ds = (sn - s0) / k
-    COVS = N.empty((k,5), 'float64')  # double
+    COVS = N.zeros((k,3), 'float64')  # [dist,cov,nprod]
 
-    # Autocov x-x 
-    if DIN2 == None:
-        for i in xrange(k):
-            print 'Calculating auto-cov(x,x) for s_k = %s ...' % s0
-            COVS[i,0] = s0 
-            COVS[i,1], COVS[i,2] = autocov_xx(DIN1, s0, ds)
-            s0 += ds
+    # distance classes: intervals [a,b) centered on s_k
+    for i in xrange(k):
+        COVS[i,0] = s0 
+        s0 += ds
+    edges = N.append(COVS[:,0] - ds/2.0, COVS[-1,0] + ds/2.0)
 
-    # Crosscov x-y
+    if DIN2 is None:
+        print 'Calculating auto-cov(x,x) for %d distances ...' % k
     else:
-        for i in xrange(k):
-            print 'Calculating cross-cov(x,y) for s_k = %s ...' % s0
-            COVS[i,0] = s0 
-            COVS[i,1], COVS[i,2] = crosscov_xy(DIN1, DIN2, s0, ds)
-            s0 += ds
+        print 'Calculating cross-cov(x,y) for %d distances ...' % k
+
+    sums, nprod = binned_cov(DIN1, edges, DIN2)
+
+    # Covariance value for all pts in a distance s_k
+    ind = nprod > 0
+    COVS[ind,1] = sums[ind] / nprod[ind]
+    COVS[:,2] = nprod
 
     return COVS
 
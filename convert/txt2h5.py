@@ -10,6 +10,11 @@ named `data` (mirroring the ASCII file) is created.
 For the reverse operation (HDF5 to ASCII) specific `fields` can be 
 selected for conversion, otherwise all `fields` are converted.
 
+ASCII files are converted to `Table` and compressed arrays by streaming:
+the file is read in blocks (of `-b` MB, split at line boundaries) that 
+are parsed in parallel (`-j` processes) and appended in order to an 
+extendable `Table`/`EArray`, so memory use is bounded by a few blocks.
+
 Examples
 --------
 To see the available options::
@@ -33,6 +38,9 @@ import os
 import sys
 import mimetypes as mt
 import argparse as ap
+import multiprocessing as mp
+from collections import deque
+from cStringIO import StringIO
 import numpy as np
 import tables as tb 
 
@@ -48,7 +56,7 @@ parser.add_argument('-arr', dest='array', default=False,
     help='creates an HDF5 Array [default: Table]')
 parser.add_argument('-carr', dest='carray', default=False, 
     action='store_const', const=True, 
-    help='creates an HDF5 CArray w/compression [default: Table]')
+    help='creates an HDF5 (E)Array w/compression [default: Table]')
 parser.add_argument('-f', dest='fields', default=[],
     help='names to be used for the `fields` (columns), ex: -f x,y,z '
     '[default: no columns]')
@@ -61,6 +69,11 @@ parser.add_argument('-c', dest='usecols', default=(),
 parser.add_argument('-l', dest='complib', default='zlib',
     help='compression library to be used: zlib, lzo, bzip2, blosc ' 
     '[default: zlib]')
+parser.add_argument('-b', dest='blocksize', type=float, default=32,
+    help='size of the blocks to read/parse in MB [default: 32]')
+parser.add_argument('-j', dest='njobs', type=int, default=mp.cpu_count(),
+    help='number of processes to parse the blocks '
+    '[default: %d (all cpus)]' % mp.cpu_count())
 
 args = parser.parse_args()
 files = args.files
@@ -71,6 +84,8 @@ fields = args.fields
 formats = args.formats
 usecols = args.usecols
 complib = args.complib
+blocksize = int(args.blocksize * 1024**2)
+njobs = args.njobs
 
 if fields:
     fields = fields.split(',')
@@ -84,25 +99,131 @@ if usecols:
 dtype = {'names': fields, 'formats': formats}
 
 
-def txt_to_h5_tab(fname, dtype={}, usecols=(), complib='zlib'):
+def get_ncols(fname):
+    """Number of columns in the ASCII file (first line with data)."""
+    with open(fname) as f:
+        for line in f:
+            line = line.split('#')[0].split()
+            if line:
+                return len(line)
+    return 0
+
+
+def read_blocks(fname, blocksize):
+    """Read the ASCII file in blocks of ~`blocksize` bytes (whole lines)."""
+    with open(fname) as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            if not block.endswith('\n'):
+                block += f.readline()       # complete the last line
+            yield block
+
+
+def parse_block(args):
+    """Parse a block of lines to a 2D array (selecting `usecols`).
+
+    Uses the C tokenizer of `np.fromstring` (whitespace separated 
+    values), and falls back to `np.loadtxt` if the block has comments,
+    a different number of columns in some line or a bad value (so the
+    error is raised by `loadtxt`).
+    """
+    block, ncols, usecols = args
+    data = None
+    if '#' not in block and ncols > 0:
+        nvals = [len(line.split()) for line in block.splitlines()]
+        nvals = [n for n in nvals if n > 0]  # non-empty lines
+        data = np.fromstring(block, sep=' ')
+        if data.shape[0] == ncols * len(nvals) and \
+                all(n == ncols for n in nvals):
+            data = data.reshape(-1, ncols)
+        else:
+            data = None                     # ragged lines or bad token
+    if data is None:
+        data = np.loadtxt(StringIO(block), ndmin=2)
+        if data.size == 0:                  # only comments
+            data = np.empty((0, ncols))
+    if len(usecols) > 0:
+        data = data[:,usecols]
+    return data
+
+
+def iter_blocks(fname, usecols=(), njobs=1, blocksize=32*1024**2, 
+                pool=None):
+    """Parsed blocks (2D arrays) of the ASCII file, in order.
+
+    Blocks are parsed by `njobs` processes, with at most 2*njobs blocks 
+    in flight (bounded memory). The processes of `pool` are used if 
+    given (reused across files), otherwise a pool is created for the 
+    file. Files of a single block are parsed in-process.
+    """
+    ncols = get_ncols(fname)
+    usecols = list(np.atleast_1d(usecols).astype('i8'))
+    tasks = ((block, ncols, usecols) for block in read_blocks(fname, blocksize))
+    if njobs < 2 or os.path.getsize(fname) <= blocksize:
+        for task in tasks:
+            yield parse_block(task)
+        return
+    if pool is not None:
+        for data in _iter_async(pool, tasks, 2*njobs):
+            yield data
+        return
+    pool = mp.Pool(njobs)
+    try:
+        for data in _iter_async(pool, tasks, 2*njobs):
+            yield data
+        pool.close()
+    finally:
+        pool.terminate()                    # on error or early stop
+        pool.join()
+
+
+def _iter_async(pool, tasks, nmax):
+    """Parse the `tasks` in `pool`, in order, at most `nmax` in flight."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(parse_block, (task,)))
+        if len(pending) >= nmax:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def expected_rows(fname):
+    """Estimate of the number of lines in the file (for the chunk size)."""
+    with open(fname) as f:
+        head = f.read(64*1024)
+    nlines = max(head.count('\n'), 1)
+    return int(os.path.getsize(fname) * nlines / float(len(head))) + 1
+
+
+def txt_to_h5_tab(fname, dtype={}, usecols=(), complib='zlib', njobs=1,
+                  blocksize=32*1024**2, pool=None):
     """Converts ASCII column data file to HDF5 Table.
 
     It uses `dtype`, a dictionary defining the `names` and `formats`
     of the ASCII columns, to create a `Table` with the data in it.
+    The file is streamed (see `iter_blocks`).
     """
     if os.path.getsize(fname) == 0:
         print 'file is empty!'
         return
     if not dtype['formats']:
         raise IOError, 'must specify `fields`'
-    data = np.loadtxt(fname, usecols=usecols)  # data in-memory
+    rectype = np.dtype(dtype)
     h5f = tb.openFile(os.path.splitext(fname)[0] + '.h5', 'w')
-    print 'Table (%d, %d)' % data.shape
+    filters = tb.Filters(complib=complib, complevel=9)
+    outdata = h5f.createTable(h5f.root, 'data', rectype, filters=filters,
+                              expectedrows=expected_rows(fname))
+    for data in iter_blocks(fname, usecols, njobs, blocksize, pool):
+        rec = np.empty(data.shape[0], rectype)
+        for col, field in enumerate(rectype.names):
+            rec[field] = data[:,col]
+        outdata.append(rec)
+    print 'Table (%d, %d)' % (outdata.nrows, len(rectype.names))
     print 'fields:', dtype['names'], dtype['formats']
     print 'compression lib:', complib
-    data = np.rec.fromrecords(data, dtype=dtype)  # arr to rec
-    filters = tb.Filters(complib=complib, complevel=9)
-    outdata = h5f.createTable(h5f.root, 'data', data, filters=filters)
     h5f.close()
 
 
@@ -153,37 +274,47 @@ def txt_to_h5_arr(fname, dtype={}, usecols=()):
     h5f.close()
 
 
-def txt_to_h5_carr(fname, dtype={}, usecols=(), complib='zlib'):
-    """Converts ASCII column data file to HDF5 CArray w/compression.
+def txt_to_h5_carr(fname, dtype={}, usecols=(), complib='zlib', njobs=1,
+                   blocksize=32*1024**2, pool=None):
+    """Converts ASCII column data file to HDF5 EArray w/compression.
 
     If `dtype` (a dictionary) with `fields` is passed the ASCII data 
     columns are converted to 1D `Arrays`, otherwise they are converted 
-    to a 2D `Array` mirroring the ASCII file.
+    to a 2D `Array` mirroring the ASCII file. The file is streamed 
+    (see `iter_blocks`) so the arrays are extendable (EArray).
     """
     if os.path.getsize(fname) == 0:
         print 'file is empty!'
         return
-    data = np.loadtxt(fname, usecols=usecols)    # data in-memory
     h5f = tb.openFile(os.path.splitext(fname)[0] + '.h5', 'w')
     atom = tb.Float64Atom()
     filters = tb.Filters(complib=complib, complevel=9)
-    if not dtype['names']:
-        print '2D CArray (%d, %d)' % data.shape
+    nrows = expected_rows(fname)
+    outdata = None
+    for data in iter_blocks(fname, usecols, njobs, blocksize, pool):
+        if outdata is None and not dtype['names']:
+            outdata = h5f.createEArray('/', 'data', atom=atom, 
+                                       shape=(0, data.shape[1]),
+                                       filters=filters, expectedrows=nrows)
+        elif outdata is None:
+            group = h5f.createGroup('/', 'data')
+            outdata = [h5f.createEArray(group, field, atom=atom, shape=(0,),
+                                        filters=filters, expectedrows=nrows)
+                       for field in dtype['names']]
+        if not dtype['names']:
+            outdata.append(data)
+        else:
+            for col, dataout in enumerate(outdata):
+                dataout.append(data[:,col])
+    if outdata is None:
+        print 'no data in file!'
+    elif not dtype['names']:
+        print '2D EArray (%d, %d)' % outdata.shape
         print 'compression lib:', complib
-        shape = data.shape
-        dataout = h5f.createCArray('/','data', atom=atom, shape=shape,
-                                   filters=filters)
-        dataout[:] = data
     else:
-        print '1D CArrays (%d x %d)' % data.shape
+        print '1D EArrays (%d x %d)' % (outdata[0].nrows, len(outdata))
         print 'fields:', dtype['names'], dtype['formats']
         print 'compression lib:', complib
-        group = h5f.createGroup('/', 'data')
-        for col, field in enumerate(dtype['names']):
-            shape = data[:,col].shape
-            dataout = h5f.createCArray(group, field, atom=atom, shape=shape,
-                                       filters=filters)
-            dataout[:] = data[:,col]
     h5f.close()
 
 
@@ -212,23 +343,35 @@ def h5_arr_to_txt(fname, fields=[]):
 def main():
     print 'files to convert: %d ' % len(files)
     mime, _ = mt.guess_type(files[0])
-    for f in files:
-        if verbose: 
-            print 'file:', f
-        if mime == 'text/plain':
-            print 'ASCII -> HDF5 ...'
-            if array:
-                txt_to_h5_arr(f, dtype, usecols)
-            elif carray:
-                txt_to_h5_carr(f, dtype, usecols, complib)
-            else:
-                txt_to_h5_tab(f, dtype, usecols, complib)
-        else:
-            print 'HDF5 -> ASCII ...'
-            if array:
-                h5_arr_to_txt(f, dtype['names'])
+    # one pool for all the files (only needed if any file has > 1 block)
+    pool = None
+    if mime == 'text/plain' and not array and njobs > 1 and \
+            any(os.path.getsize(f) > blocksize for f in files):
+        pool = mp.Pool(njobs)
+    try:
+        for f in files:
+            if verbose: 
+                print 'file:', f
+            if mime == 'text/plain':
+                print 'ASCII -> HDF5 ...'
+                if array:
+                    txt_to_h5_arr(f, dtype, usecols)
+                elif carray:
+                    txt_to_h5_carr(f, dtype, usecols, complib, njobs, 
+                                   blocksize, pool)
+                else:
+                    txt_to_h5_tab(f, dtype, usecols, complib, njobs, 
+                                  blocksize, pool)
             else:
-                h5_tab_to_txt(f, dtype['names'])
+                print 'HDF5 -> ASCII ...'
+                if array:
+                    h5_arr_to_txt(f, dtype['names'])
+                else:
+                    h5_tab_to_txt(f, dtype['names'])
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
     print 'done.'
 
 if __name__ == '__main__':
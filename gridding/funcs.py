@@ -2,6 +2,7 @@
 Module containing functions and classes used by:
 
 xover2grid.py
+xover2grid_gla.py
 xover2box.py
 x2grid.py
 
@@ -163,6 +164,27 @@ def get_info(fname):
     return satname, np.int32(time1), np.int32(time2)
 
 
+def get_fname_out(files, fname_out=None, prefix=None, suffix='grids.h5'):
+    """
+    Construct the output file name with the min and max times 
+    from the input files: /input/path/prefix_tmin_tmax_suffix.
+    """
+    path, name = os.path.split(files[0])  # path from any file
+    if len(files) == 1:
+        return files[0].replace('.h5', '_'+suffix)
+    elif fname_out is not None:
+        return os.path.join(path, fname_out)
+    times = [re.findall('\d\d\d\d\d\d+', fname) for fname in files]
+    t_1 = [dt.datetime.strptime(t1, '%Y%m%d') for t1, t2 in times]
+    t_2 = [dt.datetime.strptime(t2, '%Y%m%d') for t1, t2 in times]
+    t_min = min(t_1).strftime('%Y%m%d')
+    t_max = max(t_2).strftime('%Y%m%d')
+    if prefix is None:
+        prefix = name.split('_')[0]   # sat name
+    name = '_'.join([prefix, t_min, t_max, suffix])
+    return os.path.join(path, name)
+
+
 def filter_data(d, ice_only=True):
     # d is a dictionary containing all the data
     # mode: 0/1/2 = ocean/ice/none (for all RA), fine/medium/coarse (for Envi)
@@ -410,6 +432,7 @@ def _std_editing_iterative(x, nsd=3, return_index=False):
     Iterative filtering: all values greater than <nsd>-sigmas
     (standard deviation) till convergence.
     """
+    x = np.array(x, 'f8')     # work on a copy
     niter = 0
     while True: 
         y = x[~np.isnan(x)]   # ignore NaNs
@@ -454,6 +477,46 @@ def std_editing(x, nsd=3, return_index=False, iterative=False):
         return _std_editing(x, nsd, return_index)
 
 
+def std_editing_grouped(x, groups, nsd=3, iterative=True):
+    """
+    Filter out values greater than `nsd`-sigma in all groups at once.
+
+    `groups` holds a non-negative integer id for every value in `x`. Count,
+    mean and SD of each group are computed with segmented reductions 
+    (`np.bincount`) and, in every group with at least 3 values, the values 
+    with |x| > nsd*sd are rejected, till convergence if `iterative` (same 
+    rules as `std_editing`). `x` is not modified.
+
+    Returns a boolean mask with the values kept (NaNs are never kept) and
+    the number of editing iterations per group.
+    """
+    x = np.asarray(x, 'f8')
+    groups = np.asarray(groups, 'i8')
+    ngroups = groups.max() + 1 if len(groups) > 0 else 0
+    keep = ~np.isnan(x)
+    active = np.ones(ngroups, bool)
+    niter = np.zeros(ngroups, 'i4')
+    while True:
+        # only values in groups still being edited
+        ind, = np.where(keep & active[groups])
+        if len(ind) == 0: break
+        gi, xi = groups[ind], x[ind]
+        n = np.bincount(gi, minlength=ngroups)
+        active &= (n >= 3)                   # min of 3 to calc std
+        mean = np.bincount(gi, weights=xi, minlength=ngroups) / np.maximum(n, 1)
+        res = xi - mean[gi]
+        var = np.bincount(gi, weights=res*res, minlength=ngroups)
+        sd = np.sqrt(var / np.maximum(n - 1, 1))
+        reject = active[gi] & (np.abs(xi) > nsd*sd[gi])
+        edited = np.bincount(gi[reject], minlength=ngroups) > 0
+        if not edited.any(): break
+        keep[ind[reject]] = False
+        niter[edited] += 1
+        active &= edited                     # converged groups stop
+        if not iterative: break
+    return keep, niter
+
+
 def abs_editing(x, absval, return_index=False):
     """
     Filter out all values greater than `absval`.
@@ -465,6 +528,103 @@ def abs_editing(x, absval, return_index=False):
         return x[i]
 
 
+def cell_index(j_bins, i_bins, nx, ny):
+    """
+    Flattened (row-major) cell id of every point, -1 if outside the grid.
+
+    `j_bins` and `i_bins` are the 1-based bins returned by `digitize`.
+    """
+    j_bins, i_bins = np.asarray(j_bins), np.asarray(i_bins)
+    inside = (j_bins >= 1) & (j_bins <= nx) & (i_bins >= 1) & (i_bins <= ny)
+    cell = (i_bins - 1) * nx + (j_bins - 1)
+    cell[~inside] = -1
+    return cell
+
+
+def cell_slices(cell):
+    """
+    Sort points once by cell id and split them into contiguous slices.
+
+    Returns the sort order (points with id -1 dropped) and, for every 
+    non-empty cell, its id and the start/end positions in the sorted 
+    arrays. The sort is stable, so points keep their original order 
+    inside each cell (same order as `np.where(cell == k)`).
+    """
+    order = np.argsort(cell, kind='mergesort')
+    cell_sorted = cell[order]
+    first = np.searchsorted(cell_sorted, 0)
+    order, cell_sorted = order[first:], cell_sorted[first:]
+    if len(order) == 0:
+        empty = np.array([], 'i8')
+        return order, empty, empty, empty
+    brk = np.flatnonzero(np.diff(cell_sorted)) + 1
+    start = np.r_[0, brk]
+    end = np.r_[brk, len(cell_sorted)]
+    return order, cell_sorted[start], start, end
+
+
+def grid_cells(cell, ny, nx, h1, h2, g1, g2, ftrk1, ftrk2, absval=None, 
+               nsd=None, iterative=False, median=False, useall=False):
+    """
+    Construct all the grids (dh, dAGC, errors, #obs) in a single pass.
+
+    The crossovers are sorted once by flattened cell id (see `cell_index`)
+    and each non-empty cell is processed on its contiguous slice, instead 
+    of scanning all the points for every cell. Empty cells are left NaN.
+
+    The sigma editing of all cells and asc/des groups is done at once 
+    (`std_editing_grouped`). `absval=None` and `nsd=None` skip the absolute
+    and sigma editing. Results match the former per-cell `np.where` loop.
+    """
+    g = OutGrids(ny, nx)
+    order, ids, start, end = cell_slices(cell)
+    dh = (h2 - h1)[order]    # always t2 - t1 !
+    dg = (g2 - g1)[order]
+    ftrk1, ftrk2 = ftrk1[order], ftrk2[order]
+
+    # separate in asc/des-des/asc 
+    is_ad = (ftrk2 == 0) & (ftrk1 == 1)
+    is_da = (ftrk2 == 1) & (ftrk1 == 0)
+
+    # filter absolute values
+    use = is_ad | is_da
+    if absval is not None:
+        use &= (np.abs(dh) <= absval)
+
+    # filter standard deviation: group 2k (ad) and 2k+1 (da) of k-th cell
+    if nsd is not None:
+        slot = np.repeat(np.arange(len(ids)), end - start)
+        groups = 2 * slot + is_da
+        keep, _ = std_editing_grouped(np.where(use, dh, np.nan), groups, 
+                                      nsd=nsd, iterative=iterative)
+    else:
+        keep = use
+
+    for k, i0, i1 in zip(ids, start, end):
+        i, j = divmod(k, nx)
+
+        # if editing left the cell empty keep the abs-edited values
+        sel = keep[i0:i1]
+        if not sel.any():
+            sel = use[i0:i1]
+        i_ad = sel & is_ad[i0:i1]
+        i_da = sel & is_da[i0:i1]
+        dh_ad = dh[i0:i1][i_ad]
+        dh_da = dh[i0:i1][i_da]
+        dg_ad = dg[i0:i1][i_ad]
+        dg_da = dg[i0:i1][i_da]
+
+        # mean values
+        g.dh_mean[i,j] = compute_weighted_mean(dh_ad, dh_da, useall=useall, median=median) 
+        g.dh_error[i,j] = compute_weighted_error(dh_ad, dh_da, useall=useall) 
+        g.dh_error2[i,j] = compute_wingham_error(dh_ad, dh_da, useall=useall) 
+        g.dg_mean[i,j] = compute_weighted_mean(dg_ad, dg_da, useall=useall, median=median) 
+        g.dg_error[i,j] = compute_weighted_error(dg_ad, dg_da, useall=useall) 
+        g.dg_error2[i,j] = compute_wingham_error(dg_ad, dg_da, useall=useall) 
+        g.n_ad[i,j], g.n_da[i,j] = compute_num_obs(dh_ad, dh_da, useall=useall)
+    return g
+
+
 def gaussian_filter(grid, width):
     """Gaussian smoothing."""
     ii = np.where(np.isnan(grid)) # | (grid == 0))
@@ -107,40 +107,29 @@ def main(args):
         #-----------------------------------------------------------------
         #print 'calculating box region ...'
 
-        # calculations per box (given region)
-        ind, = np.where((left <= d['lon']) & (d['lon'] <= right) & \
-                        (bottom <= d['lat']) & (d['lat'] <= top))
+        # calculations per box (given region): the box is a single cell
+        inbox = ((left <= d['lon']) & (d['lon'] <= right) & \
+                 (bottom <= d['lat']) & (d['lat'] <= top))
+        cell = np.where(inbox, 0, -1)
 
-        # dh TS
-
-        # separate --> asc/des, des/asc 
-        dh_ad, dh_da = compute_dh_ad_da(d['h1'][ind], d['h2'][ind], 
-                       d['ftrack1'][ind], d['ftrack2'][ind])
-
-        # filter
+        # dh and dAGC TS (no editing, see commented lines below)
         #dh_ad = std_iterative_editing(dh_ad, nsd=3)
         #dh_da = std_iterative_editing(dh_da, nsd=3)
         #dh_ad = abs_value_editing(dh_ad, absval=ABSVAL)
         #dh_da = abs_value_editing(dh_da, absval=ABSVAL)
-
-        # mean values
-        #dh_mean = compute_ordinary_mean(dh_ad, dh_da, useall=False) 
-        dh_mean = compute_weighted_mean(dh_ad, dh_da, useall=False) 
-        dh_error = compute_weighted_mean_error(dh_ad, dh_da, useall=False) 
-        #dh_error = compute_wingham_error(dh_ad, dh_da, useall=False) 
-        n_ad = len(dh_ad)
-        n_da = len(dh_da)
-
-        # dAGC TS
-
-        dg_ad, dg_da = compute_dh_ad_da(d['g1'][ind], d['g2'][ind], 
-                       d['ftrack1'][ind], d['ftrack2'][ind])
-
-        #dg_ad = std_iterative_editing(dg_ad, nsd=3)
-        #dg_da = std_iterative_editing(dg_da, nsd=3)
-
-        dg_mean = compute_weighted_mean(dg_ad, dg_da, useall=False) 
-        dg_error = compute_weighted_mean_error(dg_ad, dg_da, useall=False) 
+        g = grid_cells(cell, 1, 1, d['h1'], d['h2'], d['g1'], d['g2'], 
+                       d['ftrack1'], d['ftrack2'], useall=False)
+
+        dh_mean = g.dh_mean[0,0]
+        dh_error = g.dh_error[0,0]
+        #dh_error = g.dh_error2[0,0]
+        dg_mean = g.dg_mean[0,0]
+        dg_error = g.dg_error[0,0]
+
+        # number of obs in each group (regardless of `useall`)
+        i_ad, i_da = where_ad_da(d['ftrack1'][inbox], d['ftrack2'][inbox])
+        n_ad = len(i_ad)
+        n_da = len(i_da)
 
         #-----------------------------------------------------------------
 
@@ -10,17 +10,25 @@ Notes
 -----
 * Read HDF5 files with a 2D array called `data`
 * Process one satellite at a time and merge the files later on.
+* With `-j N` files are gridded by N processes, and the main process writes
+  each set of grids at its time index (same output as serial).
 * Indices: i,j,k = t,y,x
 
 Example
 -------
 $ python xover2grid.py -r -100 -20 -82 -75 -s fris_grids.h5 ~/data/fris/xover/seasonal/ers1_*_tide.h5
 
+# grid the files using 16 processes
+$ python xover2grid.py -j 16 -r -100 -20 -82 -75 ~/data/fris/xover/seasonal/ers1_*_tide.h5
+
 """
 # Fernando Paolo <fpaolo@ucsd.edu>
 # December 15, 2011
 
 import argparse as ap
+import altimpy as alt
+import multiprocessing as mp
+from itertools import imap, izip
 from mpl_toolkits.basemap import interp
 from scipy.interpolate import griddata, RectBivariateSpline
 from scipy.ndimage import gaussian_filter
@@ -33,14 +41,11 @@ from funcs import *
 PLOT = False
 SAVE_TO_FILE = True
 
-NODE_NAME = ''
-STRUCT = 'gla'        # data structure: None/gla, use gla for Envi/ICESat comparison
 ABS_VAL = 10          # (m), accept data if |dh| < ABS_VAL
 NUM_STD = 3           # sigma for editing: accept if |dh| < NUM_STD * std
 ITERATIVE = True      # iterative sigma editing
 MEDIAN = True         # use median (instead of mean) for weighted avrg: [w1*m(x1) + w2*m(x2)]/(w1+w2)
 USEALL = True         # use one of the average/median <ad> or <da> if the other is missing
-MAX_SIZE_DATA = 512   # (MB), to load data in memory
 TIDE_CODE = 'fortran' # for tide computed using fortran/matlab
 GAUSS_SMOOTH = False  # for plotting
 GAUSS_WIDTH = 0.3
@@ -63,9 +68,64 @@ parser.add_argument('-p', dest='prefix', default=None,
     help='prefix of output file [default: same as input]')
 parser.add_argument('-s', dest='suffix', default='grids.h5',
     help='suffix of output file [default: grids.h5]')
+parser.add_argument('-j', dest='njobs', default=1, type=int,
+    help='number of processes to grid files in parallel [default: 1]')
 
 args = parser.parse_args()
 
+
+def grid_file(task):
+    """
+    Grid a single crossover file -> one (ny,nx) set of grids.
+
+    `task` is a tuple (fname, region, dx, dy), so it can be sent to a 
+    process pool. Returns None if no data is left after filtering.
+    """
+    fname, region, dx, dy = task
+    x_range = region[:2]
+    y_range = region[2:]
+
+    d = get_data(fname, TIDE_CODE)
+    d['satname'], d['time1'], d['time2'] = get_info(fname)
+
+    # pre-processing
+    #---------------------------------------------------------------------
+
+    # convert -180/+180 <-> 0/360 if needed
+    d['lon'] = alt.lon_180_360(d['lon'], region=region)
+
+    # filter data
+    d = filter_data(d)
+
+    # go to next file. A "void" will be left in the 3D array!
+    if d is None:   
+        return None
+
+    # apply tide corrections (+ load if matlab)
+    d['h1'] -= d['tide1']
+    d['h2'] -= d['tide2']
+
+    # digitize lons and lats
+    lon, lat, j_bins, i_bins, x_edges, y_edges, nx, ny = \
+        digitize(d['lon'], d['lat'], x_range, y_range, dx, dy)
+
+    # calculations per grid cell (single pass over sorted cells)
+    #---------------------------------------------------------------------
+
+    cell = cell_index(j_bins, i_bins, nx, ny)
+    g = grid_cells(cell, ny, nx, d['h1'], d['h2'], d['g1'], d['g2'], 
+                   d['ftrk1'], d['ftrk2'], absval=ABS_VAL, nsd=NUM_STD, 
+                   iterative=ITERATIVE, median=MEDIAN, useall=USEALL)
+
+    # gaussian smooth
+    if GAUSS_SMOOTH:
+        g.dh_mean = gaussian_filter(g.dh_mean, GAUSS_WIDTH)
+        g.dg_mean = gaussian_filter(g.dg_mean, GAUSS_WIDTH)
+
+    return (d['satname'], d['time1'], d['time2'], 
+            lon, lat, x_edges, y_edges, g)
+
+
 def main(args):
 
     # input args
@@ -74,156 +134,81 @@ def main(args):
     files = args.files
     fname_out = args.fname_out
     region = args.region
-    x_range = region[:2]
-    y_range = region[2:]
     dx = args.delta[0]
     dy = args.delta[1]
     prefix = args.prefix
     suffix = args.suffix
+    njobs = args.njobs
     N = len(files)
 
     files.sort(key=lambda s: re.findall('\d\d\d\d\d\d+', s))
+    tasks = [(fname, region, dx, dy) for fname in files]
 
     print 'processing files ...'
 
+    # grid files in parallel; results come back in file (time) order, so 
+    # this process is the single writer of the output containers
+    if njobs > 1:
+        pool = mp.Pool(njobs)
+        results = pool.imap(grid_file, tasks)
+    else:
+        results = imap(grid_file, tasks)
+
+    n = 0
     isfirst = True
-    for pos, fname in enumerate(files):
-
-        In = Input(fname)
-        In.get_time_from_fname()   # get sat/time info for every grid
-        d = In.get_data_from_file(MAX_SIZE_DATA, TIDE_CODE, data=STRUCT)
-
-        # pre-processing
-        #-----------------------------------------------------------------
-
-        # convert -180/+180 <-> 0/360 if needed
-        d['lon'] = lon_180_to_360(d['lon'], region)
-
-        # filter data
-        d = filter_data(d)
-
-        # go to next file. A "void" will be left in the 3D array!
-        if d is None:   
-            In.fin.close()
-            continue
-
-        # apply corrections 
-        d = apply_tide_corr(d, TIDE_CODE)
-
-        # digitize lons and lats
-        lon, lat, j_bins, i_bins, x_edges, y_edges, nx, ny = \
-            digitize(d['lon'], d['lat'], x_range, y_range, dx, dy)
-
-        h1, h2 = d['h1'], d['h2']
-        g1, g2 = d['g1'], d['g2']
-        ftrk1, ftrk2 = d['ftrk1'], d['ftrk2']
-
-        # Output grids 
-        g = OutGrids(ny, nx)
-
-        # calculations per grid cell
-        #-----------------------------------------------------------------
-
-        for i in xrange(ny):
-            for j in xrange(nx):
-                '''
-                i_cell, = np.where((x_edges[j] <= d['lon']) & \
-                                   (d['lon'] < x_edges[j+1]) & \
-                                   (y_edges[i] <= d['lat']) & \
-                                   (d['lat'] < y_edges[i+1]))
-                '''
-                # single grid cell
-                i_cell, = np.where((j_bins == j+1) & (i_bins == i+1))
-
-                # xovers per cell 
-                dh = h2[i_cell] - h1[i_cell]    # always t2 - t1 !
-                dg = g2[i_cell] - g1[i_cell]
-
-                # separate in asc/des--des/asc 
-                i_ad, i_da = where_ad_da(ftrk1[i_cell], ftrk2[i_cell])
-                dh_ad = dh[i_ad]
-                dh_da = dh[i_da]
-                dg_ad = dg[i_ad]
-                dg_da = dg[i_da]
-
-                # filter
-                i_ad = abs_editing(dh_ad, absval=ABS_VAL, return_index=True)
-                i_da = abs_editing(dh_da, absval=ABS_VAL, return_index=True)
-                dh_ad = dh_ad[i_ad]
-                dh_da = dh_da[i_da]
-                dg_ad = dg_ad[i_ad]
-                dg_da = dg_da[i_da]
-
-                i_ad = std_editing(dh_ad, nsd=NUM_STD, iterative=ITERATIVE, return_index=True)
-                i_da = std_editing(dh_da, nsd=NUM_STD, iterative=ITERATIVE, return_index=True)
-                if len(i_ad) == 0 and len(i_da) == 0:
-                    pass
-                else:
-                    dh_ad = dh_ad[i_ad]
-                    dh_da = dh_da[i_da]
-                    dg_ad = dg_ad[i_ad]
-                    dg_da = dg_da[i_da]
-
-                # mean values
-                #g.dh_mean[i,j] = compute_ordinary_mean(dh_ad, dh_da, useall=USEALL) 
-                g.dh_mean[i,j] = compute_weighted_mean(dh_ad, dh_da, useall=USEALL, median=MEDIAN) 
-                g.dh_error[i,j] = compute_weighted_mean_error(dh_ad, dh_da, useall=USEALL) 
-                g.dh_error2[i,j] = compute_wingham_mod_error(dh_ad, dh_da, useall=USEALL) 
-                g.dg_mean[i,j] = compute_weighted_mean(dg_ad, dg_da, useall=USEALL, median=MEDIAN) 
-                g.dg_error[i,j] = compute_weighted_mean_error(dg_ad, dg_da, useall=USEALL) 
-                g.dg_error2[i,j] = compute_wingham_mod_error(dg_ad, dg_da, useall=USEALL) 
-                g.n_ad[i,j], g.n_da[i,j] = compute_num_obs(dh_ad, dh_da, useall=USEALL)
-
-                # gaussian smooth
-                if GAUSS_SMOOTH:
-                    g.dh_mean = gaussian_filter(g.dh_mean, GAUSS_WIDTH)
-                    g.dg_mean = gaussian_filter(g.dg_mean, GAUSS_WIDTH)
-
-        # save the grids
-        #-----------------------------------------------------------------
-
-        if not SAVE_TO_FILE: 
-            In.fin.close()
-            continue
-
-        if isfirst:
-            Out = Output(files, fname_out, g.dh_mean, (N,ny,nx), NODE_NAME, prefix, suffix)
-            Out.get_fname_out()
-            Out.create_output_containers()
-
-            # save info
-            n = 0
-            Out.lon[:] = lon
-            Out.lat[:] = lat
-            Out.x_edges[:] = x_edges
-            Out.y_edges[:] = y_edges
-
-            isfirst = False
-
-        # save one set of grids per iteration (i.e., per file)
-        # --> test row.append() instead!
-        Out.table.append([(d['satname'], d['time1'], d['time2'])]) 
-        Out.table.flush()
-        Out.dh_mean[n,...] = g.dh_mean
-        Out.dh_error[n,...] = g.dh_error
-        Out.dh_error2[n,...] = g.dh_error2
-        Out.dg_mean[n,...] = g.dg_mean
-        Out.dg_error[n,...] = g.dg_error
-        Out.dg_error2[n,...] = g.dg_error2
-        Out.n_ad[n,...] = g.n_ad
-        Out.n_da[n,...] = g.n_da
-        n += 1
-
-        In.fin.close()
-
-    if SAVE_TO_FILE:
-        Out.fout.flush()
-        Out.fout.close()
+    try:
+        for fname, res in izip(files, results):
+
+            if res is None:
+                print 'No data left after filtering!\nFile:', fname
+                continue
+
+            satname, time1, time2, lon, lat, x_edges, y_edges, g = res
+
+            # save the grids
+            #-------------------------------------------------------------
+
+            if not SAVE_TO_FILE: 
+                continue
+
+            if isfirst:
+                ny, nx = g.dh_mean.shape
+                fname_out = get_fname_out(files, fname_out, prefix, suffix)
+                out = OutputContainers(fname_out, (N,ny,nx))
+
+                # save info
+                out.lon[:] = lon
+                out.lat[:] = lat
+                out.x_edges[:] = x_edges
+                out.y_edges[:] = y_edges
+
+                isfirst = False
+
+            # save one set of grids per file at its time index
+            out.time1[n] = time1
+            out.time2[n] = time2
+            out.dh_mean[n,...] = g.dh_mean
+            out.dh_error[n,...] = g.dh_error
+            out.dh_error2[n,...] = g.dh_error2
+            out.dg_mean[n,...] = g.dg_mean
+            out.dg_error[n,...] = g.dg_error
+            out.dg_error2[n,...] = g.dg_error2
+            out.n_ad[n,...] = g.n_ad
+            out.n_da[n,...] = g.n_da
+            n += 1
+    finally:
+        if njobs > 1:
+            pool.terminate()    # also on error in a worker
+            pool.join()
+
+    if SAVE_TO_FILE and not isfirst:
+        out.file.flush()
+        out.file.close()
 
     try:
-        print_info(x_edges, y_edges, lon, lat, dx, dy, n, source='None')
+        print_info(x_edges, y_edges, lon, lat, dx, dy, n, g.n_ad, g.n_da, source='None')
     except:
-        print_info(x_edges, y_edges, lon, lat, dx, dy, 1, source='None')
+        pass
 
     if PLOT:
         '''
@@ -248,8 +233,8 @@ def main(args):
         plot_grids(x_edges, y_edges, g.dh_mean, g.dg_mean, g.n_ad, g.n_da)
         plt.show()
 
-    if SAVE_TO_FILE:
-        print 'file out -->', Out.fname_out
+    if SAVE_TO_FILE and not isfirst:
+        print 'file out -->', fname_out
 
 
 if __name__ == '__main__':
@@ -117,70 +117,18 @@ def main(args):
         lon, lat, j_bins, i_bins, x_edges, y_edges, nx, ny = \
             digitize(d['lon'], d['lat'], x_range, y_range, dx, dy)
 
-        h1, h2 = d['h1'], d['h2']
-        g1, g2 = d['g1'], d['g2']
-        ftrk1, ftrk2 = d['ftrk1'], d['ftrk2']
-
-        # Output grids 
-        g = OutGrids(ny, nx)
-
-        # calculations per grid cell
+        # calculations per grid cell (single pass over sorted cells)
         #-----------------------------------------------------------------
 
-        for i in xrange(ny):
-            for j in xrange(nx):
-                '''
-                i_cell, = np.where((x_edges[j] <= d['lon']) & \
-                                   (d['lon'] < x_edges[j+1]) & \
-                                   (y_edges[i] <= d['lat']) & \
-                                   (d['lat'] < y_edges[i+1]))
-                '''
-                # single grid cell
-                i_cell, = np.where((j_bins == j+1) & (i_bins == i+1))
-
-                # xovers per cell 
-                dh = h2[i_cell] - h1[i_cell]    # always t2 - t1 !
-                dg = g2[i_cell] - g1[i_cell]
-
-                # separate in asc/des--des/asc 
-                i_ad, i_da = where_ad_da(ftrk1[i_cell], ftrk2[i_cell])
-                dh_ad = dh[i_ad]
-                dh_da = dh[i_da]
-                dg_ad = dg[i_ad]
-                dg_da = dg[i_da]
-
-                # filter
-                i_ad = abs_editing(dh_ad, absval=ABS_VAL, return_index=True)
-                i_da = abs_editing(dh_da, absval=ABS_VAL, return_index=True)
-                dh_ad = dh_ad[i_ad]
-                dh_da = dh_da[i_da]
-                dg_ad = dg_ad[i_ad]
-                dg_da = dg_da[i_da]
-
-                i_ad = std_editing(dh_ad, nsd=NUM_STD, iterative=ITERATIVE, return_index=True)
-                i_da = std_editing(dh_da, nsd=NUM_STD, iterative=ITERATIVE, return_index=True)
-                if len(i_ad) == 0 and len(i_da) == 0:
-                    pass
-                else:
-                    dh_ad = dh_ad[i_ad]
-                    dh_da = dh_da[i_da]
-                    dg_ad = dg_ad[i_ad]
-                    dg_da = dg_da[i_da]
-
-                # mean values
-                #g.dh_mean[i,j] = compute_ordinary_mean(dh_ad, dh_da, useall=USEALL) 
-                g.dh_mean[i,j] = compute_weighted_mean(dh_ad, dh_da, useall=USEALL, median=MEDIAN) 
-                g.dh_error[i,j] = compute_weighted_mean_error(dh_ad, dh_da, useall=USEALL) 
-                g.dh_error2[i,j] = compute_wingham_mod_error(dh_ad, dh_da, useall=USEALL) 
-                g.dg_mean[i,j] = compute_weighted_mean(dg_ad, dg_da, useall=USEALL, median=MEDIAN) 
-                g.dg_error[i,j] = compute_weighted_mean_error(dg_ad, dg_da, useall=USEALL) 
-                g.dg_error2[i,j] = compute_wingham_mod_error(dg_ad, dg_da, useall=USEALL) 
-                g.n_ad[i,j], g.n_da[i,j] = compute_num_obs(dh_ad, dh_da, useall=USEALL)
-
-                # gaussian smooth
-                if GAUSS_SMOOTH:
-                    g.dh_mean = gaussian_filter(g.dh_mean, GAUSS_WIDTH)
-                    g.dg_mean = gaussian_filter(g.dg_mean, GAUSS_WIDTH)
+        cell = cell_index(j_bins, i_bins, nx, ny)
+        g = grid_cells(cell, ny, nx, d['h1'], d['h2'], d['g1'], d['g2'], 
+                       d['ftrk1'], d['ftrk2'], absval=ABS_VAL, nsd=NUM_STD, 
+                       iterative=ITERATIVE, median=MEDIAN, useall=USEALL)
+
+        # gaussian smooth
+        if GAUSS_SMOOTH:
+            g.dh_mean = gaussian_filter(g.dh_mean, GAUSS_WIDTH)
+            g.dg_mean = gaussian_filter(g.dg_mean, GAUSS_WIDTH)
 
         # save the grids
         #-----------------------------------------------------------------
@@ -51,6 +51,8 @@ metadata = 'Fernando_Paolo <fpaolo@ucsd.edu> %s SIO/UCSD' % date.today()
 
 MJD1985 = 46066. # 1-Jan-1985 in MJD
 
+NREC = 1000000   # number of records (100B) decoded at a time
+
 def check_region(left, right, bottom, top):
     """Check if input region is correct."""
     if left >= right or left < -180 or right > 360:
@@ -71,6 +73,78 @@ def check_region(left, right, bottom, top):
         return left, right, bottom, top, islon360
 
 
+def decode(data, left, right, bottom, top, islon360, rev=None):
+    """Decode a block of IDR records (vectorized).
+
+    The rev time and orbit of the 'IR' records are forward-filled onto
+    the 'ID' records that follow them; `rev` is the last 'IR' record of
+    the previous block (if any), so a file can be decoded in blocks.
+    Returns the selected points [orbit, utc1985, lat, lon, elev], the
+    number of data records read, and the last 'IR' record.
+    """
+    isrev = (data['id'] == 'IR')                 # IDR Rev Record
+    isdat = (data['id'] == 'ID')                 # IDR Data Record
+
+    #-------------------------------------------------------
+    orbit = data['time'][isrev].astype('f8')     # orbit number
+    mjd = data['lat'][isrev].astype('f8')        # days (integer part)
+    secRev = data['lon'][isrev].astype('f8')     # secs (integer part) 
+    fsecRev = data['surf'][isrev] / 1e6          # secs (fractional part)
+    #-------------------------------------------------------
+
+    # previous rev record (in the data block) of each record
+    irev = np.cumsum(isrev) - 1
+    if rev is not None:
+        orbit, mjd, secRev, fsecRev = [np.append(r, v) 
+            for r, v in zip(rev, (orbit, mjd, secRev, fsecRev))]
+        irev += 1
+    if len(orbit) > 0:
+        rev = (orbit[-1], mjd[-1], secRev[-1], fsecRev[-1])
+
+    # data records (without a previous rev record there is no time)
+    nptsRead = isdat.sum()
+    idat = isdat & (irev >= 0)
+    irev = irev[idat]
+    d = data[idat]
+
+    #-------------------------------------------------------
+    secDat = d['time'] / 1e6       # secs (since time in Rev)
+    lat = d['lat'] / 1e6           # latitude (deg)
+    lon = d['lon'] / 1e6           # longitude (deg)
+    surf = d['surf'] / 1e2         # surface elevation (m)
+    inc = d['inc2'] / 1e2          # orbit correction (m)
+    inccheck = d['inc2']           # check whether the inc is valid
+    surfcheck = d['surf']          # check whether the surf is valid
+    #-------------------------------------------------------
+
+    if islon360: 
+        lon = np.where(lon < 0, lon + 360, np.where(lon > 180, lon - 360, lon))
+    else:
+        lon = np.where(lon > 180, lon - 360, lon)
+
+    # select pts
+    ind, = np.where((surfcheck != -9999) & \
+                    (left <= lon) & (lon <= right) & \
+                    (bottom <= lat) & (lat <= top))
+    irev = irev[ind]
+
+    # fday: fraction of a day
+    # mjd: modified julian days
+    # utc1985: time in seconds since 1-Jan-1985 0h
+    fday = (secRev[irev] + fsecRev[irev] + secDat[ind]) / 86400.
+    utc1985 = ((mjd[irev] - MJD1985) + fday) * 86400.
+
+    # add increment (if defined)
+    elev = np.where(inccheck[ind] != 32767, surf[ind] + inc[ind], surf[ind])
+
+    lon = lon[ind]
+    if not islon360: 
+        lon[lon < 0] += 360    # 0/360
+
+    odata = np.column_stack((orbit[irev], utc1985, lat[ind], lon, elev))
+    return odata, nptsRead, rev
+
+
 def main():
 
     # get region 
@@ -84,125 +158,37 @@ def main():
     nptsRead = 0
     nptsValid = 0
     for ifname in files:
-        # load the whole data file in-memory
-        data = np.fromfile(ifname, dtype=idr, count=-1)
-
-        # iterate over records (100B IDR structs)
-        createFile = False
-        ismatCreated = False 
-        npts = 0
-        nrec = len(data)
-        for i in xrange(nrec):
-            id = data['id'][i]
-
-            # IDR Rev Record
-            if id == 'IR':
-                #-------------------------------------------------------
-                orbit = data['time'][i]          # orbit number
-                mjd = data['lat'][i]             # days (integer part)
-                secRev = data['lon'][i]          # secs (integer part) 
-                fsecRev = data['surf'][i] / 1e6  # secs (fractional part)
-                #-------------------------------------------------------
-
-            # IDR Data Record
-            elif id == 'ID': 
-                #-------------------------------------------------------
-                secDat = data['time'][i] / 1e6 # secs (since time in Rev)
-                lat = data['lat'][i] / 1e6     # latitude (deg)
-                lon = data['lon'][i] / 1e6     # longitude (deg)
-                surf = data['surf'][i] / 1e2   # surface elevation (m)
-                otide = data['otide'][i] / 1e3 # ocean tide correction (m)
-                inc = data['inc2'][i] / 1e2    # orbit correction (m)
-                inccheck = data['inc2'][i]     # check whether the inc is valid
-                surfcheck = data['surf'][i]    # check whether the surf is valid
-                altstat = data['altstat'][i]   # altimetry status flags (31-0)
-                surfstat = data['surfstat'][i] # surface status flags (31-0)
-                retstat = data['retstat1'][i]  # retracking status flags (15-0)
-                #-------------------------------------------------------
-                nptsRead += 1
-
-                ###
-                #print
-                #print lat
-                #print lon
-                #print surf
-                #print otide 
-                #print surfcheck
-                #print 
-                #n = 32768 + 1024 + 64
-                #n = retstat 
-	        #b = bin(n)[2:]
-	        #b = b[::-1]
-                #print n
-                #print b
-                #print len(b)
-                #for i in range(16):
-                #    print i, b[i]
-                #sys.exit()
-                ###
-                
-                if islon360 and lon < 0: 
-                    lon += 360
-                elif lon > 180: 
-                    lon -= 360
-
-                ### computation
-
-                # select pts
-                if  surfcheck != -9999 and \
-                    left <= lon and lon <= right and \
-                    bottom <= lat and lat <= top:
-
-                    createFile = True
-
-                    # fday: fraction of a day
-                    # mjd: modified julian days
-                    # utc1985: time in seconds since 1-Jan-1985 0h
-                    fday = (secRev + fsecRev + secDat) / 86400.
-                    utc1985 = ((mjd - MJD1985) + fday) * 86400.
-
-                    # detide and add increment
-                    elev = surf
-                    #if f24otide: 
-                    #    elev = elev + otide YES -> use flag !!!!!!!!!!!!!!!!!
-                    # do we want the data w/o inc? !!!!!!!!!!!!!!!!!!!!!!!!!!!
-                    if inccheck != 32767: 
-                        elev = elev + inc
-
-                    if not islon360 and lon < 0: 
-                        lon += 360    # 0/360
-
-                    ### output
-                    
-                    dpoint = np.array([orbit, utc1985, lat, lon, elev])
-                    npts += 1
-
-                    if not ismatCreated:
-                        ncol = 5                        # ncol = variables 
-                        nrow = 1000                     # nrow = guess
-                        odata = np.empty((nrow,ncol), 'f8')  
-                        ismatCreated = True
-
-                    if ismatCreated and npts <= nrow:           
-                        odata[npts-1,:] = dpoint        # index starts at 0
-                    elif ismatCreated and npts > nrow:  # more memory needed
-                        tmp = np.empty((nrow,ncol), 'f8')
-                        odata = np.vstack((odata, tmp))
-                        odata[npts-1,:] = dpoint 
-                        nrow = 2*nrow                   
-                else:
-                    continue
-        
-        if createFile and ext == 'h5':                  # HDF5 
+        # memory-map the data file and decode it in blocks of records
+        nrec = os.path.getsize(ifname) / idr.itemsize
+        if nrec == 0:
+            continue
+        data = np.memmap(ifname, dtype=idr, mode='r', shape=(nrec,))
+
+        rev = None
+        blocks = []
+        for i in xrange(0, nrec, NREC):
+            odata, nread, rev = decode(data[i:i+NREC], left, right, 
+                                       bottom, top, islon360, rev)
+            nptsRead += nread
+            if len(odata) > 0:
+                blocks.append(odata)
+        del data
+
+        if len(blocks) == 0:
+            continue
+        odata = np.vstack(blocks)
+        npts = len(odata)
+
+        if ext == 'h5':                                 # HDF5 
             fname = str.join((ifname, '.', ext), '')
             h5f = tb.openFile(fname, 'w')    
-            h5f.createArray(h5f.root, 'data', odata[:npts,:], metadata)            
+            h5f.createArray(h5f.root, 'data', odata, metadata)            
             h5f.close()
             nfiles += 1
             nptsValid += npts 
-        elif createFile and ext == 'txt':               # ASCII
+        elif ext == 'txt':                              # ASCII
             fname = str.join((ifname, '.', ext), '')
-            np.savetxt(fname, odata[:npts,:], fmt='%f')
+            np.savetxt(fname, odata, fmt='%f')
             nfiles += 1
             nptsValid += npts 
     
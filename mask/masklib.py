@@ -13,6 +13,7 @@ import numpy as np
 import tables as tb
 import string as str
 import scipy.io as io
+import scipy.ndimage as nd
 
 
 def get_mask(maskfile, x='/x', y='/y', mask='/mask', paddzeros=0):
@@ -84,21 +85,98 @@ def digitize(x, y, xm, ym):
     return [j_bins-1, i_bins-1]  # shift inds to the left (from edges)
 
 
-def apply_mask(lon, lat, xm, ym, mask, buf=0, **kw):
+def border_dist(mask):
+    """
+    Distance (in pixels) from each pixel to the nearest pixel of a 
+    different class -> 2D array (uint16).
+
+    The distance is the half side of the smallest square window centered 
+    on the pixel that contains a class change, so for a 1 km mask a pixel
+    is inside a `buf` km border if dist <= buf.
+    """
+    print 'computing distance to class borders ...'
+    dmax = np.iinfo('u2').max
+    dist = np.zeros(mask.shape, 'u2')
+    for c in np.unique(mask):
+        isc = (mask == c)
+        d = nd.distance_transform_cdt(isc, metric='chessboard')
+        d[d < 0] = dmax  # no other class in the mask
+        dist[isc] = np.minimum(d[isc], dmax)
+    print 'done.'
+    return dist
+
+
+def get_border_dist(maskfile, mask, paddzeros=0):
+    """
+    Get the distance to class borders of `mask` (see `border_dist`).
+
+    The distance raster is cached to HDF5 next to the mask file, it is
+    computed (and saved) only if the cache doesn't exist or doesn't match
+    (shape, and size/modification time of the mask file). `mask` and 
+    `paddzeros` are the ones returned/used by `get_mask`.
+    """
+    fname = os.path.splitext(maskfile)[0] + '_dist'
+    if paddzeros != 0:
+        fname += '_padd%d' % paddzeros
+    fname += '.h5'
+    stat = os.stat(maskfile)
+    if os.path.exists(fname):
+        fin = tb.openFile(fname, 'r')
+        attrs = fin.root.dist.attrs
+        valid = (getattr(attrs, 'mask_size', None) == stat.st_size and
+                 getattr(attrs, 'mask_mtime', None) == stat.st_mtime)
+        dist = fin.root.dist.read()
+        fin.close()
+        if valid and dist.shape == mask.shape:
+            print 'distance to borders from:', fname
+            return dist
+    dist = border_dist(mask)
+    try:
+        fout = tb.openFile(fname, 'w')
+    except IOError:
+        print 'could not cache distance to borders ->', fname
+        return dist
+    atom = tb.Atom.from_dtype(dist.dtype)
+    filters = tb.Filters(complib='blosc', complevel=9)
+    d = fout.createCArray('/','dist', atom=atom, shape=dist.shape, filters=filters)
+    d[:] = dist
+    d.attrs.mask_size = stat.st_size
+    d.attrs.mask_mtime = stat.st_mtime
+    fout.close()
+    print 'distance to borders cached ->', fname
+    return dist
+
+
+def apply_mask(lon, lat, xm, ym, mask, buf=0, dist=None, **kw):
+    """
+    Mask flags of the lon/lat points -> [flg1, flg2].
+
+    flg1 : mask value (class) at each point.
+    flg2 : 1 if there is a class change inside a square window of
+        (2*buf+1)**2 pixels centered on the point, 0 otherwise.
+
+    `dist` is the raster from `border_dist` or `get_border_dist` (for
+    the same `mask`); it is computed if not given and buf != 0.
+    """
     x, y = ll2xy(lon, lat, **kw)
     x, y = np.rint(x), np.rint(y)
     xm2, ym2, mask2 = get_subreg(x, y, xm, ym, mask, buf=0)
+    if buf != 0:
+        if dist is None:
+            dist = border_dist(mask)
+        _, _, dist2 = get_subreg(x, y, xm, ym, dist, buf=0)
     if ym2[0] > ym2[-1]:
         # monotonically increasing
         ym2 = ym2[::-1]  
         mask2 = mask2[::-1,:]
+        if buf != 0:
+            dist2 = dist2[::-1,:]
     jj, ii = digitize(x, y, xm2, ym2)
     flg1 = mask2[ii,jj]    # return flags (1D array)
     flg2 = np.zeros_like(flg1)
     if buf != 0:
         print 'searching %d km buffer ...' % buf
-        for k, (i, j) in enumerate(zip(ii, jj)):
-            flg2[k] = ~np.alltrue(mask2[i,j] == mask2[i-buf:i+buf+1,j-buf:j+buf+1])
+        flg2[:] = (dist2[ii,jj] <= buf)
         print 'done.'
     return [flg1, flg2]
 
@@ -37,9 +37,14 @@ def main(args):
     print 'processing %d files ...' % len(files)
     ### mask
     if BUF2 is not None:
-        xm, ym, mask = get_mask(maskfile, paddzeros=BUF2+2)
+        padd = BUF2 + 2
     else:
-        xm, ym, mask = get_mask(maskfile, paddzeros=0)
+        padd = 0
+    xm, ym, mask = get_mask(maskfile, paddzeros=padd)
+    if buf != 0 or BUF2 is not None:
+        dist = get_border_dist(maskfile, mask, paddzeros=padd)
+    else:
+        dist = None    # not used w/o buffer
     xm, ym = np.rint(xm), np.rint(ym)
 
     for fname in files:
@@ -49,9 +54,9 @@ def main(args):
         lon = data[:,loncol]
         lat = data[:,latcol]
 
-        flg1, flg2 = apply_mask(lon, lat, xm, ym, mask, buf=buf, slon=0)
+        flg1, flg2 = apply_mask(lon, lat, xm, ym, mask, buf=buf, dist=dist, slon=0)
         if BUF2 is not None:
-            _, flg3 = apply_mask(lon, lat, xm, ym, mask, buf=BUF2, slon=0)
+            _, flg3 = apply_mask(lon, lat, xm, ym, mask, buf=BUF2, dist=dist, slon=0)
 
         ### output 
         fnameout = os.path.splitext(fname)[0] + '_mask.h5'
@@ -30,6 +30,7 @@ def main(args):
 
     print 'processing %d files ...' % len(files)
     xm, ym, mask = get_mask(maskfile, paddzeros=BUF2+2)
+    dist = get_border_dist(maskfile, mask, paddzeros=BUF2+2)
     xm, ym = np.rint(xm), np.rint(ym)
     for fname in files:
         # input
@@ -41,8 +42,8 @@ def main(args):
         lon = tbl.cols.lon[:]
         lat = tbl.cols.lat[:]
 
-        flg1, flg2 = apply_mask(lon, lat, xm, ym, mask, buf=buf, slon=0)
-        _, flg3 = apply_mask(lon, lat, xm, ym, mask, buf=BUF2, slon=0)
+        flg1, flg2 = apply_mask(lon, lat, xm, ym, mask, buf=buf, dist=dist, slon=0)
+        _, flg3 = apply_mask(lon, lat, xm, ym, mask, buf=BUF2, dist=dist, slon=0)
 
         save_arr_as_tbl(fname, TABLE_NAME, {'fmask': flg1, 'fbord': flg2, 'fbuf': flg3})
 
@@ -0,0 +1,179 @@
+"""
+Buffered writer for 3d (t,y,x) PyTables arrays written one time series
+(or a few grid cells) at a time.
+
+Writing `carr[:,i,j] = ts` into a compressed CArray reads, decompresses,
+modifies, recompresses and writes back every chunk containing (i,j),
+i.e., the same chunks are rewritten once per grid cell. `ChunkWriter`
+buffers the writes in memory per spatial block (all times x one chunk
+in y,x) and writes every block once, as soon as all of its elements have
+been set, or on `flush`/`close`. The content of the output array is the
+same as with the direct writes.
+
+Example
+-------
+c = ChunkWriter(fout.create_carray('/', 'dh', atom, (nt,ny,nx), '', filters))
+for i, j in np.ndindex(ny, nx):
+    c[:,i,j] = ts
+c.close()   # write incomplete blocks (before closing the file!)
+
+Several arrays of the same file should share one memory budget, so the
+total memory is `max_mb` and not `max_mb` per array:
+
+c1, c2, c3 = chunk_writers((carr1, carr2, carr3), max_mb=512)
+
+Note: a block is only complete when all of its cells have been written.
+Cells that are never written (e.g. skipped because they have no data)
+keep their blocks in memory until the budget is exceeded (then the
+oldest block is merged w/the array content) or until `flush`/`close`.
+
+"""
+# October 17, 2026
+
+import numpy as np
+
+
+class ChunkBudget(object):
+    """
+    Memory budget shared by several `ChunkWriter`s: when the buffered
+    blocks of all the writers exceed `max_mb` (MB), the oldest block (of
+    any writer) is written.
+    """
+    def __init__(self, max_mb=256):
+        self.max_bytes = max_mb * 2**20
+        self.order = []           # (writer,bi,bj) by time of creation
+        self.nbytes = 0
+
+    def reduce(self):
+        """Write the oldest blocks until the budget is respected."""
+        while self.nbytes > self.max_bytes and self.order:
+            writer, bi, bj = self.order[0]
+            writer._write(bi, bj)
+
+
+class ChunkWriter(object):
+    """
+    Wrap a 3d (t,y,x) array (CArray/EArray), buffering the writes per chunk.
+
+    carr : PyTables array (or any array with `shape` and `chunkshape`)
+    max_mb : max memory (MB) for the buffered blocks, when exceeded the
+        oldest incomplete block is written (merged w/the array content)
+    budget : `ChunkBudget` shared w/other writers (`max_mb` is ignored),
+        see `chunk_writers`
+
+    Writing is done with `c[key] = value` (as for the array), any other
+    attribute is taken from the wrapped array. Reading `c[key]` writes
+    all the buffered blocks first.
+    """
+    def __init__(self, carr, max_mb=256, budget=None):
+        self.carr = carr
+        nt, ny, nx = carr.shape
+        chunk = getattr(carr, 'chunkshape', None) or (nt, 1, 1)
+        self.cy, self.cx = chunk[1:]
+        self.budget = budget if budget is not None else ChunkBudget(max_mb)
+        self.blocks = {}          # (bi,bj) -> [data, written, count]
+        self.order = []           # blocks by time of creation
+
+    def __getattr__(self, name):
+        return getattr(self.carr, name)
+
+    def __len__(self):
+        return len(self.carr)
+
+    def __getitem__(self, key):
+        self.flush()
+        return self.carr[key]
+
+    def __setitem__(self, key, value):
+        nt, ny, nx = self.carr.shape
+        (t1, t2), (y1, y2), (x1, x2), shape = _bounds(key, (nt,ny,nx))
+        if t2 <= t1 or y2 <= y1 or x2 <= x1:
+            return
+        v = np.empty(shape, self.carr.dtype)
+        v[...] = value
+        value = v.reshape(t2-t1, y2-y1, x2-x1)
+        for bi in xrange(y1 // self.cy, (y2-1) // self.cy + 1):
+            for bj in xrange(x1 // self.cx, (x2-1) // self.cx + 1):
+                by, bx = bi * self.cy, bj * self.cx
+                ya, yb = max(y1, by), min(y2, by + self.cy)
+                xa, xb = max(x1, bx), min(x2, bx + self.cx)
+                data, written = self._block(bi, bj)
+                sub = np.s_[t1:t2, ya-by:yb-by, xa-bx:xb-bx]
+                self.blocks[bi,bj][2] += (~written[sub]).sum()
+                written[sub] = True
+                data[sub] = value[:, ya-y1:yb-y1, xa-x1:xb-x1]
+                if self.blocks[bi,bj][2] == written.size:
+                    self._write(bi, bj)
+        self.budget.reduce()
+
+    def _block(self, bi, bj):
+        """Get (or create) the buffer of block (bi,bj)."""
+        if (bi,bj) not in self.blocks:
+            nt, ny, nx = self.carr.shape
+            shape = (nt, min(self.cy, ny - bi * self.cy),
+                         min(self.cx, nx - bj * self.cx))
+            data = np.empty(shape, self.carr.dtype)
+            written = np.zeros(shape, bool)
+            self.blocks[bi,bj] = [data, written, 0]
+            self.order.append((bi,bj))
+            self.budget.order.append((self, bi, bj))
+            self.budget.nbytes += data.nbytes + written.nbytes
+        return self.blocks[bi,bj][:2]
+
+    def _write(self, bi, bj):
+        """Write block (bi,bj) to the array (once) and free the buffer."""
+        data, written, count = self.blocks.pop((bi,bj))
+        self.order.remove((bi,bj))
+        self.budget.order.remove((self, bi, bj))
+        self.budget.nbytes -= data.nbytes + written.nbytes
+        nt, ny, nx = data.shape
+        y, x = bi * self.cy, bj * self.cx
+        key = np.s_[:, y:y+ny, x:x+nx]
+        if count < written.size:
+            # incomplete block: keep the current content of the array
+            block = self.carr[key]
+            block[written] = data[written]
+            data = block
+        self.carr[key] = data
+
+    def flush(self):
+        """Write all the buffered blocks."""
+        while self.order:
+            self._write(*self.order[0])
+
+    def close(self):
+        """Write all the buffered blocks (the array is not closed)."""
+        self.flush()
+
+
+def chunk_writers(arrays, max_mb=256):
+    """Wrap several arrays w/`ChunkWriter`s sharing `max_mb` (MB)."""
+    budget = ChunkBudget(max_mb)
+    return [ChunkWriter(carr, budget=budget) for carr in arrays]
+
+
+def _bounds(key, shape):
+    """
+    Key of a 3d array -> (start,stop) for each dim and the shape of
+    the selection (as for numpy). Only ints and slices w/step 1.
+    """
+    key = np.index_exp[key]
+    if Ellipsis in key:
+        k = key.index(Ellipsis)
+        key = key[:k] + (slice(None),) * (len(shape) - len(key) + 1) + key[k+1:]
+    key = key + (slice(None),) * (len(shape) - len(key))
+    bounds, sel = [], []
+    for k, n in zip(key, shape):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(n)
+            if step != 1:
+                raise IndexError('only slices w/step 1 are supported')
+            bounds.append((start, max(start, stop)))
+            sel.append(max(0, stop - start))
+        else:
+            k = int(k)
+            if k < 0: k += n
+            if not 0 <= k < n:
+                raise IndexError('index %d out of range' % k)
+            bounds.append((k, k + 1))
+    return bounds[0], bounds[1], bounds[2], tuple(sel)
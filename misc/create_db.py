@@ -4,6 +4,8 @@ import datetime as dt
 import numpy as np
 import tables as tb
 
+from timeconv import sec2dt64
+
 class Elevation(tb.IsDescription):
     time = tb.StringCol(64, pos=1)
     orbit = tb.Int32Col(pos=2)
@@ -71,11 +73,9 @@ class TimeSeries(tb.IsDescription):
 def utc85_to_datetime(utc85):
     """Converts frac seconds from 1985-1-1 00:00:00 to datetime.
 
-    Note: utc 1985 (or "ESA time") is local time.
+    Note: utc 1985 (or "ESA time") is local time. NaN -> ValueError.
     """
-    #utc85[np.isnan(utc85)] = 0.0
-    datetime85 = dt.datetime(1985, 1, 1)
-    return [(datetime85 + dt.timedelta(seconds=fsecs)) for fsecs in utc85]
+    return list(sec2dt64(utc85, since_year=1985).astype(object))
 
 
 def season(month):
@@ -0,0 +1,94 @@
+"""
+Vectorized conversion of `seconds since epoch` to calendar quantities.
+
+The epoch is <since_year>-Jan-1 00:00:00, e.g. utc85 (or ESA-time) is
+seconds since 1985-Jan-1 00:00:00. All the conversions are done with
+array arithmetic (numpy datetime64, us resolution), no `datetime`
+object is created per element.
+
+Non-finite seconds (NaN/inf fill values) raise ValueError, as the
+per-element `datetime.timedelta` conversions did, so fill records have
+to be removed by the caller (`sec2mjd` is plain arithmetic, NaN -> NaN).
+
+"""
+# October 17, 2026
+
+import numpy as np
+
+MJD_EPOCH = np.datetime64('1858-11-17', 'D')
+US_PER_DAY = 86400 * 10**6
+
+
+def _epoch(since_year):
+    return np.datetime64('%04d-01-01' % since_year, 'us')
+
+
+def _to_us(secs):
+    """Decimal seconds -> int microseconds (rounded as `timedelta`)."""
+    secs = np.atleast_1d(np.asarray(secs, 'f8'))
+    if not np.isfinite(secs).all():
+        raise ValueError('non-finite seconds (NaN/inf) in time conversion')
+    whole = np.floor(secs)
+    frac = np.round((secs - whole) * 1e6).astype('i8')
+    return whole.astype('i8') * 10**6 + frac
+
+
+def sec2dt64(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> datetime64[us]."""
+    return _epoch(since_year) + _to_us(secs).astype('m8[us]')
+
+
+def dt642ymdhms(t):
+    """datetime64 -> (N,6) int array: year, month, day, hour, min, sec."""
+    t = np.atleast_1d(np.asarray(t, 'M8[us]'))
+    if (t.view('i8') == np.iinfo('i8').min).any():     # NaT
+        raise ValueError('NaT in time conversion')
+    Y = t.astype('M8[Y]')
+    M = t.astype('M8[M]')
+    D = t.astype('M8[D]')
+    us = (t - D.astype('M8[us]')).astype('i8')    # of the day
+    secs = us // 10**6
+    return np.column_stack((Y.astype('i8') + 1970,
+                            (M - Y.astype('M8[M]')).astype('i8') + 1,
+                            (D - M.astype('M8[D]')).astype('i8') + 1,
+                            secs // 3600, (secs % 3600) // 60, secs % 60))
+
+
+def sec2ymdhms(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> (N,6) int array:
+    year, month, day, hour, minute, second (truncated, as `datetime`)."""
+    return dt642ymdhms(sec2dt64(secs, since_year))
+
+
+def sec2ymd(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> year, month, day (int arrays)."""
+    ymdhms = sec2ymdhms(secs, since_year)
+    return ymdhms[:,0], ymdhms[:,1], ymdhms[:,2]
+
+
+def sec2year(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> decimal year.
+
+    The fraction is w.r.t. the length of the respective year (365 or 366
+    days), i.e., Jan-1 00:00:00 is <year>.0.
+    """
+    t = sec2dt64(secs, since_year)
+    Y = t.astype('M8[Y]')
+    y0 = Y.astype('M8[us]')
+    y1 = (Y + 1).astype('M8[us]')
+    frac = (t - y0).astype('f8') / (y1 - y0).astype('f8')
+    return Y.astype('f8') + 1970 + frac
+
+
+def sec2doy(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> fractional day of year,
+    Jan-1 00:00:00 is 1.0."""
+    t = sec2dt64(secs, since_year)
+    y0 = t.astype('M8[Y]').astype('M8[us]')
+    return (t - y0).astype('f8') / US_PER_DAY + 1
+
+
+def sec2mjd(secs, since_year=1985):
+    """Seconds since <since_year>-Jan-1 -> Modified Julian Day (NaN -> NaN)."""
+    days = (_epoch(since_year).astype('M8[D]') - MJD_EPOCH).astype('f8')
+    return days + np.asarray(secs, 'f8') / 86400.
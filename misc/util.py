@@ -12,6 +12,8 @@ import scipy as sp
 import tables as tb
 import datetime as dt
 
+from timeconv import *
+
 # definition of Table structures for HDF5 files
 
 class TimeSeries(tb.IsDescription):
@@ -59,44 +61,42 @@ class SecsToDateTime(object):
         else:
             self.secs = secs  
 
-        if since_epoch is None:
-            # <since_year>-Jan-1 00:00:00
-            ref_epoch = dt.date(since_year, 1, 1)
-        else:
-            # not working !!!!!!!!!!!!!!!!!!!!!
-            ref_epoch = dt.datetime(since_epoch)    
-
-        # ref_epoch in days since 0001-Jan-1 00:00:00
-        ref_epoch_in_days = mpl.date2num(ref_epoch)  
+        if since_epoch is not None:
+            # secs since <YYYY>-Jan-1 00:00:00 of the given epoch
+            since_year = since_epoch[0]
+            epoch = np.datetime64(dt.datetime(*since_epoch), 'us')
+            shift = epoch - np.datetime64('%04d-01-01' % since_year, 'us')
+            self.secs = self.secs + shift.astype('f8') / 1e6
 
-        # secs/86400 -> frac days -> date
-        frac_days = self.secs / (24*60*60.)
-        self._datenum = ref_epoch_in_days + frac_days
-        self._dates = mpl.num2date(self._datenum)
+        # all fields at once (see `timeconv`)
+        self.since_year = since_year
+        self._dt64 = sec2dt64(self.secs, since_year)
+        self._ymdhms = dt642ymdhms(self._dt64)
 
     def datenum(self, matlab=False):
+        # MJD 0 (1858-Nov-17) is day 678576 since 0001-Jan-1 (day 1)
+        datenum = sec2mjd(self.secs, self.since_year) + 678576.
         if matlab:
             # frac days since 0000-Jan-1 00:00:00
-            return self._datenum + 366.
+            return datenum + 366.
         else:
             # frac days since 0001-Jan-1 00:00:00
-            return self._datenum
+            return datenum
 
     def dates(self):
-        return self._dates
+        return self._dt64.astype(object)
 
     def years(self):
-        return np.array([d.year for d in self._dates])
+        return self._ymdhms[:,0]
 
     def months(self):
-        return np.array([d.month for d in self._dates])
+        return self._ymdhms[:,1]
         
     def days(self):
-        return np.array([d.day for d in self._dates])
+        return self._ymdhms[:,2]
 
     def ymdhms(self):
-        return np.array([(d.year, d.month, d.day, d.hour,
-            d.minute, d.second) for d in self._dates])
+        return self._ymdhms
 
 
 class CircularList(list):
@@ -747,8 +747,7 @@ def sec2dt(secs, since_year=1985):
     Convert seconds since_year to datetime objects
     secs : float, array
     """
-    dt_ref = dt.datetime(since_year, 1, 1, 0, 0)
-    return [dt_ref + dt.timedelta(seconds=s) for s in secs]
+    return list(sec2dt64(secs, since_year).astype(object))
 
 
 def fy2ym(fyear):
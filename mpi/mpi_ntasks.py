@@ -86,3 +86,6 @@ pairs = get_all_comb(files_in)
 print 'total number of combinations:', len(pairs)
 pairs = remove_duplicates(pairs)
 print 'combinations w/o duplicates (ntasks):', len(pairs)
+
+from mpi_x2sys import schedule  # updates the catalog of the files
+print 'combinations w/ common coverage (ntasks):', len(schedule(pairs))
@@ -4,12 +4,21 @@ NOTE
 ----
 1) edit ASC, DES, DATE and REG patterns according input files.
 2) run mpi_ntasks.py <same args> <same files> to set up the number of nodes.
+3) pairs are handed out dynamically by rank 0 (master), the most expensive
+   first. The cost of a pair is estimated from the catalog of the files
+   (see trackcat.py: number of pts, time range and occupied cells, it is
+   updated with new files on every run); pairs that can't have crossovers
+   (no common cells, or too far apart in time) are skipped. For files
+   not in the catalog the number of pts is estimated from the file size.
+4) without MPI launcher (or mpi4py) the pairs run in a local process pool.
 
 EXAMPLE
 -------
 mpiexec -v -machinefile $PBS_NODEFILE python mpi_x2sys.py \
     '/home/fpaolo/code/x2sys/x2sys.py -s shelf -r' ~/data/envi/*_?
 
+python mpi_x2sys.py '/home/fpaolo/code/x2sys/xover.py -r' ~/data/envi/*_?
+
 September 1, 2012
 Fernando Paolo <fpaolo@ucsd.edu>
 """
@@ -18,8 +27,15 @@ import os
 import sys
 import re
 import numpy as np
+import multiprocessing as mp
 from itertools import combinations as comb
-from mpi4py import MPI
+
+from trackcat import TrackCatalog, overlap, time_gap
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
 
 ### [edit] patterns in file name
 
@@ -28,17 +44,13 @@ DES = '_d'
 DATE = '\d\d\d\d\d\d\d\d'
 REG = '_\d\d_'  # `None` for no regions
 
-def simple_partitioning(length, num_procs):
-    sublengths = [length/num_procs]*num_procs
-    for i in range(length % num_procs):    # treatment of remainder
-        sublengths[i] += 1
-    return sublengths
+### [edit] scheduling
 
-def get_subproblem_input_args(input_args, my_rank, num_procs):
-    sub_ns = simple_partitioning(len(input_args), num_procs)
-    my_offset = sum(sub_ns[:my_rank])
-    my_input_args = input_args[my_offset:my_offset+sub_ns[my_rank]]
-    return my_input_args
+CATALOG = 'tracks.db'  # catalog of the track files (see trackcat.py)
+MAX_DAYS = None  # max time btw files of a pair in days, `None` for no limit
+NJOBS = None     # processes of the local pool, `None` for all cpus
+BYTES_PER_PT = 80  # file size per pt, to estimate the pts of the files not
+                   # in the catalog (if no cataloged file to calibrate it)
 
 def program_to_run(string):
     if '.py' in string:
@@ -77,20 +89,114 @@ def remove_duplicates(pairs):
     return [ff for ff in pairs if ff != 'x'] 
 
 
-comm = MPI.COMM_WORLD
-my_rank = comm.Get_rank()
-num_procs = comm.Get_size()
-
-prog_and_args = sys.argv[1]
-files_in = sys.argv[2:]
+def pair_cost(rec1, rec2):
+    """Estimated cost of crossing a pair of files (catalog records): the 
+    product of the fraction of each file (pts) inside the common occupied
+    cells. Zero if the files can't have crossovers."""
+    if MAX_DAYS is not None and time_gap(rec1, rec2) > MAX_DAYS * 86400.:
+        return 0.
+    common = overlap(rec1, rec2)
+    if common == 0:               # no common cells
+        return 0.
+    n1, n2 = rec1['npts'], rec2['npts']
+    c1, c2 = rec1['bitmap'].sum(), rec2['bitmap'].sum()
+    return (n1 * float(common) / c1) * (n2 * float(common) / c2)
+
+def bytes_per_pt(rec):
+    """Median file size per pt of the cataloged files (fname -> record),
+    or BYTES_PER_PT if none."""
+    ratios = [float(r['size']) / r['npts'] for r in rec.values()
+              if r is not None and r['npts'] > 0]
+    return np.median(ratios) if ratios else BYTES_PER_PT
+
+def npts_of(fname, rec, bpp):
+    """Number of pts of a file, from the catalog or estimated from its size
+    (`bpp` bytes per pt)."""
+    if rec is not None:
+        return rec['npts']
+    return os.path.getsize(fname) / float(bpp)
+
+def schedule(pairs):
+    """Pairs that can have crossovers, most expensive first. The catalog
+    is updated with the new (or modified) files first."""
+    files = np.unique([f for pair in pairs for f in pair])
+    cat = TrackCatalog(CATALOG)
+    cat.update(files)
+    rec = dict((f, cat.get(f)) for f in files)
+    cat.close()
+    bpp = bytes_per_pt(rec)
+    costs = []
+    for f1, f2 in pairs:
+        if rec[f1] is None or rec[f2] is None:  # not cataloged (e.g. ASCII)
+            # overlap unknown: all pts of both files (max of pair_cost)
+            costs.append(npts_of(f1, rec[f1], bpp) * npts_of(f2, rec[f2], bpp))
+        else:
+            costs.append(pair_cost(rec[f1], rec[f2]))
+    order = np.argsort(costs, kind='mergesort')[::-1]
+    return [pairs[i] for i in order if costs[i] > 0]
+
+def run_pair(task):
+    prog, (f1, f2) = task
+    os.system('%s %s %s' % (prog, f1, f2))
+    return f1, f2
+
+### master/worker with MPI (rank 0 only hands out pairs)
+
+READY, WORK = 1, 2
+
+def master(comm, tasks):
+    status = MPI.Status()
+    nworkers = comm.Get_size() - 1
+    for n, task in enumerate(tasks + [None]*nworkers):
+        comm.recv(source=MPI.ANY_SOURCE, tag=READY, status=status)
+        comm.send(task, dest=status.Get_source(), tag=WORK)
+        if task is not None:
+            print 'pair %d of %d -> rank #%d' % (n+1, len(tasks), 
+                                                status.Get_source())
+
+def worker(comm):
+    while True:
+        comm.send(None, dest=0, tag=READY)
+        task = comm.recv(source=0, tag=WORK)
+        if task is None:
+            break
+        run_pair(task)
+
+
+def main():
+    prog_and_args = sys.argv[1]
+    files_in = sys.argv[2:]
+    prog = program_to_run(prog_and_args) + prog_and_args
+
+    if MPI is not None:
+        comm = MPI.COMM_WORLD
+        my_rank = comm.Get_rank()
+        num_procs = comm.Get_size()
+    else:
+        my_rank, num_procs = 0, 1
+
+    if my_rank == 0:
+        files_in = sep_files_by_reg(files_in, REG) 
+        pairs = get_all_comb(files_in)
+        pairs = remove_duplicates(pairs)
+        npairs = len(pairs)
+        pairs = schedule(pairs)
+        tasks = [(prog, pair) for pair in pairs]
+        print 'pairs of files: %d (%d skipped)' % (len(pairs), npairs - len(pairs))
+
+    if num_procs > 1:
+        if my_rank == 0:
+            master(comm, tasks)
+        else:
+            worker(comm)
+    else:
+        # no MPI launcher -> local process pool
+        pool = mp.Pool(NJOBS)
+        for f1, f2 in pool.imap_unordered(run_pair, tasks, chunksize=1):
+            print 'done:', f1, f2
+        pool.close()
+        pool.join()
 
-files_in = sep_files_by_reg(files_in, REG) 
-pairs = get_all_comb(files_in)
-pairs = remove_duplicates(pairs)
-run = program_to_run(prog_and_args)
-my_pairs = get_subproblem_input_args(pairs, my_rank, num_procs)
 
-print 'pairs of files rank #%d (of %d):\n' % (my_rank, num_procs), my_pairs
-for f1, f2 in my_pairs:
-    os.system('%s%s %s %s' % (run, prog_and_args, f1, f2))
-    #print '%s%s %s %s' % (run, prog_and_args, f1, f2)
+if __name__ == '__main__':
+    main()
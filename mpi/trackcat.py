@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+Persistent catalog of track files, to prune the pairs of files to cross.
+
+For each (HDF5) track file the catalog holds: lon/lat bounding box, time
+range, number of pts and a coarse occupancy bitmap (global grid of BIN
+deg). It is a single SQLite file, updated incrementally: only new files,
+or files modified since they were cataloged, are read.
+
+The bitmap has the cells crossed by the track segments (btw consecutive
+pts of the same pass, so along-track gaps are filled, but not the jumps
+btw passes) plus one cell around them, so two tracks crossing in a cell
+w/o pts of any of them (e.g. at a cell corner) still share cells.
+
+NOTE
+----
+edit LON, LAT, TIME columns and BIN size according input files.
+
+EXAMPLE
+-------
+python trackcat.py -c ~/data/envi/tracks.db ~/data/envi/*_?
+
+October 17, 2026
+"""
+
+import os
+import sqlite3
+import argparse as ap
+import numpy as np
+import tables as tb
+
+### [edit] columns in the HDF5 `data` and size of the bitmap cells
+
+LON = 3
+LAT = 2
+TIME = 1         # utc85 (secs), `None` for no time column
+ORBIT = None     # orbit number, `None` for no orbit column
+BIN = 1.0        # deg
+MAXGAP = 200.    # max distance (km) btw consecutive pts of a segment
+MAXDT = 60.      # max time (secs) btw consecutive pts of a segment
+
+NX = int(np.ceil(360 / BIN))
+NY = int(np.ceil(180 / BIN))
+
+VERSION = 3      # of the bitmap, older catalogs are rebuilt
+R = 6371.0       # mean Earth radius (km)
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS tracks (
+    fname TEXT PRIMARY KEY, mtime REAL, size INTEGER, npts INTEGER,
+    lon1 REAL, lon2 REAL, lat1 REAL, lat2 REAL, t1 REAL, t2 REAL,
+    bitmap BLOB)'''
+
+COLS = ['fname', 'mtime', 'size', 'npts', 'lon1', 'lon2', 'lat1', 'lat2',
+        't1', 't2', 'bitmap']
+
+
+def get_segments(lon, lat, t=None, orbit=None, maxgap=MAXGAP, maxdt=MAXDT):
+    """
+    Indices `i` of the valid track segments (pt i -> pt i+1), as in
+    `x2sys/funcs.get_segments`: a segment is not valid if the two pts are 
+    from different orbits, or are apart more than `maxgap` km or `maxdt`
+    secs (e.g. the end of one pass and the start of the next one).
+    """
+    dlon = (np.diff(lon) + 180) % 360 - 180
+    dlat = np.diff(lat)
+    latm = np.radians(lat[:-1] + dlat/2.)
+    dist = R * np.radians(np.hypot(dlon * np.cos(latm), dlat))  # km
+    valid = (dist <= maxgap)
+    if t is not None:
+        valid &= (np.abs(np.diff(t)) <= maxdt)
+    if orbit is not None:
+        valid &= (orbit[1:] == orbit[:-1])
+    iseg, = np.where(valid)
+    return iseg
+
+
+def densify(lon, lat, iseg, step=BIN/4.):
+    """The pts plus pts along the segments `iseg` (pt i -> pt i+1), at 
+    most `step` deg apart (the shortest way in lon)."""
+    if len(iseg) == 0:
+        return lon, lat
+    dlon = ((lon[iseg+1] - lon[iseg]) + 180) % 360 - 180
+    dlat = lat[iseg+1] - lat[iseg]
+    nseg = np.ceil(np.maximum(np.abs(dlon), np.abs(dlat)) / step)
+    nseg = np.maximum(nseg, 1).astype('i8')
+    seg = np.repeat(np.arange(len(nseg)), nseg)
+    frac = (np.arange(nseg.sum()) - np.repeat(np.cumsum(nseg) - nseg, nseg)) \
+           / np.repeat(nseg, nseg).astype('f8')
+    lon2 = np.append(lon, lon[iseg][seg] + frac * dlon[seg])
+    lat2 = np.append(lat, lat[iseg][seg] + frac * dlat[seg])
+    return lon2, lat2
+
+
+def occupancy(lon, lat, t=None, orbit=None):
+    """Coarse occupancy bitmap (NY*NX bool) of the track, lon in 0/360:
+    cells of the pts and crossed by the valid segments btw pts (see
+    `get_segments`), dilated by one cell."""
+    if len(lon) > 1:
+        lon, lat = densify(lon, lat, get_segments(lon, lat, t, orbit))
+    j = np.floor((lon % 360) / BIN).astype('i8')
+    i = np.floor((lat + 90) / BIN).astype('i8')
+    ok = (0 <= i) & (i < NY) & (0 <= j) & (j < NX)
+    bitmap = np.zeros((NY, NX), bool)
+    bitmap[i[ok], j[ok]] = True
+    dilated = bitmap.copy()
+    dilated[1:] |= bitmap[:-1]
+    dilated[:-1] |= bitmap[1:]
+    dilated |= np.roll(dilated, 1, axis=1) | np.roll(dilated, -1, axis=1)
+    return dilated.ravel()
+
+
+def track_info(fname):
+    """Catalog record (dict) of a track file, or None if it can't be read."""
+    try:
+        f = tb.openFile(fname)
+        data = f.root.data
+        lon = data[:,LON]
+        lat = data[:,LAT]
+        t = data[:,TIME] if TIME is not None else None
+        orbit = data[:,ORBIT] if ORBIT is not None else None
+        f.close()
+    except Exception:
+        return None
+    ok = np.isfinite(lon) & np.isfinite(lat)
+    lon, lat = lon[ok], lat[ok]
+    t_ok = t[ok] if t is not None else None
+    orbit = orbit[ok] if orbit is not None else None
+    rec = dict(fname=fname, mtime=os.path.getmtime(fname),
+               size=os.path.getsize(fname), npts=len(lon),
+               lon1=None, lon2=None, lat1=None, lat2=None, t1=None, t2=None,
+               bitmap=occupancy(lon, lat, t_ok, orbit))
+    if len(lon) > 0:
+        rec.update(lon1=lon.min(), lon2=lon.max(), lat1=lat.min(),
+                   lat2=lat.max())
+    if t is not None and np.isfinite(t).any():
+        rec.update(t1=np.nanmin(t), t2=np.nanmax(t))
+    return rec
+
+
+def overlap(rec1, rec2):
+    """Number of bitmap cells occupied by both files."""
+    return int((rec1['bitmap'] & rec2['bitmap']).sum())
+
+
+def time_gap(rec1, rec2):
+    """Time btw the time ranges of two files (0 if they intersect)."""
+    if rec1['t1'] is None or rec2['t1'] is None:
+        return 0.
+    gap = max(rec1['t1'], rec2['t1']) - min(rec1['t2'], rec2['t2'])
+    return max(gap, 0.)
+
+
+class TrackCatalog(object):
+    """
+    SQLite catalog of track files.
+
+    >>> cat = TrackCatalog('tracks.db')
+    >>> cat.update(files)       # reads only new/modified files
+    >>> rec = cat.get(fname)    # dict or None (not in the catalog)
+    >>> cat.close()
+    """
+    def __init__(self, fname):
+        self.db = sqlite3.connect(fname)
+        self.db.execute(SCHEMA)
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != VERSION:
+            # bitmaps of an older version, read all the files again
+            self.db.execute('DELETE FROM tracks')
+            self.db.execute('PRAGMA user_version = %d' % VERSION)
+            self.db.commit()
+
+    def _key(self, fname):
+        return os.path.abspath(fname)
+
+    def update(self, files):
+        """Add new files, and files modified since cataloged.
+        Returns the number of files read."""
+        nread = 0
+        for fname in files:
+            key = self._key(fname)
+            row = self.db.execute('SELECT mtime, size FROM tracks '
+                                  'WHERE fname=?', (key,)).fetchone()
+            if row is not None and row[0] == os.path.getmtime(fname) and \
+               row[1] == os.path.getsize(fname):
+                continue
+            rec = track_info(fname)
+            if rec is None:
+                continue
+            rec['fname'] = key
+            rec['bitmap'] = buffer(np.packbits(rec['bitmap']).tostring())
+            values = [rec[c] for c in COLS]
+            values = [float(v) if isinstance(v, np.floating) else v
+                      for v in values]
+            self.db.execute('INSERT OR REPLACE INTO tracks VALUES '
+                            '(?,?,?,?,?,?,?,?,?,?,?)', values)
+            nread += 1
+        self.db.commit()
+        return nread
+
+    def get(self, fname):
+        row = self.db.execute('SELECT * FROM tracks WHERE fname=?',
+                              (self._key(fname),)).fetchone()
+        if row is None:
+            return None
+        rec = dict(zip(COLS, row))
+        bits = np.unpackbits(np.frombuffer(rec['bitmap'], 'u1'))
+        rec['bitmap'] = bits[:NY*NX].astype(bool)
+        return rec
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = ap.ArgumentParser()
+    parser.add_argument('files', nargs='+', help='HDF5 track file[s]')
+    parser.add_argument('-c', dest='catalog', default='tracks.db',
+        help='catalog file to create/update [default: tracks.db]')
+    args = parser.parse_args()
+
+    cat = TrackCatalog(args.catalog)
+    nread = cat.update(args.files)
+    cat.close()
+    print 'files cataloged: %d (of %d) -> %s' % (nread, len(args.files),
+                                                 args.catalog)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,9 @@ cells that fall into the data cells.
 
 Notes
 -----
-The full grid takes about 7.25 hours
+The mask pixels are binned into the data cells in a single pass (see
+funcs.py), the full grid takes a few seconds plus the x/y -> lon/lat
+conversion of the mask.
 
 """
 
@@ -14,11 +16,14 @@ import tables as tb
 import matplotlib.pyplot as plt
 import altimpy as ap
 
+from funcs import *
+
 DIR = '/Users/fpaolo/data/shelves/' 
 FILE_MSK = '/Users/fpaolo/data/masks/scripps/scripps_antarctica_mask1km_v1.h5'
 FILE_IN = 'all_19920716_20111015_shelf_tide_grids_mts.h5.ice_oce'
 FILE_OUT = 'area_grid_cells_new.h5'  # FIXME <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
 SAVE = True
+SAVE_INDEX = False  # save also the pixels of each cell (CSR-style index)
 
 print 'loading data...'
 fin = tb.openFile(DIR + FILE_IN)
@@ -27,9 +32,7 @@ lat = fin.root.lat[:]
 data = fin.root.dh_mean_mixed_const_xcal[:]
 
 if 1: # increment the resolution of the grid
-    inc = 5
-    lon = np.linspace(lon[0], lon[-1], lon.shape[0] * inc)
-    lat = np.linspace(lat[0], lat[-1], lat.shape[0] * inc)
+    lon, lat = refine_grid(lon, lat, inc=5)
 
 if not SAVE: # subset (for testing!)
     data, _ = np.meshgrid(lon, lat)
@@ -45,35 +48,16 @@ msk = f.root.mask[:]
 f.close()
 print 'done'
 
-# 2d -> 1d
-x_msk, y_msk = np.meshgrid(x_msk, y_msk)    # 1d -> 2d
-x_msk, y_msk = x_msk.ravel(), y_msk.ravel() # 2d -> 1d
+# x/y -> lon/lat (1d)
+lon_msk, lat_msk = mask_lonlat(x_msk, y_msk)
 msk = msk.ravel()
-
-# x/y -> lon/lat
-lon_msk, lat_msk = ap.xy2ll(x_msk, y_msk, units='m')
-lon_msk = ap.lon_180_360(lon_msk)
 del x_msk, y_msk
 
-lon_nodes, lat_nodes = ap.cell2node(lon, lat)
-area = np.full((lat.shape[0], lon.shape[0]), np.nan)
-cells_idx = []
-
 # count number of mask cells falling into each data cell
 print 'calculating grid-cell area...'
-for i in xrange(len(lat)):
-    for j in xrange(len(lon)):
-        i_cells, = np.where((lon_nodes[j] <= lon_msk) & \
-                            (lon_msk <= lon_nodes[j+1]) & \
-                            (lat_nodes[i] <= lat_msk) & \
-                            (lat_msk <= lat_nodes[i+1]) & \
-                            (msk == 4))  # 4 = ice shelf
-
-        # each mask cell is 1 km**2
-        area[i,j] = len(i_cells)
-        cells_idx = np.append(cells_idx, i_cells)
-
-cells_idx = [int(i) for i in cells_idx]
+cell = pixel_cells(lon_msk, lat_msk, lon, lat)
+area = cell_area(cell, msk, (lat.shape[0], lon.shape[0]), value=4)  # 4 = ice shelf
+indptr, cells_idx = pixel_index(cell, area.size, sel=(msk == 4))
 
 print 'done'
 ind = ap.where_isnan('crosson', lon, lat)
@@ -90,6 +74,9 @@ if SAVE:
     f.create_array('/', 'area_5', area)
     f.create_array('/', 'lon_5', lon)
     f.create_array('/', 'lat_5', lat)
+    if SAVE_INDEX:
+        f.create_array('/', 'cells_ptr_5', indptr)
+        f.create_array('/', 'cells_idx_5', cells_idx)
     f.flush()
     f.close()
 
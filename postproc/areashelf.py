@@ -15,6 +15,8 @@ from patsy import dmatrix
 from sklearn.linear_model import LassoCV
 from mpl_toolkits.basemap import interp
 
+from funcs import *
+
 SAVE = True
 #FILE_IN = 'h_raw4.h5'
 FILE_OUT = 'ice_shelf_area4.csv'
@@ -139,29 +141,16 @@ if 1: # load mask
     print 'done'
 
 if 1: # 2d -> 1d, x/y -> lon/lat
-    x_msk, y_msk = np.meshgrid(x_msk, y_msk)    # 1d -> 2d
-    x_msk, y_msk = x_msk.ravel(), y_msk.ravel() # 2d -> 1d
+    lon_msk, lat_msk = mask_lonlat(x_msk, y_msk)
     msk = msk.ravel()
-    lon_msk, lat_msk = ap.xy2ll(x_msk, y_msk, units='m')
-    lon_msk = ap.lon_180_360(lon_msk)
     del x_msk, y_msk
 
 lon_nodes, lat_nodes = ap.cell2node(lon, lat)
-area = np.full(data[0].shape, np.nan)
-cells_idx = []
 
 # count number of mask cells falling into each data cell
-for i in xrange(len(lat)):
-    for j in xrange(len(lon)):
-        i_cells, = np.where((lon_nodes[j] <= lon_msk) & \
-                            (lon_msk <= lon_nodes[j+1]) & \
-                            (lat_nodes[i] <= lat_msk) & \
-                            (lat_msk <= lat_nodes[i+1]) & \
-                            (msk == 4))  # 4 = ice shelf
-        area[i,j] = len(i_cells)         # each mask cell is 1 km**2
-        cells_idx = np.append(cells_idx, i_cells)
-
-cells_idx = [int(i) for i in cells_idx]
+cell = pixel_cells(lon_msk, lat_msk, lon, lat)
+area = cell_area(cell, msk, data[0].shape, value=4)  # 4 = ice shelf
+indptr, cells = pixel_index(cell, area.size, sel=(msk == 4))
 
 print area
 print 'Total area (km2):', area.sum()
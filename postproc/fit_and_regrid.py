@@ -3,25 +3,15 @@ import numpy as np
 import scipy as sp
 import pandas as pd
 import tables as tb
-import statsmodels.api as sm
 import matplotlib.pyplot as plt
 import altimpy as ap
 
+from funcs import *
+
 PLOT = False
 DIR = '/Users/fpaolo/data/shelves/' 
 FNAME = 'all_19920716_20111015_shelf_tide_grids_mts.h5'
 
-
-def hpfilter(y, lamb=10): 
-    return sm.tsa.filters.hpfilter(y, lamb=lamb)[1]
-
-def gradient(y, dt=.25):
-    return np.gradient(y.values, dt)
-
-def apply_to_panel(func, panel, *args, **kw):
-    for item in panel.items:
-        panel[item] = func(panel[item], *args, **kw)
-
 ap.rcparams()
 
 print 'loading data...'
@@ -49,22 +39,20 @@ h[ind] = h2[ind]
 print 'smoothing seasonal fields...'
 h = ap.gfilter2d(h, .5)
 
-# array -> panel -> dataframe
-data = pd.Panel(h, items=dt, major_axis=lat, minor_axis=lon
-                ).to_frame(filter_observations=False).T
-
 # annual averages (forward-backward)
 '''
 print 'calculating annual averages...'
+data = pd.Panel(h, items=dt, major_axis=lat, minor_axis=lon
+                ).to_frame(filter_observations=False).T
 ann1 = pd.rolling_mean(data, 5, min_periods=3, center=True)
 ann2 = pd.rolling_mean(data[::-1], 5, min_periods=3, center=True)[::-1]
 annual = ann1.combine_first(ann2).T.to_panel().values
 del ann1, ann2
 '''
 
-# HP filter (in time)
+# HP filter (in time), all grid cells at once
 print 'applying HP filter...'
-hpfilt = data.apply(hpfilter, lamb=7)
+hpfilt = hpfilter_cube(h, lamb=7)
 
 # fit polynomial
 '''
@@ -75,18 +63,17 @@ spline = ap.spline2d(time, h, window=3, min_pts=50)
 
 # calculate derivative
 print 'taking derivatives...'
-hpfilt_grad = hpfilt.apply(gradient, dt=.25)
+hpfilt_grad = np.gradient(hpfilt, .25)[0]
 
 # start series at zero
 print 'referencing time series...'
-hpfilt = hpfilt.apply(ap.referenced, to='first')
+hpfilt = referenced_to_first(hpfilt)
 
 # smooth fields (sigma between 0.6-7)
 print 'smoothing fields...'
-hpfilt = hpfilt.T.to_panel()
-hpfilt_grad = hpfilt_grad.T.to_panel()
-apply_to_panel(ap.gfilter, hpfilt, .7)
-apply_to_panel(ap.gfilter, hpfilt_grad, .7)
+for k in range(hpfilt.shape[0]):
+    hpfilt[k] = ap.gfilter(hpfilt[k], .7)
+    hpfilt_grad[k] = ap.gfilter(hpfilt_grad[k], .7)
 
 # plot time series: (1,161), (2,161), (3,161)
 if PLOT:
@@ -111,8 +98,8 @@ if PLOT:
     plt.plot(time, h[:,i,j], linewidth=1, label='seasonal')
     #plt.plot(time, h_cycle, linewidth=2)
     #plt.plot(time, spline[:,i,j], linewidth=2, label='spline')
-    plt.plot(time, hpfilt.values[:,i,j], linewidth=2, label='hpfilter')
-    plt.plot(time, hpfilt_grad.values[:,i,j], linewidth=1)
+    plt.plot(time, hpfilt[:,i,j], linewidth=2, label='hpfilter')
+    plt.plot(time, hpfilt_grad[:,i,j], linewidth=1)
     #plt.plot(time, annual[:,i,j], 'k', linewidth=2, label='h: annual')
     plt.show()
     sys.exit()
@@ -129,8 +116,8 @@ if PLOT:
 # regrid fields
 print 'regridding fields...'
 inc = 3
-hpfilt, xx, yy = ap.regrid2d(hpfilt.values, lon, lat, inc_by=inc)
-hpfilt_grad, xx, yy = ap.regrid2d(hpfilt_grad.values, lon, lat, inc_by=inc)
+hpfilt, xx, yy = ap.regrid2d(hpfilt, lon, lat, inc_by=inc)
+hpfilt_grad, xx, yy = ap.regrid2d(hpfilt_grad, lon, lat, inc_by=inc)
 
 # create 3d coordinates of nodes (x,y,z)
 xed = np.linspace(xed.min(), xed.max(), inc * len(lon) + 1)
@@ -0,0 +1,162 @@
+"""
+Module containing functions used by:
+
+areacell.py
+areashelf.py
+fit_and_regrid.py
+
+Grid-cell area from the 1 x 1 km mask
+-------------------------------------
+- the mask pixels are converted to lon/lat once
+- every pixel is assigned to the data cell containing it (binary search
+  on the cell edges), in a single pass over the pixels
+- the pixels of each mask class are counted per cell with `bincount`
+
+Hodrick-Prescott filter of a cube
+---------------------------------
+- the pentadiagonal system is factorized once (per NaN pattern) and
+  solved for all the time series w/that pattern at once
+
+"""
+# October 17, 2026
+
+import numpy as np
+import altimpy as ap
+from scipy.linalg import cholesky_banded, cho_solve_banded
+
+
+def refine_grid(lon, lat, inc=5):
+    """Grid with `inc` times the resolution (same end points)."""
+    lon = np.linspace(lon[0], lon[-1], lon.shape[0] * inc)
+    lat = np.linspace(lat[0], lat[-1], lat.shape[0] * inc)
+    return lon, lat
+
+
+def mask_lonlat(x_msk, y_msk):
+    """1d x/y (m) of the mask grid -> lon/lat (0/360) of every pixel (1d)."""
+    x_msk, y_msk = np.meshgrid(x_msk, y_msk)    # 1d -> 2d
+    x_msk, y_msk = x_msk.ravel(), y_msk.ravel() # 2d -> 1d
+    lon_msk, lat_msk = ap.xy2ll(x_msk, y_msk, units='m')
+    lon_msk = ap.lon_180_360(lon_msk)
+    return lon_msk, lat_msk
+
+
+def pixel_cells(lon_msk, lat_msk, lon, lat):
+    """
+    Flat index (i*nx + j) of the data cell containing every mask pixel,
+    -1 for pixels outside the grid.
+
+    The cell edges are given by `ap.cell2node(lon, lat)`. A pixel exactly
+    on the edge btw two cells goes to the upper cell.
+    """
+    lon_nodes, lat_nodes = ap.cell2node(lon, lat)
+    ny, nx = len(lat), len(lon)
+    j = np.searchsorted(lon_nodes, lon_msk, side='right') - 1
+    i = np.searchsorted(lat_nodes, lat_msk, side='right') - 1
+    j[lon_msk == lon_nodes[-1]] = nx - 1        # last edge is inclusive
+    i[lat_msk == lat_nodes[-1]] = ny - 1
+    cell = i * nx + j
+    cell[(i < 0) | (i >= ny) | (j < 0) | (j >= nx)] = -1
+    return cell
+
+
+def cell_counts(cell, msk, shape, classes=(4,)):
+    """
+    Number of pixels of each mask class in every data cell.
+
+    Returns a 3d array (nclasses,ny,nx), counts[k] is for `classes[k]`.
+    """
+    ncells = shape[0] * shape[1]
+    inside = (cell >= 0)
+    cell, msk = cell[inside], msk[inside]
+    counts = np.zeros((len(classes), ncells), 'i8')
+    for k, c in enumerate(classes):
+        counts[k] = np.bincount(cell[msk == c], minlength=ncells)
+    return counts.reshape((len(classes),) + tuple(shape))
+
+
+def cell_area(cell, msk, shape, value=4, pixel_area=1.):
+    """Area of every data cell covered by mask pixels == `value`
+    (4 = ice shelf), each mask pixel is `pixel_area` (km**2)."""
+    return cell_counts(cell, msk, shape, (value,))[0] * float(pixel_area)
+
+
+def pixel_index(cell, ncells, sel=None):
+    """
+    CSR-style index of the pixels in every data cell (for reuse).
+
+    Returns (indptr, pixels): the (flat) pixels of cell `k` are
+    pixels[indptr[k]:indptr[k+1]]. If `sel` (bool) is given, only the
+    selected pixels are indexed.
+    """
+    pixels, = np.where((cell >= 0) if sel is None else ((cell >= 0) & sel))
+    pixels = pixels[np.argsort(cell[pixels], kind='mergesort')]
+    count = np.bincount(cell[pixels], minlength=ncells)
+    indptr = np.r_[0, np.cumsum(count)]
+    return indptr, pixels
+
+
+def hp_banded(n, lamb=10, w=None):
+    """
+    Hodrick-Prescott system (W + lamb * D'D) in upper banded form (3,n),
+    D is the second difference (n-2,n) and W the diagonal of weights 
+    (default I). Same system as `statsmodels.tsa.filters.hpfilter`.
+    """
+    ab = np.zeros((3, n))
+    # every row of D (1,-2,1) adds to 3 diagonals of D'D (any n)
+    ab[2,:-2] += 1.
+    ab[2,1:-1] += 4.
+    ab[2,2:] += 1.
+    ab[1,1:-1] -= 2.
+    ab[1,2:] -= 2.
+    ab[0,2:] = 1.
+    ab *= lamb
+    ab[2] += 1. if w is None else w
+    return ab
+
+
+def hpfilter_cube(data, lamb=10):
+    """
+    Hodrick-Prescott trend of all the time series of a cube (nt,ny,nx).
+
+    The banded system is factorized once and all the complete series
+    are solved at once (multiple right-hand sides). Series with gaps are
+    grouped by NaN pattern: for each pattern the fit term only includes
+    the valid entries (one factorization per pattern), and the trend is
+    NaN at the gaps. Series with less than 2 values are NaN (but for
+    nt <= 2, where the trend is the series itself, as `hpfilter`).
+    """
+    nt = data.shape[0]
+    Y = data.reshape(nt, -1)
+    trend = np.empty(Y.shape, 'f8') * np.nan
+    valid = ~np.isnan(Y)
+    nvalid = valid.sum(axis=0)
+
+    # complete series
+    full, = np.where(nvalid == nt)
+    if len(full) > 0:
+        cb = cholesky_banded(hp_banded(nt, lamb))
+        trend[:,full] = cho_solve_banded((cb, False), Y[:,full])
+
+    # series w/gaps, grouped by NaN pattern
+    gaps, = np.where((nvalid >= 2) & (nvalid < nt))
+    if len(gaps) > 0:
+        keys = np.packbits(valid[:,gaps], axis=0).T.copy()
+        keys = keys.view([('k', 'V%d' % keys.shape[1])]).ravel()
+        _, group = np.unique(keys, return_inverse=True)
+        for g in np.unique(group):
+            cols = gaps[group == g]
+            w = valid[:,cols[0]].astype('f8')
+            cb = cholesky_banded(hp_banded(nt, lamb, w))
+            rhs = np.where(valid[:,cols], Y[:,cols], 0.)
+            trend[:,cols] = cho_solve_banded((cb, False), rhs)
+            trend[np.ix_(~valid[:,cols[0]], cols)] = np.nan
+    return trend.reshape(data.shape)
+
+
+def referenced_to_first(data):
+    """Reference every time series of a cube (nt,...) to its first value."""
+    Y = data.reshape(data.shape[0], -1)
+    first = (~np.isnan(Y)).argmax(axis=0)
+    ref = Y[first, np.arange(Y.shape[1])]
+    return data - ref.reshape(data.shape[1:])
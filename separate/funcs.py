@@ -10,15 +10,21 @@ Fernando Paolo <fpaolo@ucsd.edu>
 Aug 22, 2012
 """
 
+import os
+import sys
 import numpy as np
 import tables as tb
 import argparse as ap
 import datetime as dt
 
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..', 'misc'))
+from timeconv import *
+
  
 def sec2dt(secs, since_year=1985):
-    dt_ref = dt.datetime(since_year, 1, 1, 0, 0)
-    return np.asarray([dt_ref + dt.timedelta(seconds=s) for s in secs])
+    """Seconds since <since_year>-Jan-1 -> array of `datetime` objects."""
+    return sec2dt64(secs, since_year).astype(object)
 
 
 def lon_180_to_360(lon):
@@ -58,6 +64,7 @@ def get_seasons(years, months):
     """
     Find the 3-month block referent to the seasons.
 
+    `years` and `months` are int arrays, e.g. from `sec2ymd(secs)`.
     Return a list with: `indices`, `year` and `month` (middle-month of 
     the season, m2), of all data points belonging to each season, 
     e.g., [(ind_1, y_1, m2_1), (ind_2, y_2, m2_2), ...].
@@ -134,11 +141,14 @@ def get_windows(dtimes, windows):
     window), of all data points belonging to each given window.
     windows : set of windows defined as (t1, t2)
     result : [(inds1, dt1), (inds2, dt2),...]
+    dtimes : datetime64 array (e.g. from `sec2dt64`) or `datetime` objects.
     Note : data must be ordered in time.
     """
+    dtimes = np.asarray(dtimes, 'M8[us]')
     result = []
     for t1, t2 in windows:
-        ind, = np.where((dtimes >= t1) & (dtimes <= t2))
+        ind, = np.where((dtimes >= np.datetime64(t1, 'us')) & \
+                        (dtimes <= np.datetime64(t2, 'us')))
         if len(ind) > 0:
             tm = t1 + (t2-t1)/2
             result.append((ind, tm))
@@ -183,7 +193,7 @@ def get_sectors(lons, sectors):
 
 def print_dates(dates, N):
     """Just to test the date output."""
-    for j in dates[:N]:
+    for j in np.asarray(dates[:N], 'M8[us]').astype(object):
         print j.year, j.month, j.day, j.hour, j.minute, j.second, j.microsecond
     print ''
 
@@ -0,0 +1,126 @@
+"""
+Test the NumPy track separation (`tracksep_numpy`) against the original
+pure-Python loop, and against the C module (`_tracksep`) if available,
+on synthetic orbits: time gaps, NaNs, ties of the min latitude and
+single-point tracks.
+"""
+
+import os
+import sys
+import numpy as np
+from unittest import SkipTest
+
+sys.path.append(os.path.split(os.path.realpath(__file__))[0])
+import tracksep as ts
+
+
+def tracksep_flags_loop(lat, time, timelag=10):
+    """Reference: the original pure-Python loop."""
+    N = lat.shape[0]
+    flags = np.empty(N, np.uint8)
+    i_beg = 0
+    for i_end in xrange(N-1):
+        # if break in time or last track
+        if (time[i_end+1] - time[i_end]) > timelag or (i_end == N-2):
+            i_min = np.argmin(lat[i_beg:i_end+1])
+            i_min += i_beg
+            if (i_beg != i_min) and (i_min != i_end):   # asc + des
+                if lat[i_beg] < lat[i_min]:  
+                    flags[i_beg:i_min+1] = 0            # first segment asc
+                    flags[i_min+1:i_end+1] = 1          # second segment des
+                else:                       
+                    flags[i_beg:i_min+1] = 1
+                    flags[i_min+1:i_end+1] = 0
+            elif i_beg == i_min:                        # all asc
+                flags[i_beg:i_end+1] = 0 
+            elif i_min == i_end:                        # all des
+                flags[i_beg:i_end+1] = 1 
+            else:
+                flags[i_beg:i_end+1] = 2 
+            i_beg = i_end + 1
+    flags[-1] = flags[-2]                               # set last element
+    return flags
+
+
+def synthetic_orbits(ntracks=200, seed=1234, nans=True):
+    """lat/time of `ntracks` tracks (SH): each one goes down to a min
+    latitude and up again (or only down/up), 1 sec btw pts and time
+    gaps > timelag btw tracks. Includes NaNs, ties of the min latitude,
+    single-point tracks and gaps inside a track."""
+    np.random.seed(seed)
+    lats, times = [], []
+    t0 = 0.
+    for k in xrange(ntracks):
+        npts = np.random.choice([1, 2, 3, np.random.randint(4, 200)])
+        kind = np.random.randint(3)
+        if kind == 0:                                   # down and up
+            x = np.linspace(-1, 1, npts)
+        elif kind == 1:                                 # only down
+            x = np.linspace(-1, 0, npts)
+        else:                                           # only up
+            x = np.linspace(0, 1, npts)
+        lat = -81.5 + 30 * x**2 + np.random.uniform(-.01, .01)
+        if npts > 4 and np.random.rand() < 0.2:         # tie of the min
+            i = np.argmin(lat)
+            lat[i-1 if i == npts-1 else i+1] = lat[i]
+        if npts > 4 and np.random.rand() < 0.2:         # rounded lats
+            lat = np.round(lat, 1)
+        if nans and np.random.rand() < 0.1:             # NaN(s)
+            lat[np.random.randint(npts)] = np.nan
+        time = t0 + np.arange(npts, dtype='f8')
+        if npts > 10 and np.random.rand() < 0.1:        # gap inside track
+            time[npts//2:] += 20
+        lats.append(lat)
+        times.append(time)
+        t0 = time[-1] + np.random.choice([11., 100., 5000.])
+    return np.hstack(lats), np.hstack(times)
+
+
+def test_numpy_vs_loop():
+    for seed in range(20):
+        lat, time = synthetic_orbits(seed=seed)
+        for timelag in (10, 30):
+            ref = tracksep_flags_loop(lat, time, timelag)
+            flags = ts.tracksep_numpy(lat, time, timelag)
+            assert np.array_equal(flags, ref), (seed, timelag)
+
+
+def test_short_inputs():
+    for n in (3, 4, 5):
+        lat = np.array([-70., -75., -72., -80., -60.])[:n]
+        time = np.array([0., 1., 50., 51., 52.])[:n]
+        assert np.array_equal(ts.tracksep_numpy(lat, time),
+                              tracksep_flags_loop(lat, time))
+
+
+def test_indices():
+    lat, time = synthetic_orbits(seed=99)
+    cmodule = ts.cmodule
+    ts.cmodule = False
+    try:
+        i_asc, i_des = ts.tracksep_indices(lat, time)
+        flags = ts.tracksep_flags(lat, time)
+    finally:
+        ts.cmodule = cmodule
+    ref = tracksep_flags_loop(lat, time)
+    assert np.array_equal(flags, ref)
+    assert np.array_equal(i_asc, np.where(ref == 0)[0])
+    assert np.array_equal(i_des, np.where(ref == 1)[0])
+
+
+def test_numpy_vs_cmodule():
+    if not ts.cmodule:
+        raise SkipTest('C module (_tracksep) not built')
+    for seed in range(20):
+        lat, time = synthetic_orbits(seed=seed, nans=False)
+        flags = np.empty(lat.shape[0], np.uint8)
+        ts.mod.tracksep_flags(lat, time, flags)        # timelag of the C code
+        assert np.array_equal(ts.tracksep_numpy(lat, time, 10), flags), seed
+
+
+if __name__ == '__main__':
+    test_numpy_vs_loop()
+    test_short_inputs()
+    test_indices()
+    test_numpy_vs_cmodule()
+    print 'ok'
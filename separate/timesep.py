@@ -105,7 +105,7 @@ def main(args):
         f = tb.openFile(fname, 'r')
         data = f.getNode('/data')
         secs = data[:,timecol]
-        dtimes = sec2dt(secs, since_year=since_year)
+        dtimes = sec2dt64(secs, since_year=since_year)
 
         if len(dtimes) < 1: continue
 
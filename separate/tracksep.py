@@ -42,7 +42,6 @@ parser.add_argument('-l', dest='timelag', default=10, type=int,
 parser.add_argument('-f', dest='trkfiles', default=False, 
                     action='store_const', const=True, 
                     help='separate tracks in files, default add column with flags')
-args = parser.parse_args()
 
 
 try:
@@ -52,7 +51,46 @@ try:
 except:
     cmodule = False
     print "couln't import C module!"
-    print 'using pure python instead'
+    print 'using numpy instead'
+
+
+def tracksep_numpy(lat, time, timelag=10):
+    """
+    Flags (0=asc/1=des) for asc/des tracks using latitude and time (NumPy).
+
+    Same algorithm as the C module, with array operations: tracks are
+    broken where the time gap > `timelag`, and each track is split at
+    its min latitude (the turning point), all tracks at once.
+    """
+    N = lat.shape[0]
+    # last point of each track: break in time or last track
+    i_end = np.flatnonzero(np.diff(time) > timelag)
+    i_end = np.union1d(i_end, [N-2])
+    i_beg = np.r_[0, i_end[:-1] + 1]
+    ntrk = len(i_beg)
+    track = np.repeat(np.arange(ntrk), i_end - i_beg + 1)
+    lat_ = lat[:N-1]
+
+    # index of the (first) min latitude in each track, NaN as `argmin`
+    lat_min = np.minimum.reduceat(lat_, i_beg)[track]
+    is_min = (lat_ == lat_min) | (np.isnan(lat_) & np.isnan(lat_min))
+    cand = np.flatnonzero(is_min)
+    _, first = np.unique(track[cand], return_index=True)
+    i_min = cand[first]
+
+    # first segment [beg,min] and second segment (min,end] of each track
+    first_asc = lat[i_beg] < lat[i_min]
+    flag1 = np.where(first_asc, 0, 1)                   # asc + des
+    flag1[i_beg == i_min] = 0                           # all asc
+    flag1[(i_beg != i_min) & (i_min == i_end)] = 1      # all des
+    flag2 = np.where(i_beg == i_min, 0, 1 - flag1)
+
+    flags = np.empty(N, np.uint8)
+    flags[:N-1] = np.repeat(np.column_stack((flag1, flag2)).ravel(),
+                            np.column_stack((i_min - i_beg + 1, 
+                                             i_end - i_min)).ravel())
+    flags[-1] = flags[-2]                               # set last element
+    return flags
 
 
 def tracksep_indices(lat, time, timelag=10):
@@ -60,38 +98,14 @@ def tracksep_indices(lat, time, timelag=10):
     Finds the indices for asc/des tracks using latitude and time.
     """
     N = lat.shape[0]
-    i_asc = np.zeros(N, np.bool_)                           # data in-memory
-    i_des = np.zeros(N, np.bool_)                           # all false
-
     if cmodule:                                             # C function
+        i_asc = np.zeros(N, np.bool_)                       # data in-memory
+        i_des = np.zeros(N, np.bool_)                       # all false
         mod.tracksep_indices(lat, time, i_asc, i_des)
-    else:                                                   # Py function
-        i_beg = 0
-        for i_end in xrange(N-1):
-
-            # if break in time or last track
-            if (time[i_end+1] - time[i_end]) > timelag or (i_end == N-2):
-
-                i_min = np.argmin(lat[i_beg:i_end+1])
-                i_min += i_beg
-
-                if (i_beg != i_min) and (i_min != i_end):   # asc + des
-                    if lat[i_beg] < lat[i_min]:  
-                        i_asc[i_beg:i_min+1] = True         # first segment asc
-                        i_des[i_min+1:i_end+1] = True       # second segment des
-                    else:                       
-                        i_des[i_beg:i_min+1] = True
-                        i_asc[i_min+1:i_end+1] = True 
-                elif i_beg == i_min:                        # all asc
-                    i_asc[i_beg:i_end+1] = True 
-                elif i_min == i_end:                        # all des
-                    i_des[i_beg:i_end+1] = True 
-                else:
-                    pass                                    # all remains false
-                i_beg = i_end + 1
-
-        i_asc[-1] = i_asc[-2]                               # set last element
-        i_des[-1] = i_des[-2]
+    else:                                                   # NumPy function
+        flags = tracksep_numpy(lat, time, timelag)
+        i_asc = (flags == 0)
+        i_des = (flags == 1)
     i_asc, = np.where(i_asc == True)                        # bool -> indices 
     i_des, = np.where(i_des == True)
     return i_asc, i_des
@@ -102,36 +116,11 @@ def tracksep_flags(lat, time, timelag=10):
     Compute flags (0/1) for asc/des tracks using latitude and time.
     """
     N = lat.shape[0]
-    flags = np.empty(N, np.uint8)                           # data in-memory
-
     if cmodule:                                             # C function
+        flags = np.empty(N, np.uint8)                       # data in-memory
         mod.tracksep_flags(lat, time, flags)
-    else:                                                   # Py function
-        i_beg = 0
-        for i_end in xrange(N-1):
-
-            # if break in time or last track
-            if (time[i_end+1] - time[i_end]) > timelag or (i_end == N-2):
-
-                i_min = np.argmin(lat[i_beg:i_end+1])
-                i_min += i_beg
-
-                if (i_beg != i_min) and (i_min != i_end):   # asc + des
-                    if lat[i_beg] < lat[i_min]:  
-                        flags[i_beg:i_min+1] = 0            # first segment asc
-                        flags[i_min+1:i_end+1] = 1          # second segment des
-                    else:                       
-                        flags[i_beg:i_min+1] = 1
-                        flags[i_min+1:i_end+1] = 0
-                elif i_beg == i_min:                        # all asc
-                    flags[i_beg:i_end+1] = 0 
-                elif i_min == i_end:                        # all des
-                    flags[i_beg:i_end+1] = 1 
-                else:
-                    flags[i_beg:i_end+1] = 2 
-                i_beg = i_end + 1
-
-        flags[-1] = flags[-2]                               # set last element
+    else:                                                   # NumPy function
+        flags = tracksep_numpy(lat, time, timelag)
     return flags
 
 
@@ -228,5 +217,5 @@ def main(args):
 
 
 if __name__ == '__main__':
-    status = main(args)
+    status = main(parser.parse_args())
     sys.exit(status)
@@ -0,0 +1,246 @@
+"""
+Tests of the in-process tide prediction (`tide.Predictor`).
+
+1) Synthetic model (always run): small elevation, transport, grid and
+   load files are written in the OTPS binary format (big-endian Fortran
+   records), w/amplitudes linear in lon/lat (so the bilinear
+   interpolation is exact). Checks the record offsets of `LoadModel`,
+   and `Predictor.predict` against the tide synthesized pt by pt
+   (`ptide`) w/the exact amplitudes, plus land and out-of-grid pts.
+
+2) Regression against the OTPS `predict_tide` output for a reference
+   track: the lat/lon/time and tide files of one track, as left by the
+   OTPS run (`python tide.py -e <track>.h5`, without -r), copied to:
+
+    testdata/ref_track.llt
+    testdata/ref_track.tide
+
+   This test is skipped if the reference files, the config file or the
+   model files are not available.
+
+"""
+
+import os
+import sys
+import struct
+import shutil
+import tempfile
+import datetime as dt
+import numpy as np
+from unittest import SkipTest
+
+sys.path.append(os.path.split(os.path.realpath(__file__))[0])
+import tide
+from pytide.read_tpxo_bin import ptide, def_cid
+
+PATH = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'testdata')
+FNAME_LLT = os.path.join(PATH, 'ref_track.llt')
+FNAME_TIDE = os.path.join(PATH, 'ref_track.tide')
+SKIPROWS = 7     # header lines of the OTPS output
+REFYEAR = 1985
+ATOL = 2e-3      # OTPS output has mm precision
+
+# synthetic model: grid limits and constituents (elevation and load)
+LIMS = (-80., -70., 0., 10.)                  # latmin, latmax, lonmin, lonmax
+CONSTIT = ['m2', 's2', 'k1', 'o1']
+CONSTIT_LOAD = ['m2', 's2', 'k1']
+
+
+def write_record(f, data):
+    """Fortran unformatted (sequential, big-endian) record."""
+    f.write(struct.pack('>i', len(data)))
+    f.write(data)
+    f.write(struct.pack('>i', len(data)))
+
+
+def write_header(f, n, m, constit, lims=LIMS):
+    cid = ''.join(c.ljust(4) for c in constit)
+    write_record(f, struct.pack('>3i4f', n, m, len(constit), *lims) + cid)
+
+
+def write_elev(fname, h, constit):
+    """Elevation (or load) file: h is (nc,m,n) complex."""
+    nc, m, n = h.shape
+    with open(fname, 'wb') as f:
+        write_header(f, n, m, constit)
+        for hk in h:
+            write_record(f, hk.astype('>c8').tostring())
+
+
+def write_transp(fname, m, n, constit):
+    """Transport file (not used for z, but read by the model)."""
+    uv = np.zeros((m, n), [('u', '>c8'), ('v', '>c8')])
+    with open(fname, 'wb') as f:
+        write_header(f, n, m, constit)
+        for c in constit:
+            write_record(f, uv.tostring())
+
+
+def write_grid(fname, m, n, lims=LIMS):
+    """Bathymetry grid: header, open boundary, depth and mask records."""
+    with open(fname, 'wb') as f:
+        write_record(f, struct.pack('>2i4f', n, m, *lims))
+        write_record(f, struct.pack('>i', 0))
+        write_record(f, np.ones((m, n), '>f4').tostring())
+        write_record(f, np.ones((m, n), '>i4').tostring())
+
+
+def linear_field(lon, lat, nc, seed):
+    """Complex amplitudes a + b*lon + c*lat, (nc,) + lon.shape."""
+    np.random.seed(seed)
+    a, b, c = np.random.randn(3, nc) + 1j * np.random.randn(3, nc)
+    a *= 0.5
+    b *= 0.02
+    c *= 0.02
+    return a[:,None] + b[:,None] * np.ravel(lon) + c[:,None] * np.ravel(lat)
+
+
+def grid_field(m, n, nc, seed, lims=LIMS):
+    """Linear field at the cell centers of an m x n grid, (nc,m,n)."""
+    latmin, latmax, lonmin, lonmax = lims
+    lonh = lonmin + (np.arange(n) + 0.5) * (lonmax - lonmin) / n
+    lath = latmin + (np.arange(m) + 0.5) * (latmax - latmin) / m
+    lon, lat = np.meshgrid(lonh, lath)
+    return linear_field(lon, lat, nc, seed).reshape(nc, m, n)
+
+
+def synthetic_model(path, m=8, n=10, mload=5, nload=6):
+    """Write the model files, returns an `Input` w/the setup."""
+    h = grid_field(m, n, len(CONSTIT), seed=1)
+    h[:,5:,4:7] = 0                             # land
+    hload = grid_field(mload, nload, len(CONSTIT_LOAD), seed=2)
+    write_elev(os.path.join(path, 'h_synth'), h, CONSTIT)
+    write_transp(os.path.join(path, 'uv_synth'), m, n, CONSTIT)
+    write_grid(os.path.join(path, 'grid_synth'), m, n)
+    write_elev(os.path.join(path, 'load_synth'), hload, CONSTIT_LOAD)
+    In = tide.Input()
+    In.elev_model = os.path.join(path, 'h_synth')
+    In.transp_model = os.path.join(path, 'uv_synth')
+    In.bathy_grid = os.path.join(path, 'grid_synth')
+    In.load_model = os.path.join(path, 'load_synth')
+    In.convert_func = 'oce_convert'
+    In.variable = 'z'
+    In.constit = ','.join(CONSTIT)
+    In.correct = '1'
+    In.tide = 'geo'
+    In.fname_control = os.path.join(path, 'Model_synth')
+    with open(In.fname_control, 'w') as f:
+        f.write('\n'.join([In.elev_model, In.transp_model, In.bathy_grid, 
+                           In.convert_func, In.load_model]) + '\n')
+    return In, h, hload
+
+
+def ptide_loop(amp, constit, mjd, minor):
+    """Reference: tide synthesized pt by pt from amplitudes (nc,npts)."""
+    cid = np.fromstring(''.join(c.ljust(4) for c in constit), 'S1')
+    cid = cid.reshape(-1, 4)
+    ind = def_cid(cid)
+    minor = np.array(int(minor), 'i')
+    return np.array([ptide(amp[:,k].astype('c8'), cid, ind, mjd[k:k+1], 
+                           minor)[0] for k in xrange(len(mjd))])
+
+
+def test_load_model_records():
+    path = tempfile.mkdtemp()
+    try:
+        In, h, hload = synthetic_model(path)
+        L = tide.LoadModel(In.load_model)
+        assert L.constituents == CONSTIT_LOAD
+        assert (L.mlat, L.nlon) == hload.shape[1:]
+        assert np.allclose([L.latmin, L.latmax, L.lonmin, L.lonmax], LIMS)
+        for k in xrange(len(CONSTIT_LOAD)):
+            assert np.array_equal(L.h[k], hload[k].astype('c8'))
+    finally:
+        shutil.rmtree(path)
+
+
+def test_predictor_synthetic():
+    path = tempfile.mkdtemp()
+    try:
+        In, h, hload = synthetic_model(path)
+        P = tide.Predictor(In)
+        np.random.seed(3)
+        npts = 50
+        # pts inside full ocean cells (interpolation is exact), one on
+        # land (all corners land) and one outside the grid
+        lon = np.append(np.random.uniform(1., 5.5, npts), [5., 5.])
+        lat = np.append(np.random.uniform(-78.8, -74.5, npts), [-71.9, -60.])
+        secs = np.random.uniform(0, 20 * 365 * 86400., npts + 2)
+        tide_, load = P.predict(lon, lat, secs, refyear=REFYEAR)
+
+        days = (dt.datetime(REFYEAR, 1, 1) - dt.datetime(1858, 11, 17)).days
+        mjd = days + secs[:npts] / 86400.
+        amp = linear_field(lon[:npts], lat[:npts], len(CONSTIT), seed=1)
+        amp_load = linear_field(lon[:npts], lat[:npts], len(CONSTIT_LOAD), 
+                                seed=2)
+        tide_ref = ptide_loop(amp, CONSTIT, mjd, minor=True)
+        load_ref = ptide_loop(amp_load, CONSTIT_LOAD, mjd, minor=True)
+
+        assert np.allclose(tide_[:npts], tide_ref, rtol=0, atol=1e-5)
+        assert np.allclose(load[:npts], load_ref, rtol=0, atol=1e-5)
+        assert np.isnan(tide_[npts:]).all()
+        assert not np.isnan(load[-2]) and np.isnan(load[-1])
+        z = P.height(tide_, load)
+        assert np.allclose(z[:npts], tide_ref + load_ref, rtol=0, atol=2e-5)
+    finally:
+        shutil.rmtree(path)
+
+
+def read_llt(fname, refyear=REFYEAR):
+    """lon, lat, secs since refyear from the OTPS lat/lon/time file."""
+    d = np.loadtxt(fname, ndmin=2)
+    lat, lon, ymdhms = d[:,0], d[:,1], d[:,2:8].astype('i8')
+    t = np.array(['%04d-%02d-%02dT%02d:%02d:%02d' % tuple(r) for r in ymdhms],
+                 'M8[s]')
+    secs = (t - np.datetime64('%04d-01-01' % refyear, 's')).astype('f8')
+    return lon, lat, secs
+
+
+def read_tide(fname, skiprows=SKIPROWS, col=4):
+    """Tide (z) from the OTPS output file, NaN for land/out-of-grid pts."""
+    z = []
+    with open(fname) as f:
+        for line in f.readlines()[skiprows:]:
+            try:
+                z.append(float(line.split()[col]))
+            except (IndexError, ValueError):
+                z.append(np.nan)
+    return np.array(z)
+
+
+def test_predictor_vs_otps():
+    if not (os.path.exists(FNAME_LLT) and os.path.exists(FNAME_TIDE)):
+        raise SkipTest('reference OTPS output not found in %s' % PATH)
+    In = tide.Input()
+    try:
+        In.read_config_file()
+    except IOError:
+        raise SkipTest('configuration file not found')
+    In.gen_control_file(False)
+    if In.variable != 'z':
+        raise SkipTest('only tide elevation (z) is predicted in-process')
+    if not os.path.exists(In.elev_model) or not os.path.exists(In.load_model):
+        raise SkipTest('model files not found')
+
+    lon, lat, secs = read_llt(FNAME_LLT)
+    z_otps = read_tide(FNAME_TIDE)
+    assert len(z_otps) == len(secs)
+
+    P = tide.Predictor(In)
+    tide_, load = P.predict(lon, lat, secs, refyear=REFYEAR)
+    z = P.height(tide_, load)
+
+    assert np.array_equal(np.isnan(z), np.isnan(z_otps))
+    valid = ~np.isnan(z_otps)
+    assert valid.any()
+    assert np.allclose(z[valid], z_otps[valid], rtol=0, atol=ATOL)
+
+
+if __name__ == '__main__':
+    test_load_model_records()
+    test_predictor_synthetic()
+    try:
+        test_predictor_vs_otps()
+    except SkipTest as e:
+        print 'skipped test_predictor_vs_otps:', e
+    print 'ok'
@@ -3,12 +3,23 @@ Wrapper around the Fortran code for OTPS software.
 
 http://www.coas.oregonstate.edu/research/po/research/tide/
 
+By default the tides are predicted in-process (see `Predictor`): the
+model grids (elevation and load) are read once for all the files, and
+no temporary setup/lat-lon-time/output files are written. With `-e` the
+OTPS `predict_tide` executable is run instead (one run per file), and
+with `-x` both are run and compared (OTPS output as reference). Only the
+tide elevation (z) is predicted in-process, for other variables (u/v,
+transports) the OTPS executable is always used.
+
+See `test_tide.py` for the regression test against OTPS.
+
 """
 # Fernando Paolo <fpaolo@ucsd.edu>
 # May 29, 2012
 
 import os
 import sys
+import struct
 import argparse as ap
 import configobj as co
 import numpy as np
@@ -17,6 +28,15 @@ import datetime as dt
 import matplotlib.dates as mpl
 from subprocess import call
 
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..'))
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..', '..', 'misc'))
+import pytide
+from timeconv import sec2ymdhms
+
+MINFRAC = 1e-6    # interpolate w/any valid corner of the cell (as OTPS)
+
 # parse command line arguments
 parser = ap.ArgumentParser()
 parser.add_argument('files', nargs='*', help='HDF5/ASCII file[s] to read')
@@ -32,7 +52,10 @@ parser.add_argument('-r', dest='remove', default=False, action='store_const',
     const=True, help='remove temp files after processing, default no')  
 parser.add_argument('-i', dest='control', default=False, action='store_const', 
     const=True, help='generate the control file: Model_*, default no')  
-args = parser.parse_args()
+parser.add_argument('-e', dest='otps', default=False, action='store_const',
+    const=True, help='run the OTPS executable (predict_tide), default no')
+parser.add_argument('-x', dest='check', default=False, action='store_const',
+    const=True, help='run in-process and OTPS, and compare, default no')
 
 
 class Input(object):
@@ -80,12 +103,14 @@ class Input(object):
             print 'control file generated:', self.fname_control
             sys.exit()
 
-    def gen_setup_file(self, fname_in):
+    def set_fnames(self, fname_in):
         filename = os.path.splitext(fname_in)[0] 
         self.fname_in = fname_in
         self.fname_setup = filename + '.inp'
         self.fname_llt = filename + '.llt'
         self.fname_tide = filename + '.tide'
+
+    def gen_setup_file(self):
         fid = open(self.fname_setup, 'w')
         fid.write(self.fname_control + '\n')
         fid.write(self.fname_llt + '\n')
@@ -97,23 +122,26 @@ class Input(object):
         fid.write(self.fname_tide + '\n')
         fid.close()
 
-    def gen_llt_file(self, refyear=1985):
+    def get_llt(self):
+        """lon, lat, time (secs) of the pts to predict, or None."""
         self.fin = tb.openFile(self.fname_in)
         ##########################################
         data = self.fin.getNode('/data')
         if len(data.shape) != 2: 
             print 'no data in file:', self.fname_in
-            return 1
+            return None
         lon, lat, secs1, secs2 = data[:,0], data[:,1], data[:,4], data[:,5]
-        t1 = self.sec2dt(secs1, since_year=refyear)
-        t2 = self.sec2dt(secs2, since_year=refyear)
         lat = np.hstack((lat, lat))
         lon = np.hstack((lon, lon))
-        time = np.vstack((t1, t2))
+        secs = np.hstack((secs1, secs2))
         ##########################################
+        return lon, lat, secs
+
+    def gen_llt_file(self, llt, refyear=1985):
+        lon, lat, secs = llt
+        time = self.sec2dt(secs, since_year=refyear)
         X = np.column_stack((lat, lon, time))
         np.savetxt(self.fname_llt, X, fmt='%f %f %d %d %d %d %d %d')
-        return 0
 
     def remove_temps(self):
         try:
@@ -132,11 +160,7 @@ class Input(object):
         print 'tide file:     ', self.fname_tide
 
     def sec2dt(self, secs, since_year=1985):
-        dt_ref = dt.datetime(since_year, 1, 1, 0, 0)
-        #return np.asarray([dt_ref + dt.timedelta(seconds=s) for s in secs])
-        dtimes = np.asarray([dt_ref + dt.timedelta(seconds=s) for s in secs])
-        return np.array([(d.year, d.month, d.day, d.hour,
-            d.minute, d.second) for d in dtimes])
+        return sec2ymdhms(secs, since_year)
 
     # DEPRECATED
     def secs_to_datetime(self, secs, since_year=1985):
@@ -164,13 +188,17 @@ class Output(object):
         self.skiprows = skiprows
         self.usecols = usecols
 
+    def set_tides(self, z, split=1):
+        if split > 1:
+            # for xover files: z1 and z2
+            z = np.column_stack(np.split(z, split)) 
+        self.z = z
+
     def get_tides(self, split=1):
         try:
-            self.z = np.loadtxt(self.fname_tide, 
+            z = np.loadtxt(self.fname_tide, 
                 skiprows=self.skiprows, usecols=self.usecols)
-            if split > 1:
-                # for xover files: z1 and z2
-                self.z = np.column_stack(np.split(self.z, split)) 
+            self.set_tides(z, split)
         except:
             self.z = None
             print 'problem loading file:', self.fname_tide
@@ -190,6 +218,71 @@ class Output(object):
         fout.close()
 
 
+class LoadModel(pytide.TPXO_model):
+    """
+    OTPS load-tide model (single file, same format as the elevation file
+    of a model, on a lon/lat grid).
+    """
+    def __init__(self, fname, minfrac=None):
+        self._set_minfrac(minfrac)
+        self.grid_type = 0
+        self.h_fname = fname
+        h_file = open(fname, 'rb')
+        nbrec, n, m, nc = struct.unpack('>4I', h_file.read(16))
+        self.nlon = n
+        self.mlat = m
+        self.nc = nc
+        latmin, latmax, lonmin, lonmax = struct.unpack('>4f', h_file.read(16))
+        self.make_grids(lonmin, lonmax, latmin, latmax)
+        c_idstring = h_file.read(nc*4)
+        h_file.close()
+        self._set_cid(c_idstring)
+        self.h = []
+        for i in range(nc):
+            ofs = nbrec + 12 + i * (8 + 8 * m * n)
+            self.h.append(np.memmap(fname, offset=ofs, mode='r',
+                          dtype='>c8', shape=(m, n)))
+
+
+class Predictor(object):
+    """
+    In-process tide prediction, equivalent to OTPS `predict_tide` (z).
+
+    Reads the elevation and load models once (to be used for all the
+    files), and applies the constituents, inference of minor constituents
+    and ocean/geocentric tide of the setup (config file). Uses the same
+    bilinear interpolation as OTPS (through `pytide`); pts on land or
+    outside the model grids are NaN.
+    """
+    def __init__(self, In, minfrac=MINFRAC):
+        if In.variable != 'z':
+            raise ValueError('only tide elevation (z) is predicted in-process')
+        mod_path, mod_name = os.path.split(In.fname_control)
+        self.model = pytide.model(mod_name.replace('Model_', '', 1),
+                                  mod_path, minfrac=minfrac)
+        self.load = LoadModel(In.load_model, minfrac=minfrac)
+        clist = [c.strip().lower() for c in In.constit.split(',')]
+        clist = [c for c in clist if c]
+        self.clist = clist or None
+        self.clist_load = [c for c in clist if c in self.load.constituents] \
+                          or None
+        self.minor = bool(int(In.correct))
+        self.geo = (In.tide == 'geo')
+
+    def predict(self, lon, lat, secs, refyear=1985):
+        """Ocean and load tides (m) at lon/lat/time (secs since refyear)."""
+        dday = np.asarray(secs, 'f8') / 86400.
+        tide = self.model.height(refyear, dday, lon, lat,
+                                 clist=self.clist, minor=self.minor).h
+        load = self.load.height(refyear, dday, lon, lat,
+                                clist=self.clist_load, minor=self.minor).h
+        return np.ma.filled(tide, np.nan), np.ma.filled(load, np.nan)
+
+    def height(self, tide, load):
+        """Tide elevation as output by OTPS: ocean or geocentric tide."""
+        return tide + load if self.geo else tide
+
+
 def close_files():
     for fid in tb.file._open_files.values():
         fid.close() 
@@ -205,6 +298,8 @@ def main(args):
     remove = args.remove
     control = args.control
     refyear = args.refyear
+    otps = args.otps
+    check = args.check
 
     print 'files to process:', len(files_in)
     print 'time is seconds since:', refyear
@@ -213,23 +308,41 @@ def main(args):
     In.read_config_file()
     In.gen_control_file(control)
 
+    if not otps and In.variable != 'z':
+        print 'variable %s not predicted in-process, using OTPS' % In.variable
+        otps = True
+
+    if not otps:
+        P = Predictor(In)    # read the models once
+
     nfiles = 0
     ntides = 0
     for ifile in files_in:
 
-        In.gen_setup_file(ifile)
-        stat = In.gen_llt_file(refyear)
-        if stat == 1: continue
-        In.print_files()
+        In.set_fnames(ifile)
+        llt = In.get_llt()
+        if llt is None: continue
+        Out = Output(In.fname_in, In.fname_tide, suffix, skiprows, usecols) 
 
         #-------------------------------------------------------------
 
-        os.system('%s < %s' % (In.predict_tide, In.fname_setup))
+        if otps or check:
+            In.gen_setup_file()
+            In.gen_llt_file(llt, refyear)
+            In.print_files()
+            os.system('%s < %s' % (In.predict_tide, In.fname_setup))
+            Out.get_tides(split=2)
+
+        if not otps:
+            z_otps = Out.z if check else None
+            tide, load = P.predict(*llt, refyear=refyear)
+            Out.set_tides(P.height(tide, load), split=2)
+            if z_otps is not None:
+                print 'max |in-process - OTPS| (m):', \
+                      np.nanmax(np.abs(Out.z - z_otps))
 
         #-------------------------------------------------------------
 
-        Out = Output(In.fname_in, In.fname_tide, suffix, skiprows, usecols) 
-        Out.get_tides(split=2)
         Out.save_data(In.fin.root.data, Out.z)
 
         if Out.z is not None: 
@@ -251,4 +364,4 @@ def main(args):
         pass
 
 if __name__ == '__main__':
-    main(args)
+    main(parser.parse_args())
@@ -133,7 +133,7 @@ class TPXO_model_base(object):
         frac = w.sum(axis=0)
         frac[badmask] = 0
         valid = frac > 0     # Only need to prevent division by zero here.
-        w[:, valid] /= frac[:,valid]  # w[:, valid].sum(axis=0)
+        w[:, valid] /= frac[valid]  # w[:, valid].sum(axis=0)
         w[:, ~valid] = 0
         return w, frac, i0, j0, i1, j1
 
@@ -152,14 +152,64 @@ class TPXO_model_base(object):
         ilist = [self.constituents.index(c) for c in clist]
         return ilist
 
-    def _ptide(self, constit, t, clist=None):
+    def _minor_flag(self, clist, minor):
+        if minor is not None:
+            return _minor_true if minor else _minor_false
         if clist is None:
-            return ptide(constit, self.cid, self._ind, t, _minor_true)
-        if len(clist) == 0:
-            return ptide(constit, self.cid, self._ind, t, _minor_false)
+            return _minor_true
+        return _minor_false
+
+    def _ptide(self, constit, t, clist=None, minor=None):
+        _minor = self._minor_flag(clist, minor)
+        if clist is None or len(clist) == 0:
+            return ptide(constit, self.cid, self._ind, t, _minor)
         ilist = self._ilist_from_clist(clist)
         return ptide(constit[ilist], self.cid[ilist],
-                        self._ind[ilist], t, _minor_false)
+                        self._ind[ilist], t, _minor)
+
+    def _ptide_basis(self, t, cid, ind, minor):
+        """
+        Tide at times *t* for unit amplitudes of each constituent.
+
+        The prediction is linear in the constituent amplitudes (the
+        nodal corrections, astronomical arguments and the inferred
+        minor constituents depend only on time), so for complex
+        amplitudes c, ptide(c, t) == dot(bre, c.real) + dot(bim, c.imag).
+
+        Returns *bre*, *bim*: (len(t), nc) arrays.
+        """
+        nc = len(cid)
+        bre = np.empty((len(t), nc), dtype=np.float_)
+        bim = np.empty((len(t), nc), dtype=np.float_)
+        for k in range(nc):
+            unit = np.zeros(nc, dtype=np.complex64)
+            unit[k] = 1
+            bre[:,k] = ptide(unit, cid, ind, t, minor)
+            unit[k] = 1j
+            bim[:,k] = ptide(unit, cid, ind, t, minor)
+        return bre, bim
+
+    def _synthesize(self, t, constits, cid, ind, minor, chunk=100000):
+        """
+        Tide at (t[i], constit[i]) for every point i, for each of the
+        *constits* ((N, nc) complex amplitudes at the points).
+
+        ptide is called once per constituent for all the distinct
+        times (in chunks of *chunk* times), instead of once per
+        point; the heights are then a row-wise matrix product.
+        """
+        tu, it = np.unique(t, return_inverse=True)
+        order = np.argsort(it, kind='mergesort')
+        bounds = np.searchsorted(it[order], np.arange(0, len(tu)+chunk, chunk))
+        out = [np.zeros(t.shape, dtype=np.float_) for c in constits]
+        for n, i1 in enumerate(range(0, len(tu), chunk)):
+            bre, bim = self._ptide_basis(tu[i1:i1+chunk], cid, ind, minor)
+            ii = order[bounds[n]:bounds[n+1]]
+            k = it[ii] - i1
+            for c, o in zip(constits, out):
+                o[ii] = ((bre[k] * c[ii].real).sum(axis=1)
+                          + (bim[k] * c[ii].imag).sum(axis=1))
+        return out
 
     def _badx(self, x, y):
         badx = (y > (self.latmax - 0.5 * self.dy)) | (y < self.latmin)
@@ -231,33 +281,29 @@ class TPXO_model_base(object):
         return t, x, y, badx
 
 
-    def _h_from_txy(self, t, x, y, badx, clist=None):
+    def _h_from_txy(self, t, x, y, badx, clist=None, minor=None):
         constit, frac = self.interp_constit(x, y, 'h')
         cid = self.cid
         ind = self._ind
-        _minor = _minor_true
+        _minor = self._minor_flag(clist, minor)
         if clist is not None:
-            _minor = _minor_false
             if len(clist) > 0:
                 ilist = self._ilist_from_clist(clist)
                 constit = constit[:,ilist]
                 cid = self.cid[ilist]
                 ind = self._ind[ilist]
-        h = np.zeros(t.shape, dtype=np.float_)
-        for i in range(t.shape[0]):
-            isl = slice(i, i+1)
-            h[i] = ptide(constit[i], cid, ind, t[isl], _minor)
+        h, = self._synthesize(t, [constit], cid, ind, _minor)
         bad = frac <= self.minfrac
         badmask = bad | badx
         return np.ma.array(h, mask=badmask, copy=False), frac
 
-    def _h_from_xy_times(self, t, x, y, badx, clist=None):
+    def _h_from_xy_times(self, t, x, y, badx, clist=None, minor=None):
         if badx:
             ret = np.ma.zeros(t.shape, dtype=np.float)
             ret.mask = True
             return ret
         constit, frac = self.interp_constit(x, y, 'h')
-        h = self._ptide(constit[0], t, clist=clist)
+        h = self._ptide(constit[0], t, clist=clist, minor=minor)
         badmask = (frac[0] <= self.minfrac) or self._badx(x, y)[0]
         return np.ma.array(h, mask=badmask, copy=False), frac
 
@@ -276,12 +322,7 @@ class TPXO_model_base(object):
                 cid = self.cid[ilist]
                 ind = self._ind[ilist]
         dep, dfrac = self.interp_depth(x, y)
-        u = np.zeros(t.shape, dtype=np.float_)
-        v = np.zeros(t.shape, dtype=np.float_)
-        for i in range(t.shape[0]):
-            isl = slice(i, i+1)
-            u[i] = ptide(uconstit[i], cid, ind, t[isl], _minor)
-            v[i] = ptide(vconstit[i], cid, ind, t[isl], _minor)
+        u, v = self._synthesize(t, [uconstit, vconstit], cid, ind, _minor)
         frac = np.minimum(ufrac, vfrac)
         frac = np.minimum(frac, dfrac)
         valid = frac > 0
@@ -369,6 +410,7 @@ class TPXO_model_base(object):
 
         kwarg:
             clist
+            minor
 
         In the first signature, txy_object is an object with
         attributes "yearbase", "dday", "lon", and "lat".
@@ -383,6 +425,9 @@ class TPXO_model_base(object):
         This method may be expanded later to handle a time series
         at an array of points.
 
+        *minor* (True/False) turns on/off the inference of minor
+        constituents; by default it is done only if no *clist* is given.
+
         Returns: Bunch (dictionary and attribute access) with
         h, fraction.
         fraction is 1 if the point is inside a full cell (with data
@@ -393,12 +438,14 @@ class TPXO_model_base(object):
         """
 
         clist = kw.get("clist", None)
+        minor = kw.get("minor", None)
         t, x, y, badx = self._process_args(args)
         if len(x) == 1 and len(t) > 1:
             h, frac = self._h_from_xy_times(t, x, y, badx,
-                                                            clist=clist)
+                                            clist=clist, minor=minor)
         else:
-            h, frac = self._h_from_txy(t, x, y, badx, clist=clist)
+            h, frac = self._h_from_txy(t, x, y, badx, clist=clist,
+                                       minor=minor)
         return Bunch(h=h, fraction=frac)
 
 
@@ -23,6 +23,7 @@ from funcs import *
 PLOT = True
 SAVE_TO_FILE = False
 NODE_NAME = ''
+TILE = (16, 16)    # spatial tile (ny,nx) processed at once = chunkshape
 
 #-------------------------------------------------------------------------
 
@@ -53,115 +54,109 @@ def main(args):
 
     print 'processing time series ...'
 
-    # iterate over every grid cell (all times): j,i = x,y
+    times, i_ref, i_t = ts_index(d['time1'], d['time2'])
+    N = len(times)
+    dtimes = ap.num2date(times)
+    chunk = (N, min(TILE[0], ny), min(TILE[1], nx))
+
+    if SAVE_TO_FILE:
+        # open or create output file
+        dout, fout = create_output_containers(fname_out, 
+            d['dh_mean'], (N,ny,nx), NODE_NAME, chunk) # <-- chunkshape
+
+        # save info (sat/time info for TS)
+        satname2 = np.empty(N, 'S20')
+        time1 = np.empty(N, 'i4')
+        satname2.fill(d['satname'])
+        time2 = [int(t.strftime('%Y%m%d')) for t in dtimes]
+        time1.fill(time2[0])
+        dout['table'].append(np.rec.array(
+            [satname2, time1, time2], dtype=dout['table'].dtype))
+        dout['table'].flush()
+        dout['lon'][:] = d['lon'][:]
+        dout['lat'][:] = d['lat'][:]
+        dout['x_edges'][:] = d['x_edges'][:]
+        dout['y_edges'][:] = d['y_edges'][:]
+
+    # iterate over spatial tiles (all cells/times at once): i,j = y,x
     #-----------------------------------------------------------------
 
-    isfirst = True
-
-    for i in xrange(ny):
-        for j in xrange(nx):
-            #j, i = 35, 13 # ex: full grid cell (fris)
-            #j, i = 25, 13 # ex: first ts missing (fris)
-
-            # create 1 DF for every grid cell 
-            dh_mean_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dh_mean'][:,i,j], months=3) 
-            dh_error_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dh_error'][:,i,j], months=3)
-            dh_error2_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dh_error2'][:,i,j], months=3)
-            dg_mean_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dg_mean'][:,i,j], months=3) 
-            dg_error_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dg_error'][:,i,j], months=3)
-            dg_error2_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['dg_error2'][:,i,j], months=3)
-            n_ad_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['n_ad'][:,i,j], months=3) 
-            n_da_ij = create_df_with_ts(d['time1'], d['time2'], 
-                d['n_da'][:,i,j], months=3) 
-            n_ij = n_ad_ij.combineAdd(n_da_ij)
+    for i in xrange(0, ny, TILE[0]):
+        for j in xrange(0, nx, TILE[1]):
+            tile = np.s_[:, i:i+TILE[0], j:j+TILE[1]]
+            ty, tx = d['dh_mean'][tile].shape[1:]
+
+            # 1 cube (n_ref,n_t,ncells) per variable
+            cube = lambda var: create_cube_with_ts(d[var][tile], 
+                                                   i_ref, i_t, N)
+            dh_mean_ij = cube('dh_mean')
+            dh_error_ij = cube('dh_error')
+            dh_error2_ij = cube('dh_error2')
+            dg_mean_ij = cube('dg_mean')
+            dg_error_ij = cube('dg_error')
+            dg_error2_ij = cube('dg_error2')
+            n_ad_ij = cube('n_ad')
+            n_da_ij = cube('n_da')
+            n_ij = combine_add(n_ad_ij, n_da_ij)
 
             # reference the TS dynamicaly
 
-            reference_ts(dh_mean_ij, by='offset', dynamic_ref=True)
-            reference_ts(dg_mean_ij, by='offset', dynamic_ref=True)
-            propagate_error(dh_error_ij, by='offset', dynamic_ref=True)
-            propagate_error(dh_error2_ij, by='offset', dynamic_ref=True)
-            propagate_error(dg_error_ij, by='offset', dynamic_ref=True)
-            propagate_error(dg_error2_ij, by='offset', dynamic_ref=True)
-            propagate_num_obs(n_ij, by='offset', dynamic_ref=True)
+            reference_cube(dh_mean_ij, dynamic_ref=True)
+            reference_cube(dg_mean_ij, dynamic_ref=True)
+            propagate_error_cube(dh_error_ij, dynamic_ref=True)
+            propagate_error_cube(dh_error2_ij, dynamic_ref=True)
+            propagate_error_cube(dg_error_ij, dynamic_ref=True)
+            propagate_error_cube(dg_error2_ij, dynamic_ref=True)
+            propagate_num_obs_cube(n_ij, dynamic_ref=True)
 
             # compute average TS
 
-            dh_mean_i = weighted_average(dh_mean_ij, n_ij)
-            dg_mean_i = weighted_average(dg_mean_ij, n_ij)
-            dh_error_i = weighted_average_error(dh_error_ij, n_ij)   # if independent errors
-            dh_error2_i = weighted_average_error(dh_error2_ij, n_ij)
-            dg_error_i = weighted_average_error(dg_error_ij, n_ij)
-            dg_error2_i = weighted_average_error(dg_error2_ij, n_ij)
-            #dh_error_i = weighted_average(dh_error_ij, n_ij)        # if correlated errors
-            #dh_error2_i = weighted_average(dh_error2_ij, n_ij)
-            #dg_error_i = weighted_average(dg_error_ij, n_ij)
-            #dg_error2_i = weighted_average(dg_error2_ij, n_ij)
-            n_ad_i = average_obs(n_ad_ij)
-            n_da_i = average_obs(n_da_ij)
-
-            dh_mean_i = reference_to_first(dh_mean_i)
-            dg_mean_i = reference_to_first(dg_mean_i)
-
-            # plot figures
-
-            if PLOT and (dh_mean_ij.count().sum() > 100):
-                plot_df(dh_mean_ij, matrix=False, legend=False, rot=45)
-                plot_tseries(dh_mean_i, dh_error2_i, dg_mean_i, dg_error2_i)
-
-            # REVISED TILL HERE ON NOV 8, 2012 -> OK!
-
-            # revise from here !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-            # get sat/time info for TS (only once)
-
-            if isfirst:
-                satname2 = np.empty(len(dh_mean_i), 'S20')
-                time1 = np.empty(len(dh_mean_i), 'i4')
-                satname2.fill(d['satname'])
-                time2 = [int(t.strftime('%Y%m%d')) for t in dh_mean_i.index]
-                time1.fill(time2[0])
-
-            # save one TS per grid cell at a time
+            dh_mean_i = weighted_average_cube(dh_mean_ij, n_ij)
+            dg_mean_i = weighted_average_cube(dg_mean_ij, n_ij)
+            dh_error_i = weighted_average_error_cube(dh_error_ij, n_ij)   # if independent errors
+            dh_error2_i = weighted_average_error_cube(dh_error2_ij, n_ij)
+            dg_error_i = weighted_average_error_cube(dg_error_ij, n_ij)
+            dg_error2_i = weighted_average_error_cube(dg_error2_ij, n_ij)
+            #dh_error_i = weighted_average_cube(dh_error_ij, n_ij)        # if correlated errors
+            #dh_error2_i = weighted_average_cube(dh_error2_ij, n_ij)
+            #dg_error_i = weighted_average_cube(dg_error_ij, n_ij)
+            #dg_error2_i = weighted_average_cube(dg_error2_ij, n_ij)
+            n_ad_i = average_obs_cube(n_ad_ij)
+            n_da_i = average_obs_cube(n_da_ij)
+
+            dh_mean_i = reference_to_first_cube(dh_mean_i)
+            dg_mean_i = reference_to_first_cube(dg_mean_i)
+
+            # plot figures (cells with enough data)
+
+            if PLOT:
+                count = (~np.isnan(dh_mean_ij)).sum(axis=0).sum(axis=0)
+                for c in np.where(count > 100)[0]:
+                    df = pd.DataFrame(dh_mean_ij[:,:,c].T, 
+                                      index=dtimes, columns=dtimes)
+                    ts = lambda x: pd.Series(x[:,c], index=dtimes)
+                    plot_df(df, matrix=False, legend=False, rot=45)
+                    plot_tseries(ts(dh_mean_i), ts(dh_error2_i), 
+                                 ts(dg_mean_i), ts(dg_error2_i))
+
+            # save one tile of TS at a time
             #---------------------------------------------------------
 
             if not SAVE_TO_FILE: continue
 
-            if isfirst:
-                # open or create output file
-                isfirst = False
-                N = len(dh_mean_i)
-                dout, fout = create_output_containers(fname_out, 
-                    dh_mean_i, (N,ny,nx), NODE_NAME, (N,1,1)) # <-- chunkshape
-
-                # save info
-                dout['table'].append(np.rec.array(
-                    [satname2, time1, time2], dtype=dout['table'].dtype))
-                dout['table'].flush()
-                dout['lon'][:] = d['lon'][:]
-                dout['lat'][:] = d['lat'][:]
-                dout['x_edges'][:] = d['x_edges'][:]
-                dout['y_edges'][:] = d['y_edges'][:]
-
-            # save time series
-            dout['dh_mean'][:,i,j] = dh_mean_i.values
-            dout['dh_error'][:,i,j] = dh_error_i.values
-            dout['dh_error2'][:,i,j] = dh_error2_i.values
-            dout['dg_mean'][:,i,j] = dg_mean_i.values
-            dout['dg_error'][:,i,j] = dg_error_i.values
-            dout['dg_error2'][:,i,j] = dg_error2_i.values
-            dout['n_ad'][:,i,j] = n_ad_i.values
-            dout['n_da'][:,i,j] = n_da_i.values
-
-    fout.flush()
-    fout.close()
+            shape = (N, ty, tx)
+            dout['dh_mean'][tile] = dh_mean_i.reshape(shape)
+            dout['dh_error'][tile] = dh_error_i.reshape(shape)
+            dout['dh_error2'][tile] = dh_error2_i.reshape(shape)
+            dout['dg_mean'][tile] = dg_mean_i.reshape(shape)
+            dout['dg_error'][tile] = dg_error_i.reshape(shape)
+            dout['dg_error2'][tile] = dg_error2_i.reshape(shape)
+            dout['n_ad'][tile] = n_ad_i.reshape(shape)
+            dout['n_da'][tile] = n_da_i.reshape(shape)
+
+    if SAVE_TO_FILE:
+        fout.flush()
+        fout.close()
     fin.close()
 
     print 'out file -->', fname_out
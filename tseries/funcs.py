@@ -19,6 +19,10 @@ import matplotlib.pyplot as plt
 
 import altimpy as ap
 
+sys.path.append(os.path.join(os.path.split(os.path.realpath(__file__))[0],
+                             '..', 'misc'))
+from chunkwriter import ChunkWriter, chunk_writers
+
 pd.options.mode.chained_assignment = None  # default='warn'
 
 
@@ -64,7 +68,12 @@ class GetData(object):
 
 
 class OutputContainers(object):
-    def __init__(self, fname_out, shape, chunk):
+    """
+    If `max_mb` is given, the 3d arrays are wrapped w/`ChunkWriter` (per
+    grid-cell writes are buffered per chunk), all of them sharing `max_mb`
+    MB, call `close` at the end.
+    """
+    def __init__(self, fname_out, shape, chunk, max_mb=None):
         fout = tb.open_file(fname_out, 'w')
         nt, ny, nx = shape
         chunkshape = chunk                                # chunk to be saved
@@ -109,6 +118,23 @@ class OutputContainers(object):
         self.dh_mean_short_const = fout.create_carray('/', 
                 'dh_mean_short_const', atom, (nt,ny,nx), 
                 title, filters, chunkshape=chunkshape)
+        self.writers = []
+        if max_mb is not None:
+            names = [name for name, arr in sorted(vars(self).items())
+                     if isinstance(arr, tb.Leaf) and arr.shape == (nt,ny,nx)]
+            arrays = [getattr(self, name) for name in names]
+            self.writers = chunk_writers(arrays, max_mb)
+            for name, w in zip(names, self.writers):
+                setattr(self, name, w)
+
+    def flush(self):
+        for w in self.writers:
+            w.flush()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
 
 
 # DEPRECATED (use GetData)
@@ -585,6 +611,152 @@ def reference_to_first(ts):
     return ts 
 
 
+# Array versions of the above (all grid cells of a tile at once)
+#-------------------------------------------------------------------------
+# The multi-reference time series of `ncells` grid cells are held as
+# a cube (n_ref, n_t, ncells): cube[r,t,c] is the value at time `t`
+# referenced to time `r` (i.e., the DataFrame of `create_df_with_ts`
+# transposed, one per cell). Only referencing by 'offset' is implemented.
+
+def ts_index(time1, time2):
+    """
+    Full (sorted) time range and the position of every time1/time2 in it.
+    time1, time2 : integer representation of time: YYYYMMDD
+    """
+    times = np.unique(np.append(time1, time2))
+    return times, np.searchsorted(times, time1), np.searchsorted(times, time2)
+
+
+def create_cube_with_ts(ts, i_ref, i_t, nt):
+    """
+    Create a cube (nt,nt,ncells) with all the different time1-TS.
+    ts : time series for all-grid-cells/1-sat/all-times (N,ncells)
+    i_ref, i_t : position of time1/time2 in the full time range
+    Cells with no data are all NaN (no zero diagonal).
+    """
+    ts = ts.reshape(ts.shape[0], -1)
+    ncells = ts.shape[1]
+    cube = np.empty((nt, nt, ncells), 'f8') * np.nan
+    cube[i_ref, i_t] = ts
+    k = np.arange(nt)
+    diag = cube[k,k]
+    diag[:,~np.isnan(ts).all(axis=0)] = 0.
+    cube[k,k] = diag                         # diagonal
+    return cube
+
+
+def combine_add(cube1, cube2):
+    """Add two cubes, NaN only where both are NaN (as `combineAdd`)."""
+    out = np.where(np.isnan(cube1), 0, cube1) + np.where(np.isnan(cube2), 0, cube2)
+    out[np.isnan(cube1) & np.isnan(cube2)] = np.nan
+    return out
+
+
+def _nansum(x, axis=0):
+    """Sum of non-null values, NaN if all null."""
+    s = np.where(np.isnan(x), 0, x).sum(axis=axis)
+    s[np.isnan(x).all(axis=axis)] = np.nan
+    return s
+
+
+def _coincident_mean(cube, ts_ref):
+    """Mean of every ts (and ts_ref) over the entries where both are non-null."""
+    coinc = ~np.isnan(cube) & ~np.isnan(ts_ref)
+    n = coinc.sum(axis=1).astype('f8')
+    n[n == 0] = np.nan
+    mean = np.where(coinc, cube, 0).sum(axis=1) / n
+    mean_ref = np.where(coinc, ts_ref, 0).sum(axis=1) / n
+    return mean, mean_ref
+
+
+def ref_column(cube, dynamic_ref=True):
+    """
+    Index of the reference ts of every cell (ncells,):
+    - the one with the maximum non-null entries (dynamic referencing)
+    - the one with the first reference time
+    """
+    if dynamic_ref:
+        return (~np.isnan(cube)).sum(axis=1).argmax(axis=0)
+    else:
+        return np.zeros(cube.shape[2], 'i4')
+
+
+def _ts_ref(cube, col_ref):
+    """The reference ts of every cell, as (1,nt,ncells)."""
+    return cube[col_ref, :, np.arange(cube.shape[2])].T[np.newaxis]
+
+
+def reference_cube(cube, dynamic_ref=True):
+    """
+    Reference all time series to the selected reference (in place), by
+    adding the mean 'offset' to the reference ts (see `reference_ts`).
+    """
+    ts_ref = _ts_ref(cube, ref_column(cube, dynamic_ref))
+    offset, _ = _coincident_mean(ts_ref - cube, ts_ref)
+    cube += offset[:,np.newaxis,:]
+
+
+def propagate_error_cube(cube, dynamic_ref=True):
+    """
+    Propagate the error of the ts_ref to other ts due to referencing 
+    by `offset` (in place, see `propagate_error`).
+    """
+    col_ref = ref_column(cube, dynamic_ref)
+    _, e_mean = _coincident_mean(cube, _ts_ref(cube, col_ref))
+    notref = (np.arange(cube.shape[0])[:,np.newaxis] != col_ref)
+    e_mean = e_mean[:,np.newaxis,:]
+    cube[:] = np.where(notref[:,np.newaxis,:], 
+                       np.sqrt(e_mean**2 + cube**2), cube)
+
+
+def propagate_num_obs_cube(cube, dynamic_ref=True):
+    """
+    Propagate the num of obs of the ts_ref due to referencing by `offset`
+    (in place, see `propagate_num_obs`).
+    """
+    col_ref = ref_column(cube, dynamic_ref)
+    nobs_mean_ts, nobs_mean_ref = _coincident_mean(cube, _ts_ref(cube, col_ref))
+    nobs_mean = np.round((nobs_mean_ref + nobs_mean_ts) / 2.)
+    notref = (np.arange(cube.shape[0])[:,np.newaxis] != col_ref)
+    zero = (cube == 0) & notref[:,np.newaxis,:]
+    cube[:] = np.where(zero, nobs_mean[:,np.newaxis,:], cube)
+
+
+def _weights(nobs):
+    """One weight per element (sum over references == 1)."""
+    nobs = np.where(nobs == 0, 1, nobs)    # to ensure dh=0 (n_obs=0) enters
+    return nobs / _nansum(nobs, axis=0)
+
+
+def weighted_average_cube(cube, nobs):
+    """
+    Weighted average time series of every cell (nt,ncells), weighted by
+    the number of observations (see `weighted_average`).
+    """
+    return _nansum(_weights(nobs) * cube, axis=0)
+
+
+def weighted_average_error_cube(cube, nobs):
+    """
+    Weighted average standard error of every cell (nt,ncells), weighted 
+    by the number of observations (see `weighted_average_error`).
+    """
+    return np.sqrt(_nansum(_weights(nobs)**2 * cube**2, axis=0))
+
+
+def average_obs_cube(nobs):
+    """Average number of obs of every cell (nt,ncells)."""
+    n = (~np.isnan(nobs)).sum(axis=0).astype('f8')
+    n[n == 0] = np.nan
+    return np.where(np.isnan(nobs), 0, nobs).sum(axis=0) / n
+
+
+def reference_to_first_cube(ts):
+    """Reference the time series of every cell (nt,ncells) to the first value."""
+    first = (~np.isnan(ts)).argmax(axis=0)
+    return ts - ts[first, np.arange(ts.shape[1])]
+
+
 def plot_df(df, matrix=True, legend=True, rot=45):
     if not np.alltrue(np.isnan(df.values)):
         df.plot(legend=legend, rot=rot)
@@ -35,13 +35,75 @@ def lasso_cv(y, x=None, cv=10, max_deg=3):
     return y_pred
 
 
-def lstsq_cv(y, x=None, cv=10, max_deg=3):
-    """LSTSQ fit."""
-    if np.isnan(y).all():
-        y_pred = y
-    else:
-        y_pred = ap.lstsq_cv(x, y, cv=cv, max_deg=max_deg)
-    return y_pred
+def kfolds(n, cv=10):
+    """Test indices of `cv` contiguous folds of `n` samples (as KFold)."""
+    cv = min(cv, n)
+    sizes = np.ones(cv, 'i4') * (n // cv)
+    sizes[:n % cv] += 1
+    edges = np.r_[0, np.cumsum(sizes)]
+    return [np.arange(i, j) for i, j in zip(edges[:-1], edges[1:])]
+
+
+def vander(x, deg, x0=0., scale=1.):
+    """Polynomial design [1, x, .., x**deg] of the normalized `x`."""
+    return np.vander((x - x0) / scale, deg+1)[:,::-1]
+
+
+def polyfit_cube(data, x, deg=1, cv=None, max_deg=3):
+    """Batched LSTSQ polynomial fit of all the time series of a cube.
+
+    data : 3d array (nt,ny,nx), time series along the first axis.
+    x : time axis (nt).
+    deg : degree of the polynomial, if `cv` is None.
+    cv : number of folds to select the degree (1..max_deg, at most n-1
+        for series w/n valid pts) by cross-validation (min MSE of the 
+        predictions), for every series.
+
+    The time series with the same NaN pattern share the design matrix,
+    so all of them (and all folds and degrees) are solved at once as a 
+    multi-column least-squares problem. Returns the fitted cube, the 
+    series with no data are NaN.
+    """
+    nt = data.shape[0]
+    Y = data.reshape(nt, -1)
+    fit = np.empty_like(Y) * np.nan
+    x0, scale = x.mean(), x.std() or 1.
+    valid = ~np.isnan(Y)
+    # group the series w/same NaN pattern
+    keys = np.packbits(valid, axis=0).T.copy()
+    keys = keys.view([('k', 'V%d' % keys.shape[1])]).ravel()
+    _, group = np.unique(keys, return_inverse=True)
+    for g in np.unique(group):
+        cols, = np.where(group == g)
+        ind, = np.where(valid[:,cols[0]])
+        n = len(ind)
+        if n < 2: 
+            continue
+        xg, Yg = x[ind], Y[ind][:,cols]
+        degs = np.array([deg])
+        if cv is not None:
+            # MSE of the predictions for every degree and fold
+            degs = np.arange(1, min(max_deg, n-1)+1)
+            folds = kfolds(n, cv)
+            mse = np.zeros((len(degs), len(cols)))
+            for k, d in enumerate(degs):
+                A = vander(xg, d, x0, scale)
+                for test in folds:
+                    train = np.ones(n, bool)
+                    train[test] = False
+                    coef = np.linalg.lstsq(A[train], Yg[train])[0]
+                    err = np.dot(A[test], coef) - Yg[test]
+                    mse[k] += (err**2).mean(axis=0) / len(folds)
+            best = degs[np.argmin(mse, axis=0)]
+        else:
+            best = np.repeat(deg, len(cols))
+        for d in np.unique(best):
+            sel = (best == d)
+            if d >= n:
+                continue
+            coef = np.linalg.lstsq(vander(xg, d, x0, scale), Yg[:,sel])[0]
+            fit[:,cols[sel]] = np.dot(vander(x, d, x0, scale), coef)
+    return fit.reshape(data.shape)
 
 
 def line_fit(y, x=None):
@@ -125,38 +187,26 @@ if 0: # plot alphas and MSEs (the prediction error curve)
 
 #------------------------------------------------------
 
-data = as_frame(data, time, lat, lon)
-data = data.apply(ap.referenced, to='mean', raw=True)
+data = data - np.nanmean(data, axis=0)  # referenced to mean
 
-# fit trend
-poly = data.apply(lasso_cv, x=time, max_deg=3, raw=True)
-poly2 = data.apply(lstsq_cv, x=time, max_deg=3, raw=True)
-line = data.apply(line_fit, x=time, raw=True)
+# fit trend (LASSO per grid cell, LSTSQ batched) -> 3d
+frame = as_frame(data, time, lat, lon)
+poly = as_array(frame.apply(lasso_cv, x=time, max_deg=3, raw=True))
+poly2 = polyfit_cube(data, time, cv=10, max_deg=3)
+line = polyfit_cube(data, time, deg=1)
 
-# compute rate
-poly_rate = poly.apply(rate, x=time, raw=True)
-poly2_rate = poly2.apply(rate, x=time, raw=True)
-line_rate = line.apply(rate, x=time, raw=True)
+# compute rate -> 2d
+poly_rate = rate(poly, x=time)
+poly2_rate = rate(poly2, x=time)
+line_rate = rate(line, x=time)
 
 # take derivative
-dpoly = poly.apply(gradient,  dt=DT, raw=True)
-dpoly_rate = dpoly.apply(rate, x=time, raw=True)
+dpoly = np.gradient(poly, DT)[0]
+dpoly_rate = rate(dpoly, x=time)
 
 if 0:
-    poly = poly.apply(ap.referenced, to='mean', raw=True)
-    dpoly = dpoly.apply(ap.referenced, to='mean', raw=True)
-
-#------------------------------------------------------
-
-# 1d(2d) -> 2d(3d)
-poly = as_array(poly)
-poly_rate = poly_rate.reshape(ny,nx) 
-poly2 = as_array(poly2)
-poly2_rate = poly2_rate.reshape(ny,nx) 
-line = as_array(line)
-line_rate = line_rate.reshape(ny,nx)
-dpoly = as_array(dpoly)
-dpoly_rate = dpoly_rate.reshape(ny,nx) 
+    poly = poly - np.nanmean(poly, axis=0)
+    dpoly = dpoly - np.nanmean(dpoly, axis=0)
 
 #------------------------------------------------------
 
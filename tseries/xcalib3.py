@@ -28,6 +28,7 @@ ERR3_CALIBRATED = 'dg_error_xcal'
 ERR4_CALIBRATED = 'dg_error2_xcal'
 NAD_CALIBRATED = 'n_ad_xcal'
 NDA_CALIBRATED = 'n_da_xcal'
+MAX_MB = 512      # max memory for the buffered output, all arrays (MB)
 
 #-------------------------------------------------------------------------
 
@@ -200,6 +201,10 @@ def main():
                                            (N,ny,nx), '', filters)
                 c6 = din.file.create_carray('/', NDA_CALIBRATED, atom, 
                                            (N,ny,nx), '', filters)
+                # buffer the per-cell writes, each chunk is written once
+                # (blocks w/skipped all-NaN cells wait for the budget or close)
+                c1, c2, c3, c4, c5, c6 = chunk_writers(
+                    (c1, c2, c3, c4, c5, c6), MAX_MB)
 
             c1[:,i,j] = err1[ERR1_CALIBRATED].values
             c2[:,i,j] = err2[ERR2_CALIBRATED].values
@@ -208,9 +213,11 @@ def main():
             c5[:,i,j] = nad[NAD_CALIBRATED].values
             c6[:,i,j] = nda[NDA_CALIBRATED].values
 
-            din.file.flush()
             print 'saved time series:', i,j
 
+    if not isfirst:
+        for c in (c1, c2, c3, c4, c5, c6):
+            c.close()
     din.file.close()
 
     print 'discarded time series with no overlap:', no_overlap
@@ -0,0 +1,221 @@
+"""
+Module containing functions used by:
+
+xover.py
+
+Native crossover finder for along-track data
+--------------------------------------------
+- consecutive pts of the same track form segments (tracks are split
+  where the orbit number changes or where there is a gap > `maxgap`)
+- segments are binned into a lon/lat grid, and intersections are only
+  searched btw segments (of different files) that share a bin
+- the values at the crossing are linearly interpolated along each
+  segment, flags are taken from the closest pt of the segment
+
+"""
+# October 17, 2026
+
+import os
+import re
+import numpy as np
+import tables as tb
+
+R = 6371.0       # mean Earth radius (km)
+
+
+def get_data(fname, node='data'):
+    """Load the 2D data matrix from an HDF5 track file."""
+    f = tb.openFile(fname)
+    data = f.getNode('/', node)[:]     # in-memory -> faster!
+    f.close()
+    return data
+
+
+def saveh5(fname, data):
+    fout = tb.openFile(fname, 'w')
+    shape = data.shape
+    atom = tb.Atom.from_dtype(data.dtype)
+    filters = tb.Filters(complib='blosc', complevel=9)
+    dout = fout.createCArray(fout.root,'data', atom=atom, shape=shape,
+                             filters=filters)
+    dout[:] = data[:]
+    fout.close()
+
+
+def get_fname_out(fname1, fname2, suff=''):
+    """
+    The name of the output crossover file (same as for `x2sys.py`):
+
+    /path/to/fname2/sat_t1_t2_[suff_]ad_NN_ (without extension).
+    """
+    path2 = os.path.split(fname2)[0]
+    fname1, _ = os.path.splitext(os.path.basename(fname1))
+    sat = fname1.split('_')[0]
+    t1 = re.search('\d\d\d\d\d\d+', fname1).group()
+    t2 = re.search('\d\d\d\d\d\d+', fname2).group()
+    n1 = re.search('_\d\d_', fname1)
+    n2 = re.search('_\d\d_', fname2)
+    n1 = n1.group() if n1 else ''
+    n2 = n2.group() if n2 else ''
+    if n1 != n2:
+        raise IOError('files are from different regions: %s %s' \
+                      % (fname1, fname2))
+    if suff: suff += '_'
+    if '_a' in fname1 and '_d' in fname2:
+        suffix = suff + 'ad'
+    elif '_d' in fname1 and '_a' in fname2:
+        suffix = suff + 'da'
+    elif '_d' in fname1 and '_d' in fname2:
+        suffix = suff + 'dd'
+    elif '_a' in fname1 and '_a' in fname2:
+        suffix = suff + 'aa'
+    else:
+        suffix = ''
+    if n1:
+        suffix += n1
+    if suffix:
+        fname_out = '_'.join([sat, t1, t2, suffix])
+    else:
+        fname_out = '_'.join([sat, t1, t2])
+    return os.path.join(path2, fname_out)
+
+
+def get_segments(lon, lat, orbit=None, maxgap=10.):
+    """
+    Indices `i` of the valid track segments (pt i -> pt i+1).
+
+    A segment is not valid if the two pts are from different orbits,
+    if they are apart more than `maxgap` km, or if the segment crosses
+    the 0/360 (or -/+180) discontinuity.
+    """
+    dlon = np.diff(lon)
+    dlat = np.diff(lat)
+    latm = np.radians(lat[:-1] + dlat/2.)
+    dist = R * np.radians(np.hypot(dlon * np.cos(latm), dlat))  # km
+    valid = (dist <= maxgap) & (np.abs(dlon) < 180)
+    if orbit is not None:
+        valid &= (orbit[1:] == orbit[:-1])
+    iseg, = np.where(valid)
+    return iseg
+
+
+def bin_segments(lon, lat, iseg, dxy):
+    """
+    Bins (of size `dxy` deg) covered by the bounding box of each segment.
+
+    Returns (bins, segs): the bin and the segment of every (bin,segment)
+    pair, a segment can share several bins.
+    """
+    ny = int(np.ceil(180. / dxy)) + 2
+    lon1, lon2 = lon[iseg], lon[iseg+1]
+    lat1, lat2 = lat[iseg], lat[iseg+1]
+    ix1 = np.floor((np.minimum(lon1, lon2) + 360) / dxy).astype('i8')
+    ix2 = np.floor((np.maximum(lon1, lon2) + 360) / dxy).astype('i8')
+    iy1 = np.floor((np.minimum(lat1, lat2) + 90) / dxy).astype('i8')
+    iy2 = np.floor((np.maximum(lat1, lat2) + 90) / dxy).astype('i8')
+    nx = ix2 - ix1 + 1
+    count = nx * (iy2 - iy1 + 1)
+    # k-th bin of each segment
+    k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    nx = np.repeat(nx, count)
+    ix = np.repeat(ix1, count) + k % nx
+    iy = np.repeat(iy1, count) + k // nx
+    return ix * ny + iy, np.repeat(iseg, count)
+
+
+def candidate_pairs(bins1, segs1, bins2, segs2):
+    """Unique pairs of segments (seg1, seg2) that share at least one bin."""
+    ind = np.argsort(bins2, kind='mergesort')
+    bins2, segs2 = bins2[ind], segs2[ind]
+    lo = np.searchsorted(bins2, bins1, side='left')
+    hi = np.searchsorted(bins2, bins1, side='right')
+    count = hi - lo
+    k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    s1 = np.repeat(segs1, count)
+    s2 = segs2[np.repeat(lo, count) + k]
+    # a pair of segments may share several bins
+    nmax = s2.max() + 1 if len(s2) > 0 else 1
+    pairs = np.unique(s1 * nmax + s2)
+    return pairs // nmax, pairs % nmax
+
+
+def intersect(lon1, lat1, s1, lon2, lat2, s2):
+    """
+    Intersections of the segments s1 (track 1) with s2 (track 2).
+
+    Returns the crossing segments, the position of the crossing along
+    each segment (0 <= t1,t2 < 1) and the crossing coordinates.
+    """
+    px, py = lon1[s1], lat1[s1]
+    rx, ry = lon1[s1+1] - px, lat1[s1+1] - py
+    qx, qy = lon2[s2], lat2[s2]
+    sx, sy = lon2[s2+1] - qx, lat2[s2+1] - qy
+    denom = rx * sy - ry * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = ((qx - px) * sy - (qy - py) * sx) / denom
+        t2 = ((qx - px) * ry - (qy - py) * rx) / denom
+    # half-open segments, so a crossing at a shared pt is counted once
+    ok, = np.where((denom != 0) & (0 <= t1) & (t1 < 1) & (0 <= t2) & (t2 < 1))
+    s1, s2, t1, t2 = s1[ok], s2[ok], t1[ok], t2[ok]
+    xlon = px[ok] + t1 * rx[ok]
+    xlat = py[ok] + t1 * ry[ok]
+    return s1, s2, t1, t2, xlon, xlat
+
+
+def interp_values(data, iseg, t, nearest=()):
+    """
+    Values of all the columns of `data` at the positions `t` along the
+    segments `iseg`: linear interpolation, or the value of the closest
+    pt for the columns in `nearest` (flags).
+    """
+    v1, v2 = data[iseg], data[iseg+1]
+    values = v1 + t[:,None] * (v2 - v1)
+    if len(nearest) > 0:
+        nearest = list(nearest)
+        closest = np.where(t[:,None] < 0.5, v1[:,nearest], v2[:,nearest])
+        values[:,nearest] = closest
+    return values
+
+
+def cross_tracks(data1, data2, x=3, y=2, orbit=0, maxgap=10., dxy=0.1,
+                 nearest=(0,)):
+    """
+    Find the crossovers btw the tracks of two files.
+
+    data1, data2 : 2D arrays with one pt per row (track files).
+    x, y, orbit : columns of lon, lat and orbit number (None = no orbit).
+    maxgap : max distance btw consecutive pts of a track (km).
+    dxy : size of the bins used to search for crossings (deg).
+    nearest : columns to take from the closest pt instead of interpolating
+        (orbit number, flags, ...) [default: 0, the orbit column].
+
+    Returns a 2D array with one crossover per row:
+
+        xlon xlat v1_1 v1_2 v2_1 v2_2 ...
+
+    with the values of every column (other than lon/lat) of the tracks
+    1 (data1) and 2 (data2) at the crossover. This is the same layout of
+    the `data` matrix written by `x2sys.py` (from GMT's x2sys_cross).
+    """
+    lon1, lat1 = data1[:,x], data1[:,y]
+    lon2, lat2 = data2[:,x], data2[:,y]
+    orb1 = data1[:,orbit] if orbit is not None else None
+    orb2 = data2[:,orbit] if orbit is not None else None
+    cols = [k for k in range(data1.shape[1]) if k not in (x, y)]
+
+    seg1 = get_segments(lon1, lat1, orb1, maxgap)
+    seg2 = get_segments(lon2, lat2, orb2, maxgap)
+    bins1, segs1 = bin_segments(lon1, lat1, seg1, dxy)
+    bins2, segs2 = bin_segments(lon2, lat2, seg2, dxy)
+    s1, s2 = candidate_pairs(bins1, segs1, bins2, segs2)
+    s1, s2, t1, t2, xlon, xlat = intersect(lon1, lat1, s1, lon2, lat2, s2)
+
+    val1 = interp_values(data1, s1, t1, nearest)[:,cols]
+    val2 = interp_values(data2, s2, t2, nearest)[:,cols]
+
+    xover = np.empty((len(xlon), 2 + 2*len(cols)), 'f8')
+    xover[:,0] = xlon
+    xover[:,1] = xlat
+    xover[:,2::2] = val1
+    xover[:,3::2] = val2
+    return xover
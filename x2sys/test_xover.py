@@ -0,0 +1,145 @@
+"""
+Test the native crossover finder (`cross_tracks`) against a brute-force
+search over all the pairs of segments of two files, on synthetic
+ascending/descending tracks with noise, data gaps and orbit changes.
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.split(os.path.realpath(__file__))[0])
+import funcs as fx
+
+X, Y, ORBIT = 3, 2, 0
+MAXGAP = 10.
+
+
+def synthetic_tracks(kind='asc', ntracks=6, seed=1234):
+    """
+    Track file (orbit, secs, lat, lon, elev, flag) with `ntracks` tracks
+    (asc or des) over the same region, with noise and a data gap
+    (> MAXGAP) in some tracks.
+    """
+    np.random.seed(seed)
+    rows = []
+    t0 = 0.
+    for k in xrange(ntracks):
+        npts = np.random.randint(30, 60)
+        lon = np.linspace(0, 2, npts) + np.random.uniform(-0.5, 0.5)
+        lat = np.linspace(-68, -67, npts)
+        if kind == 'des':
+            lat = lat[::-1]
+        lat = lat + np.random.normal(0, 0.005, npts)
+        if k % 2:
+            gap = np.random.randint(5, npts-5)
+            lon[gap:] += 1.                   # ~40 km gap
+        secs = t0 + np.arange(npts)
+        elev = np.random.normal(0, 1, npts)
+        flag = np.random.randint(0, 3, npts)
+        rows.append(np.column_stack((np.full(npts, k), secs, lat, lon,
+                                     elev, flag)))
+        t0 = secs[-1] + 1
+    return np.vstack(rows)
+
+
+def distance(lon1, lat1, lon2, lat2):
+    """Same flat-Earth distance (km) as `get_segments`."""
+    latm = np.radians((lat1 + lat2) / 2.)
+    return fx.R * np.radians(np.hypot((lon2 - lon1) * np.cos(latm),
+                                      lat2 - lat1))
+
+
+def cross_tracks_loop(data1, data2, nearest=(ORBIT,)):
+    """Reference: test every segment of file 1 against every one of file 2."""
+    def segments(d):
+        return [i for i in xrange(d.shape[0]-1)
+                if d[i,ORBIT] == d[i+1,ORBIT] and
+                distance(d[i,X], d[i,Y], d[i+1,X], d[i+1,Y]) <= MAXGAP]
+
+    def value(d, i, t):
+        v = d[i] + t * (d[i+1] - d[i])
+        for c in nearest:
+            v[c] = d[i,c] if t < 0.5 else d[i+1,c]
+        return v
+
+    cols = [c for c in xrange(data1.shape[1]) if c not in (X, Y)]
+    xover = []
+    for i in segments(data1):
+        px, py = data1[i,X], data1[i,Y]
+        rx, ry = data1[i+1,X] - px, data1[i+1,Y] - py
+        for j in segments(data2):
+            qx, qy = data2[j,X], data2[j,Y]
+            sx, sy = data2[j+1,X] - qx, data2[j+1,Y] - qy
+            denom = rx * sy - ry * sx
+            if denom == 0:
+                continue
+            t1 = ((qx - px) * sy - (qy - py) * sx) / denom
+            t2 = ((qx - px) * ry - (qy - py) * rx) / denom
+            if 0 <= t1 < 1 and 0 <= t2 < 1:
+                v1, v2 = value(data1, i, t1), value(data2, j, t2)
+                row = [px + t1 * rx, py + t1 * ry]
+                for c in cols:
+                    row += [v1[c], v2[c]]
+                xover.append(row)
+    return np.array(xover).reshape(-1, 2 + 2*len(cols))
+
+
+def sort_rows(a):
+    return a[np.lexsort(a[:,::-1].T)]
+
+
+def test_vs_brute_force():
+    data1 = synthetic_tracks('asc', seed=1)
+    data2 = synthetic_tracks('des', seed=2)
+    ref = sort_rows(cross_tracks_loop(data1, data2))
+    assert ref.shape[0] > 0
+    for dxy in [0.01, 0.1, 1.0]:
+        xover = fx.cross_tracks(data1, data2, x=X, y=Y, orbit=ORBIT,
+                                maxgap=MAXGAP, dxy=dxy)
+        assert xover.shape == ref.shape
+        assert np.allclose(sort_rows(xover), ref, rtol=0, atol=1e-9)
+
+
+def test_orbit_change():
+    data1 = synthetic_tracks('asc', seed=1)
+    data2 = synthetic_tracks('des', seed=2)
+    nxover = cross_tracks_loop(data1, data2).shape[0]
+    data1[::7,ORBIT] += 100                   # no gap, only orbit changes
+    ref = sort_rows(cross_tracks_loop(data1, data2))
+    assert ref.shape[0] < nxover
+    xover = fx.cross_tracks(data1, data2, x=X, y=Y, orbit=ORBIT,
+                            maxgap=MAXGAP)
+    assert xover.shape == ref.shape
+    assert np.allclose(sort_rows(xover), ref, rtol=0, atol=1e-9)
+
+
+def test_nearest():
+    data1 = synthetic_tracks('asc', seed=3)
+    data2 = synthetic_tracks('des', seed=4)
+    nearest = (ORBIT, 5)
+    ref = sort_rows(cross_tracks_loop(data1, data2, nearest))
+    xover = sort_rows(fx.cross_tracks(data1, data2, x=X, y=Y, orbit=ORBIT,
+                                      maxgap=MAXGAP, nearest=nearest))
+    assert xover.shape == ref.shape
+    assert np.allclose(xover, ref, rtol=0, atol=1e-9)
+    # orbit (v1_0, v2_0) and flags (v1_5, v2_5) are not interpolated
+    for c in [2, 3, 8, 9]:
+        assert np.all(xover[:,c] == np.round(xover[:,c]))
+
+
+def test_no_crossings():
+    data1 = synthetic_tracks('asc', seed=5)
+    data2 = data1.copy()
+    data2[:,X] += 20.                         # far away
+    xover = fx.cross_tracks(data1, data2, x=X, y=Y, orbit=ORBIT,
+                            maxgap=MAXGAP)
+    assert xover.shape == (0, 2 + 2*(data1.shape[1]-2))
+
+
+if __name__ == '__main__':
+    test_vs_brute_force()
+    test_orbit_change()
+    test_nearest()
+    test_no_crossings()
+    print 'ok'
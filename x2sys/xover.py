@@ -0,0 +1,120 @@
+"""
+Find crossovers btw HDF5 track files (native, no GMT's x2sys).
+
+Read several HDF5 files and cross them with a given *reference* file,
+same as `x2sys.py` but in-process: the track files are read directly
+(no temporary ASCII files) and the output has the same `data` layout.
+Example, for a reference `file0.h5` and an input list `file1.h5,
+file2.h5, file3.h5, ...`, we have:
+
+    $ xover.py -r file0.h5 file1.h5 file2.h5 file3.h5 ...
+
+    with crossover outputs:
+
+    file0.h5 - file1.h5,
+    file0.h5 - file2.h5,
+    file0.h5 - file3.h5,
+    ...
+
+Note
+----
+If `-r` option is not specified, then the reference file is the first
+of the input file list.
+
+"""
+# October 17, 2026
+
+import os
+import sys
+import argparse as ap
+import numpy as np
+
+from funcs import *
+
+# parse command line arguments
+parser = ap.ArgumentParser()
+parser.add_argument('files', nargs='*', help='HDF5 file[s] to read')
+parser.add_argument('-r', dest='reffile', default=None,
+    help='reference file to cross w/others: file_ref - files_in')
+parser.add_argument('-x', dest='loncol', type=int, default=3,
+    help='column of longitude in the files [default: 3]')
+parser.add_argument('-y', dest='latcol', type=int, default=2,
+    help='column of latitude in the files [default: 2]')
+parser.add_argument('-t', dest='orbcol', type=int, default=0,
+    help='column of orbit number in the files, -1 for none [default: 0]')
+parser.add_argument('-g', dest='maxgap', type=float, default=10.,
+    help='max distance btw pts of a track segment in km [default: 10]')
+parser.add_argument('-b', dest='binsize', type=float, default=0.1,
+    help='size of the bins to search for crossings in deg [default: 0.1]')
+parser.add_argument('-n', dest='nearest', nargs='*', type=int, default=[0],
+    help='columns to take from the closest pt, orbit number and flags '
+    '(-n 0 6 7 ..) [default: 0]')
+parser.add_argument('-s', dest='suffix', default='',
+    help='suffix for the output filename [default: none]')
+
+args = parser.parse_args()
+
+
+def main(args):
+
+    file_ref = args.reffile
+    files_in = args.files
+    x = args.loncol
+    y = args.latcol
+    orbit = args.orbcol if args.orbcol >= 0 else None
+    maxgap = args.maxgap
+    dxy = args.binsize
+    nearest = args.nearest
+    suff = args.suffix
+
+    if not files_in:
+        raise IOError("xover.py: no input files")
+
+    if file_ref is None and len(files_in) < 2:
+        raise IOError("xover.py: without `-r` option input files must be > 1")
+
+    if file_ref is None:
+        file_ref = files_in[0]    # first file of the list
+        files_in.remove(file_ref)
+
+    # remove reffile from the input file list to avoid crossing
+    # reffile w/itself
+    if file_ref in files_in:
+        files_in.remove(file_ref)
+        print 'removing ref file from the input list!'
+
+    print 'files to cross:', len(files_in) + 1
+
+    data_ref = get_data(file_ref)
+
+    nfiles = 0
+    nxovers = 0
+    fname_out = None
+    for file_i in files_in:
+
+        fname_out = get_fname_out(file_ref, file_i, suff)
+        print 'crossing:', file_ref, file_i, '...'
+
+        data_i = get_data(file_i)
+        data = cross_tracks(data_ref, data_i, x=x, y=y, orbit=orbit,
+                            maxgap=maxgap, dxy=dxy, nearest=nearest)
+
+        if data.shape[0] > 0:
+            saveh5(fname_out + '.h5', data)
+            nxovers += data.shape[0]
+            nfiles += 1
+            print 'number of crossovers:', data.shape[0]
+        else:
+            fname_out = None
+            print 'no crossovers found!'
+            print 'files:', file_ref, file_i
+
+    print 'done.'
+    print 'total crossovers:', nxovers
+    print 'crossover files created:', nfiles
+    if fname_out is not None:
+        print 'last output file:', fname_out + '.h5'
+    print '\n'
+
+if __name__ == '__main__':
+    main(args)